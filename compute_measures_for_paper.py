@@ -8,7 +8,7 @@ from deleoni.measure import guard_recall as grecD
 from mannhardt.measure import guard_recall as grecM
 from felli.cocomot import guard_recall as grecF
 grecs = [
-    ('grec' , lambda l,m: grec(read_xes_complex(l), parse_pnml_for_dpn(m))),
+    ('grec' , lambda l,m: grec(read_xes_complex(l, cache=True), parse_pnml_for_dpn(m))),
     ('grecD', grecD),
     ('grecM', grecM),
     ('grecF', lambda l,m: grecF(m,l))
@@ -17,7 +17,7 @@ grecs = [
 from pmkoalas.conformance.dataaware import compute_guard_precision as gprec
 from mannhardt.measure import guard_precision as gprecF
 gprecs = [
-    ('gprec', lambda l,m: gprec(read_xes_complex(l), parse_pnml_for_dpn(m))),
+    ('gprec', lambda l,m: gprec(read_xes_complex(l, cache=True), parse_pnml_for_dpn(m))),
     ('gprecM', gprecF)
 ]
 
@@ -0,0 +1,316 @@
+"""
+This module provides an on-disk cache for event logs read from files, so
+that reading the same file again only loads a compact binary form rather
+than parsing it. Entries are kept in CACHE_DIR, which can be set with the
+PMKOALAS_CACHE environment variable, and are invalidated when the source
+file changes.
+
+An entry for a complex log is a directory holding:
+    - meta.pkl, the name and data of the log, the fingerprint of the source
+      file, the activity and attribute key tables, and the interned
+      attribute values.
+    - traces.npy, the offset of the first event of each trace, with traces
+      grouped by variant as the log iterates over them.
+    - variants.npy, the variant of each trace, where variant_offsets.npy
+      and variant_acts.npy hold the activities of each variant.
+    - event_attrs.npy and trace_attrs.npy, the columnar attributes of events
+      and traces as rows of (owner, key, value), in the order they were read.
+An entry for a simple log only holds the variants and their frequencies
+(counts.npy). Arrays are loaded with memory-mapping, and logs are rebuilt 
+per variant, so the activities of a variant are only read once and events 
+with the same activity and data are shared. The attributes of events and 
+traces are read from the mapped arrays one trace at a time.
+"""
+from os import environ, makedirs, path, replace, stat, getpid
+from shutil import rmtree
+from hashlib import blake2b
+from typing import Any, Dict, List, Tuple, Union
+import pickle
+
+import numpy as np
+
+from pmkoalas.complex import ComplexEvent, ComplexTrace, ComplexEventLog
+from pmkoalas.simple import Trace, EventLog
+from pmkoalas._logging import info, debug
+
+CACHE_DIR = environ.get("PMKOALAS_CACHE",
+    path.join(path.expanduser("~"), ".cache", "pmkoalas"))
+# the version of the layout of entries, entries of other versions are ignored
+CACHE_VERSION = 2
+# the size of blocks, in bytes, read while hashing the content of a file
+_HASH_BLOCK = 2**20
+
+def file_fingerprint(filepath:str, content:bool=True) -> Tuple:
+    """
+    Returns the fingerprint of a file as (size, mtime, digest), where the
+    digest of the content is only computed if asked for, otherwise None.
+    """
+    info_ = stat(filepath)
+    digest = None
+    if content:
+        hasher = blake2b(digest_size=16)
+        with open(filepath, "rb") as file:
+            block = file.read(_HASH_BLOCK)
+            while len(block) > 0:
+                hasher.update(block)
+                block = file.read(_HASH_BLOCK)
+        digest = hasher.hexdigest()
+    return (info_.st_size, info_.st_mtime_ns, digest)
+
+def entry_path(filepath:str, options:Tuple) -> str:
+    """
+    Returns the directory of the cache entry for the given file, read with
+    the given options.
+    """
+    key = blake2b(
+        repr((CACHE_VERSION, path.abspath(filepath), options)).encode(),
+        digest_size=16
+    ).hexdigest()
+    return path.join(CACHE_DIR, key)
+
+class _Interner():
+    """
+    Assigns ids to values in the order they are first seen, where values are
+    the same when they have the same type and value.
+    """
+
+    def __init__(self) -> None:
+        self._ids:Dict[Any,int] = dict()
+        self.values:List[Any] = []
+
+    def __call__(self, value:Any) -> int:
+        try:
+            key = (type(value), value)
+            if key in self._ids:
+                return self._ids[key]
+            self._ids[key] = len(self.values)
+        except TypeError:
+            # unhashable values are kept as they are
+            pass
+        self.values.append(value)
+        return len(self.values) - 1
+
+def _write_entry(entry:str, meta:Dict[str,Any],
+        arrays:Dict[str,np.ndarray]) -> None:
+    """
+    Writes an entry into a temporary directory, then moves it into place so
+    that readers never see a partial entry.
+    """
+    makedirs(CACHE_DIR, exist_ok=True)
+    temp = f"{entry}.{getpid()}.tmp"
+    if path.exists(temp):
+        rmtree(temp)
+    makedirs(temp)
+    for name, array in arrays.items():
+        np.save(path.join(temp, f"{name}.npy"), array)
+    with open(path.join(temp, "meta.pkl"), "wb") as file:
+        pickle.dump(meta, file, protocol=pickle.HIGHEST_PROTOCOL)
+    if path.exists(entry):
+        rmtree(entry)
+    replace(temp, entry)
+
+def _read_meta(entry:str, filepath:str) -> Union[Dict[str,Any],None]:
+    """
+    Returns the meta data of an entry, if the entry exists and its source
+    file has not changed, otherwise None. The content of the file is only
+    hashed when its size or mtime changed.
+    """
+    meta_path = path.join(entry, "meta.pkl")
+    if not path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "rb") as file:
+            meta = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if meta.get("version") != CACHE_VERSION:
+        return None
+    size, mtime, digest = meta["source"]
+    now = file_fingerprint(filepath, content=False)
+    if now[:2] == (size, mtime):
+        return meta
+    if now[0] != size:
+        return None
+    now = file_fingerprint(filepath)
+    if now[2] != digest:
+        return None
+    debug(f"source touched but unchanged, keeping cache entry :: {entry}")
+    return meta
+
+def _load_array(entry:str, name:str) -> np.ndarray:
+    " returns a read-only memory-map of an array of the entry."
+    return np.load(path.join(entry, f"{name}.npy"), mmap_mode="r")
+
+def _row_bounds(rows:np.ndarray, owners:int) -> List[int]:
+    """
+    Returns the bounds of the rows of each owner, where the rows of the i-th
+    owner are rows[bounds[i]:bounds[i+1]], as rows are ordered by owner.
+    """
+    return np.searchsorted(rows[:,0], np.arange(owners + 1)).tolist()
+
+def store_complex_log(filepath:str, options:Tuple,
+        log:ComplexEventLog) -> None:
+    """
+    Stores the given complex log as the cache entry for the file.
+    """
+    entry = entry_path(filepath, options)
+    fingerprint = file_fingerprint(filepath)
+    acts = _Interner()
+    keys = _Interner()
+    values = _Interner()
+    variants = _Interner()
+    events = 0
+    traces = []
+    trace_variants = []
+    variant_offsets = [0]
+    variant_acts = []
+    event_attrs = []
+    trace_attrs = []
+    # traces are kept grouped by variant, as the log iterates over them
+    traces_of = ( trace for _,instances in log for trace in instances )
+    for no,trace in enumerate(traces_of):
+        traces.append(events)
+        simple = trace.simplify()
+        variant = variants(simple)
+        if variant == len(variant_offsets) - 1:
+            variant_acts.extend( acts(act) for act in simple )
+            variant_offsets.append(len(variant_acts))
+        trace_variants.append(variant)
+        for key,val in trace.data().items():
+            trace_attrs.append((no, keys(key), values(val)))
+        for event in trace:
+            for key,val in event.data().items():
+                event_attrs.append((events, keys(key), values(val)))
+            events += 1
+    traces.append(events)
+    meta = {
+        "version" : CACHE_VERSION,
+        "source" : fingerprint,
+        "name" : log.name,
+        "data" : log.data(),
+        "activities" : acts.values,
+        "keys" : keys.values,
+        "values" : values.values,
+    }
+    arrays = {
+        "traces" : np.array(traces, dtype=np.int64),
+        "variants" : np.array(trace_variants, dtype=np.int32),
+        "variant_offsets" : np.array(variant_offsets, dtype=np.int64),
+        "variant_acts" : np.array(variant_acts, dtype=np.int32),
+        "event_attrs" : np.array(event_attrs, dtype=np.int64)
+                          .reshape((len(event_attrs), 3)),
+        "trace_attrs" : np.array(trace_attrs, dtype=np.int64)
+                          .reshape((len(trace_attrs), 3)),
+    }
+    _write_entry(entry, meta, arrays)
+    info(f"stored log with {len(traces)-1} traces in cache :: {entry}")
+
+def load_complex_log(filepath:str, options:Tuple) \
+    -> Union[ComplexEventLog,None]:
+    """
+    Loads the complex log from the cache entry for the file, if there is an
+    entry and the file has not changed since, otherwise None.
+    """
+    entry = entry_path(filepath, options)
+    meta = _read_meta(entry, filepath)
+    if meta == None:
+        return None
+    info(f"loading log from cache :: {entry}")
+    acts = meta["activities"]
+    keys = meta["keys"]
+    values = meta["values"]
+    traces = _load_array(entry, "traces").tolist()
+    trace_variants = _load_array(entry, "variants").tolist()
+    offsets = _load_array(entry, "variant_offsets").tolist()
+    variant_acts = _load_array(entry, "variant_acts").tolist()
+    # attributes stay memory-mapped, and only the rows of a trace are read
+    # while building it
+    event_attrs = _load_array(entry, "event_attrs")
+    event_bounds = _row_bounds(event_attrs, traces[-1])
+    trace_attrs = _load_array(entry, "trace_attrs")
+    trace_bounds = _row_bounds(trace_attrs, len(traces) - 1)
+    # the activities of each variant, with its instances
+    variants = [ 
+        ([ acts[a] for a in variant_acts[offsets[v]:offsets[v+1]] ], [])
+        for v in range(len(offsets) - 1)
+    ]
+    # events are immutable, so events with the same data are shared
+    shared:Dict[Tuple,ComplexEvent] = dict()
+    for no in range(len(traces) - 1):
+        start = traces[no]
+        names, instances = variants[trace_variants[no]]
+        first = event_bounds[start]
+        rows = event_attrs[first:event_bounds[start + len(names)]].tolist()
+        sequence = []
+        for i, name in enumerate(names):
+            data = tuple( 
+                (k, val) 
+                for _,k,val 
+                in rows[event_bounds[start+i]-first:
+                        event_bounds[start+i+1]-first] 
+            )
+            key = (name, data)
+            if key not in shared:
+                shared[key] = ComplexEvent(name, {
+                    keys[k] : values[val] for k,val in data
+                })
+            sequence.append(shared[key])
+        instances.append(ComplexTrace(sequence, data={
+            keys[k] : values[val] 
+            for _,k,val 
+            in trace_attrs[trace_bounds[no]:trace_bounds[no+1]].tolist()
+        }))
+    return ComplexEventLog.from_variants(
+        ( (Trace(names), instances) for names, instances in variants ),
+        data=meta["data"], name=meta["name"]
+    )
+
+def store_simple_log(filepath:str, options:Tuple, log:EventLog) -> None:
+    """
+    Stores the given simple log as the cache entry for the file, as its
+    variants and their frequencies.
+    """
+    entry = entry_path(filepath, options)
+    fingerprint = file_fingerprint(filepath)
+    acts = _Interner()
+    variant_offsets = [0]
+    variant_acts = []
+    counts = []
+    for trace, count in log:
+        variant_acts.extend( acts(act) for act in trace )
+        variant_offsets.append(len(variant_acts))
+        counts.append(count)
+    meta = {
+        "version" : CACHE_VERSION,
+        "source" : fingerprint,
+        "name" : log.name,
+        "activities" : acts.values,
+    }
+    arrays = {
+        "variant_offsets" : np.array(variant_offsets, dtype=np.int64),
+        "variant_acts" : np.array(variant_acts, dtype=np.int32),
+        "counts" : np.array(counts, dtype=np.int64),
+    }
+    _write_entry(entry, meta, arrays)
+    info(f"stored log with {len(counts)} variants in cache :: {entry}")
+
+def load_simple_log(filepath:str, options:Tuple) -> Union[EventLog,None]:
+    """
+    Loads the simple log from the cache entry for the file, if there is an
+    entry and the file has not changed since, otherwise None.
+    """
+    entry = entry_path(filepath, options)
+    meta = _read_meta(entry, filepath)
+    if meta == None:
+        return None
+    info(f"loading log from cache :: {entry}")
+    acts = meta["activities"]
+    offsets = _load_array(entry, "variant_offsets").tolist()
+    variant_acts = _load_array(entry, "variant_acts").tolist()
+    counts = _load_array(entry, "counts").tolist()
+    variants = [ 
+        (Trace([ acts[a] for a in variant_acts[offsets[no]:offsets[no+1]] ]),
+         count)
+        for no,count in enumerate(counts) 
+    ]
+    return EventLog.from_frequencies(variants, meta["name"])
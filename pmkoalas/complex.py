@@ -5,9 +5,10 @@ a trace and an event log in complex form, which considers the
 data perspective.
 """
 from __future__ import annotations # required for typing checks
-from typing import Mapping, Iterable, Set, List, Tuple
+from typing import Mapping, Iterable, Set, List, Tuple, Callable, Hashable
 from copy import deepcopy
 from time import time
+from types import MappingProxyType
 
 from pmkoalas._logging import info, debug, enable_logging
 from pmkoalas.simple import Trace, EventLog
@@ -29,13 +30,26 @@ class ComplexEvent():
     def __init__(self, activity:str, data:Mapping[str,object]) -> None:
         self._act = activity
         self._map = deepcopy(data)
-        self._hash = hash(
+        self._hash = self._compute_hash()
+
+    def _compute_hash(self) -> int:
+        return hash(
             tuple(
                 [self._act,]+
                 [hash(tuple([key,val])) for key,val 
                  in self._map.items()]
                 )
         )
+    
+    def __setstate__(self, state:dict) -> None:
+        # hashes of strings differ between processes, so recompute on load
+        self.__dict__.update(state)
+        self._hash = self._compute_hash()
+
+    def __deepcopy__(self, memo) -> 'ComplexEvent':
+        # events own a copy of their data and never change it, so copies 
+        # can share the same event
+        return self
 
     def activity(self) -> str:
         """ the process activity denoted by this event """
@@ -93,10 +107,26 @@ class ComplexTrace():
             self._map = deepcopy(data)
         else:
             raise ValueError(f"Given data is not a map/dict :: {type(data)}")
-        self._hash = hash( 
+        self._hash = self._compute_hash()
+        self._acts = set([ s.activity() for s in self._sequence])
+        # data states before each event, built on request
+        self._states:List[Mapping[str,object]] = None
+
+    def _compute_hash(self) -> int:
+        return hash( 
             tuple(list(self._map.items()) + [ s.__hash__() for s in self._sequence])
         )
-        self._acts = set([ s.activity() for s in self._sequence])
+    
+    def __getstate__(self) -> dict:
+        # states are views that cannot be pickled, so rebuild them on load
+        state = dict(self.__dict__)
+        state["_states"] = None
+        return state
+
+    def __setstate__(self, state:dict) -> None:
+        # hashes of strings differ between processes, so recompute on load
+        self.__dict__.update(state)
+        self._hash = self._compute_hash()
 
     # accessors
     def get_id(self) -> str:
@@ -107,19 +137,51 @@ class ComplexTrace():
         return deepcopy(self._acts)
     
     def get_state_as_of(self, i:int) -> Mapping[str,object]:
-        """ returns the data state of the trace before the i-th event."""
-        state = dict()
-        curr = 0
-        while i > 0:
-            if (curr < len(self)):
-                state.update(self[curr].data())
-            i -= 1
-        return state
+        """ 
+        returns a read-only view of the data state of the trace before the
+        i-th event, for i in [0, len(trace)], i.e. the data written by the
+        first i events, where later events overwrite the values of earlier
+        ones.
+
+        States are built on request and only up to the i-th event, so that
+        asking for the states in order builds each one once. A state is 
+        only copied when an event writes data, and otherwise shares the 
+        mapping of the prior state.
+        """
+        i = min([max([i, 0]), self._len])
+        if self._states == None:
+            self._states = [ MappingProxyType(dict()) ]
+        states = self._states
+        while len(states) <= i:
+            written = self._sequence[len(states)-1]._map
+            state = states[-1]
+            if len(written) > 0:
+                state = dict(state)
+                state.update(written)
+                state = MappingProxyType(state)
+            states.append(state)
+        return states[i]
     
     def data(self) -> Mapping[str,object]:
         """ returns the trace attributes """
         return deepcopy(self._map)
     
+    def data_signature(self) -> Tuple:
+        """ 
+        returns a hashable signature of the activities and data carried by 
+        the events of this trace, ignoring the trace attributes. Values are
+        kept with their type, so that 1, 1.0 and True differ.
+        """
+        return tuple(
+            (event._act, tuple( 
+                (key, type(val), val) 
+                for key,val 
+                in sorted(event._map.items(), key=lambda kv: kv[0])
+            ))
+            for event 
+            in self._sequence
+        )
+    
     def simplify(self) -> Trace:
         """ 
         returns a simplifed representation of this trace without data.
@@ -208,37 +270,62 @@ class ComplexEventLog():
         self._start_acts = set([])
         self._end_acts = set([])
         self._traces = None
+        # unique instances by data, and by the last key function asked for
+        self._unique = None
+        self._keyed = None
         self._map = deepcopy(data)
         info("Computing language...")
         start = time()
         for trace in traces:
-            
-            strace = trace.simplify()
-            if (strace in self._instances):
-                collector = self._instances[strace]
-                self._pop_size += 1
-                collector.append(trace)
-            else:
-                self._instances[strace] = list()
-                self._instances[strace].append(trace)
-                self._pop_size += 1
-            trace = strace
-            if (trace in self._freqset.keys()):
-                self._freqset[trace] += 1
-            else:
-                self._acts = self._acts.union(
-                    trace.seen_activities()
-                )
-                if (len(trace) > 0):
-                    self._start_acts.add(trace[0])
-                    self._end_acts.add(trace[-1])
-                self._freqset[trace] = 1
-                self._variants += 1
-            self._len += 1
+            self._add_instances(trace.simplify(), [trace])
         self._traces = set([ t for t in self._freqset.keys() ])
         info(f"Computed language in {(time()-start)*1000:.0f}ms")
         self.name = name 
 
+    @classmethod
+    def from_variants(cls, 
+            variants:Iterable[Tuple[Trace,List[ComplexTrace]]],
+            data:Mapping[str,object] = None,
+            name:str = DEFAULT_COMPLEX_LOG_NAME) -> 'ComplexEventLog':
+        """
+        Creates a log from the instances of each variant, where the variant 
+        of each instance is already known, so instances are not simplified 
+        again.
+        """
+        log = cls([], data=data, name=name)
+        for strace, instances in variants:
+            log._add_instances(strace, instances)
+        log._traces = set([ t for t in log._freqset.keys() ])
+        return log
+
+    def _add_instances(self, strace:Trace, 
+                       instances:List[ComplexTrace]) -> None:
+        " adds instances of the given variant to this log."
+        if (strace in self._instances):
+            self._instances[strace].extend(instances)
+            self._freqset[strace] += len(instances)
+        else:
+            self._instances[strace] = list(instances)
+            self._acts = self._acts.union(
+                strace.seen_activities()
+            )
+            if (len(strace) > 0):
+                self._start_acts.add(strace[0])
+                self._end_acts.add(strace[-1])
+            self._freqset[strace] = len(instances)
+            self._variants += 1
+        self._pop_size += len(instances)
+        self._len += len(instances)
+        self._unique = None
+        self._keyed = None
+
+    def __getstate__(self) -> dict:
+        # unique instances are read-only views that cannot be pickled
+        state = dict(self.__dict__)
+        state["_unique"] = None
+        state["_keyed"] = None
+        return state
+
     @enable_logging
     def simplify(self) -> EventLog:
         """
@@ -277,6 +364,54 @@ class ComplexEventLog():
         """
         return deepcopy(self._instances)
     
+    def get_unique_instances(self, 
+            key:Callable[[ComplexTrace],Hashable]=None) \
+        -> Mapping[Trace, Tuple[Tuple[ComplexTrace,int],...]]:
+        """
+        Get a read-only map between seen simple traces and the unique 
+        instances of complex traces with their multiplicity, where instances
+        are the same when their events carry the same data (see 
+        ComplexTrace.data_signature), or when they have the same key if a
+        key function is given. The first instance seen is kept for each. 
+
+        The map is computed once and shared between calls, where only the
+        last key function given is kept, so alternating between key 
+        functions computes the map again.
+        """
+        if key != None:
+            if self._keyed == None or self._keyed[0] != key:
+                self._keyed = (key, self._group_instances(key))
+            return self._keyed[1]
+        if self._unique == None:
+            self._unique = self._group_instances(
+                lambda instance: instance.data_signature()
+            )
+        return self._unique
+    
+    def _group_instances(self, key:Callable[[ComplexTrace],Hashable]) \
+        -> Mapping[Trace, Tuple[Tuple[ComplexTrace,int],...]]:
+        ret = dict()
+        for strace, collector in self._instances.items():
+            counts = dict()
+            firsts = dict()
+            for no,instance in enumerate(collector):
+                try:
+                    ikey = key(instance)
+                    hash(ikey)
+                except TypeError:
+                    # unhashable data, so keep the instance on its own
+                    ikey = no
+                if ikey not in counts:
+                    counts[ikey] = 0
+                    firsts[ikey] = instance
+                counts[ikey] += 1
+            ret[strace] = tuple( 
+                (firsts[ikey], count) for ikey,count in counts.items() 
+            )
+        unique = sum( len(pairs) for pairs in ret.values() )
+        info(f"found {unique} unique instances out of {self._pop_size}")
+        return MappingProxyType(ret)
+
     def seen_instances_for(self, trace:Trace) -> Set[ComplexTrace]:
         """
         Explores this collection for instances of the given 
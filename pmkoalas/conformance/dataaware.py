@@ -4,20 +4,48 @@ This modules provides ways to perfom data-aware conformance checking.
 Implemented techniques include:
     - guard-recall 
     - guard-precision
+    - both together, sharing the tree and matching (compute_guard_measures)
+
+The measures do not keep anything between calls by default. Trees built 
+from models are only reused across calls when TRANSITION_TREE_CACHE (see
+pmkoalas.models.transitiontree) is given a size or a directory, and the 
+paths of variants only when MATCHING_STORE (see 
+pmkoalas.conformance.matching) is. Both keep their entries until they are
+cleared or resized.
 """
 from pmkoalas.complex import ComplexEventLog
+from pmkoalas.complex import ComplexTrace
+from pmkoalas.simple import Trace
 from pmkoalas.models.petrinet import PetriNetWithData
 from pmkoalas.models.guards import GuardOutcomes
+from pmkoalas.models.guards import GuardPartitioning
 from pmkoalas.models.transitiontree import TransitionTreeGuardFlow
 from pmkoalas.models.transitiontree import TransitionTree
-from pmkoalas.conformance.matching import ManyMatching, find_all_paths
-from pmkoalas.conformance.matching import construct_many_matching, _computation_many_matching
+from pmkoalas.conformance.matching import ManyMatching
+from pmkoalas.conformance.matching import construct_many_matching
 from pmkoalas.conformance.matching import ExpontentialPathWeighter
+from pmkoalas.conformance.matching import Path
 from pmkoalas.models.transitiontree import construct_from_model
 from pmkoalas._logging import info, enable_logging
 from pmkoalas._logging import InfoIteratorProcessor
+from pmkoalas.work import WorkerPool, shared, split_ranges, plan_chunks
+from pmkoalas.work import CHUNKS_PER_WORKER
+
+from math import ceil
+import numpy as np
+from typing import List, Set, Tuple
 
-from joblib import Parallel, delayed
+def _find_longest(log:ComplexEventLog) -> int:
+    """
+    Finds the length of the longest observed trace.
+    """
+    long = None
+    for trace,_ in log:
+        if long == None:
+            long = trace 
+        elif len(trace) > len(long):
+            long = trace 
+    return len(long)
 
 def compute_directed_bookkeeping(flow:TransitionTreeGuardFlow, 
     matcher:ManyMatching, log:ComplexEventLog, outcome=GuardOutcomes.TRUE) \
@@ -101,76 +129,176 @@ def _computation_guard_recall(tree:TransitionTree, matching:ManyMatching,
     info(f"computed weights :: flow - {inner_sum:.2f} total - {t_w:.2f}")
     return (inner_sum/t_w)
 
-def _optimised_guard_recall(log:ComplexEventLog, tree:TransitionTree,
-        precomputed_matching:ManyMatching=None) -> float:
+def _weights_of(tree:TransitionTree, trace:Trace, 
+        instances:List[ComplexTrace], counts:np.ndarray, 
+        candidates:Set[Path], precision:bool) \
+        -> Tuple[float,float,float,float]:
     """
-    The computation of guard recall, whereby we only loop over the log once.
+    Computes the weights for guard-recall (flow, total) and guard-precision 
+    (upper, lower) of the given unique instances of a variant, each counted
+    by its multiplicity, over each of its matched paths. The weights of 
+    other flows for guard-precision are only found if precision is true. 
+    Each weight is a sum over instances, so the instances of a variant can 
+    be split across tasks.
     """
-    from pmkoalas.models.transitiontree import TransitionTreeGuardFlow
-    from pmkoalas.models.guards import GuardOutcomes
-    total_weight = 0
-    flow_weight = 0
-    # partial worker 
-    pool = Parallel(n_jobs=-2)
-    def partial(trace, instances, path, inst_w) -> float:
-        flow_weight = 0
-        total_weight = 0
+    from pmkoalas.models.guards import DataStateBlock, OUTCOME_TRUE
+    inst_w = ExpontentialPathWeighter(candidates)
+    population = int(counts.sum())
+    flow_weight = 0.0
+    total_weight = 0.0
+    upper_sum = 0.0
+    lower_sum = 0.0
+    for path in candidates:
         instance_weight = inst_w(path, trace)
         for step,i in zip(path, range(1, len(path)+1)):
-                    if isinstance(step, TransitionTreeGuardFlow):
-                        for instance in instances:
-                            irveson = step.guard().check(
-                                    instance.get_state_as_of(i-1)
-                                ) == GuardOutcomes.TRUE
-                            flow_weight += instance_weight * int(irveson)
-        total_weight += inst_w.share * len(trace) * len(instances)
-        return flow_weight, total_weight
-    # worker for inputs
-    def params(trace, instances, tree, allcads):
-        if precomputed_matching != None:
-            candidates = precomputed_matching[trace]
-        else:
-            _,candidates = _computation_many_matching(trace, tree, allcads)
-        return trace, instances, candidates
-    # computation of work
-    max_k = max([len(trace) for trace,_ in log])
-    allcads = find_all_paths(tree, max_k)
-    info(f"size of all candidates given {max_k=} :: {len(allcads)}")
-    inputs = list(pool( 
-        delayed(params)
-        (trace, instances, tree,
-         set([ cad for cad in allcads if len(cad) <= len(trace)]))
-        for trace,instances 
-        in log 
-    ))
-    inputs = [
-        (trace, instances, path, ExpontentialPathWeighter(matching))
-        for trace, instances, matching
-        in inputs 
-        for path 
-        in matching
+            if isinstance(step, TransitionTreeGuardFlow):
+                block = DataStateBlock.from_instances(instances, i-1)
+                irvesons = int(
+                    counts[step.guard().check_batch(block) == OUTCOME_TRUE]
+                    .sum()
+                )
+                flow_weight += instance_weight * irvesons
+                upper_sum += instance_weight * irvesons
+                lower_sum += inst_w.share * irvesons
+                if not precision:
+                    continue
+                other_flows = tree.outgoing(step.offering())
+                other_flows = other_flows.difference(set([step]))
+                for lflow in other_flows:
+                    irvesons = int(
+                        counts[lflow.guard().check_batch(block) 
+                            == OUTCOME_TRUE].sum()
+                    )
+                    lower_sum += inst_w.share * irvesons
+        total_weight += inst_w.share * len(trace) * population
+    return flow_weight, total_weight, upper_sum, lower_sum
+
+def _variant_weights(chunk:List[Tuple[int,int,int]], precision:bool) \
+    -> Tuple[float,float,float,float]:
+    """
+    The work for a chunk of (variant, start, end) ranges of instances, 
+    summing their weights (see _weights_of). The tree and variants are 
+    shared by the worker pool, see _compute_variant_weights.
+    """
+    tree = shared("tree")
+    variants = shared("variants")
+    weights = [0.0, 0.0, 0.0, 0.0]
+    for index, start, end in chunk:
+        trace, instances, counts, candidates = variants[index]
+        part = _weights_of(tree, trace, instances[start:end], 
+                           counts[start:end], candidates, precision)
+        weights = [ w + p for w,p in zip(weights, part) ]
+    return tuple(weights)
+
+def _estimate_cost(tree:TransitionTree, instances:List[ComplexTrace], 
+        candidates:Set[Path], precision:bool) -> float:
+    """
+    Estimates the cost of computing the weights of a variant, as the number
+    of guard checks over unique instances, counting other flows for 
+    precision.
+    """
+    checks = 0
+    for path in candidates:
+        for step in path:
+            checks += 1
+            if precision and isinstance(step, TransitionTreeGuardFlow):
+                checks += len(tree.outgoing(step.offering())) - 1
+    return float(max([checks, 1]) * len(instances))
+
+def _partition_model(model:PetriNetWithData) -> GuardPartitioning:
+    """
+    Partitions data states by the constants that the guards of the model 
+    compare against, so that instances whose prefixes fall into the same
+    intervals are only evaluated once.
+    """
+    partitioning = GuardPartitioning(
+        t.guard for t in model.transitions
+    )
+    info("partitioning data states by intervals over "
+         f"{sorted(partitioning.interval_variables())} and values of "
+         f"{sorted(partitioning.exact_variables())}")
+    return partitioning
+
+def _compute_variant_weights(log:ComplexEventLog, tree:TransitionTree,
+        matching:ManyMatching, precision:bool, n_jobs:int=-2,
+        partitioning:GuardPartitioning=None) \
+        -> List[Tuple[float,float,float,float]]:
+    """
+    Computes the weights of the variants in the log (see _weights_of), 
+    where the tree and the matched variants are loaded once into each worker
+    and tasks only refer to ranges of instances of variants by index. 
+    Instances carrying the same data are only evaluated once, weighted by 
+    their multiplicity (see ComplexEventLog.get_unique_instances). If a 
+    partitioning of data states is given, instances are instead the same 
+    when each of their prefixes falls into the same class, so only one 
+    instance per class is evaluated (see GuardPartitioning).
+
+    The cost of each variant is estimated, so that variants costing more 
+    than a share of the total are split by ranges of instances, while cheap
+    variants are chunked together. The most costly chunks are run first.
+    """
+    if partitioning != None:
+        unique = log.get_unique_instances(key=partitioning.trace_class)
+    else:
+        unique = log.get_unique_instances()
+    variants = [
+        (trace, 
+         [ instance for instance,_ in pairs ],
+         np.array([ count for _,count in pairs ], dtype=np.int64),
+         matching[trace])
+        for trace, pairs
+        in unique.items()
+    ]
+    costs = [ 
+        _estimate_cost(tree, instances, candidates, precision)
+        for _, instances, _, candidates 
+        in variants
     ]
-    weights = pool( 
-        delayed(partial)
-        (traces, instances, path, inst_w)
-        for traces, instances, path, inst_w 
-        in InfoIteratorProcessor("processing variant-paths for guard-recall", 
-            inputs,
-            stack=8
+    total = sum(costs)
+    with WorkerPool({ "tree" : tree, "variants" : variants }, n_jobs=n_jobs,
+                    cost=total) as pool:
+        target = max([total / (pool.workers * CHUNKS_PER_WORKER), 1.0])
+        items = []
+        item_costs = []
+        for index,(cost,(_,instances,_,_)) in enumerate(zip(costs, variants)):
+            ranges = split_ranges(len(instances), ceil(cost / target))
+            for start, end in ranges:
+                items.append((index, start, end))
+                item_costs.append(cost * (end - start) / len(instances))
+        chunks = plan_chunks(items, item_costs, target)
+        info(f"planned {len(chunks)} chunks from {len(variants)} variants "
+             f"with an estimated cost of {total:.0f}")
+        weights = pool.starmap(
+            _variant_weights,
+            ( (chunk, precision) 
+              for chunk 
+              in InfoIteratorProcessor("processing chunks of variants", 
+                chunks,
+                stack=8
+              )
+            )
         )
-    )
     info("completed processing.")
-    info(f"computed weights across flows (flow,total) :: {weights}")
-    flow_weight += sum(
-        f 
-        for f,t 
-        in weights
-    )
-    total_weight += sum( 
-        t 
-        for f,t 
-        in weights
-    )
+    info("computed weights across chunks (flow,total,upper,lower) :: "
+         f"{weights}")
+    return weights
+
+def _optimised_guard_recall(log:ComplexEventLog, tree:TransitionTree,
+        precomputed_matching:ManyMatching=None, 
+        partitioning:GuardPartitioning=None) -> float:
+    """
+    The computation of guard recall, whereby we only loop over the log once.
+    """
+    # matchings for inputs
+    if precomputed_matching != None:
+        matching = precomputed_matching
+    else:
+        matching = construct_many_matching(log, tree)
+    # computation of work
+    weights = _compute_variant_weights(log, tree, matching, precision=False,
+        partitioning=partitioning)
+    flow_weight = sum( w[0] for w in weights )
+    total_weight = sum( w[1] for w in weights )
     recall = flow_weight / total_weight
     info(f"computed guard recall of {recall:.3f}")
     return recall
@@ -184,18 +312,14 @@ def compute_guard_recall(log:ComplexEventLog, model:PetriNetWithData,
     data.
     """
     # find longest observed trace
-    long = None
-    for trace,_ in log:
-        if long == None:
-            long = trace 
-        elif len(trace) > len(long):
-            long = trace 
-    long = len(long)
-    # prepare model
-    tree = construct_from_model(model, longest_playout=long)
+    long = _find_longest(log)
+    # prepare model, where the optimised computation only expands the 
+    # vertices that matching reaches within the cost bound of the variants
+    tree = construct_from_model(model, longest_playout=long, lazy=optimised)
     if (optimised):
         return _optimised_guard_recall(log, tree, 
-                precomputed_matching=precomputed_matching)
+                precomputed_matching=precomputed_matching,
+                partitioning=_partition_model(model))
     else:
         info("creating matchings between all traces")
         if precomputed_matching == None:
@@ -221,80 +345,22 @@ def _computation_guard_precision(tree:TransitionTree, matching:ManyMatching,
     info(f"computed guard precision : {prec:.3f}")
     return prec
 
-def _optimised_guard_precision(log:ComplexEventLog, tree:TransitionTree):
+def _optimised_guard_precision(log:ComplexEventLog, tree:TransitionTree,
+        partitioning:GuardPartitioning=None) -> float:
     """
-    The computation of guard recall, whereby we only loop over the log once.
+    The computation of guard precision, whereby we only loop over the log 
+    once.
     """
-    from pmkoalas.models.transitiontree import TransitionTreeGuardFlow
-    from pmkoalas.models.guards import GuardOutcomes
-    # partial worker 
-    pool = Parallel(n_jobs=-2)
-    def partial(tree, trace, instances, path, inst_w) -> float:
-        upper_sum = 0.0
-        lower_sum = 0.0
-        instance_weight = inst_w(path, trace)
-        for step,i in zip(path, range(1, len(path)+1)):
-                    if isinstance(step, TransitionTreeGuardFlow):
-                        other_flows = step.offering().outgoing(tree.flows())
-                        other_flows = other_flows.difference(set([step]))
-                        for instance in instances:
-                            irveson = step.guard().check(
-                                    instance.get_state_as_of(i-1)
-                                ) == GuardOutcomes.TRUE
-                            upper_sum += instance_weight * int(irveson)
-                            lower_sum += inst_w.share * int(irveson)
-                            for lflow in other_flows:
-                                irveson = lflow.guard().check(
-                                    instance.get_state_as_of(i-1)
-                                ) == GuardOutcomes.TRUE
-                                lower_sum += inst_w.share  * int(irveson)
-        return upper_sum, lower_sum
-    # worker for inputs
+    # matchings for inputs
     info("preparing work")
-    max_length = max([ len(trace) for trace,_ in log])
-    allcads = find_all_paths(tree, max_length)
-    def params(trace, instances, tree, allcads):
-        _,candidates = _computation_many_matching(trace, tree, allcads)
-        return tree, trace, instances, candidates
+    matching = construct_many_matching(log, tree)
     # computation of work
-    inputs = list(pool( 
-        delayed(params)
-        (trace, instances, tree, 
-         set([ cad for cad in allcads if len(cad) <= len(trace)])
-        )
-        for trace,instances 
-        in log 
-    ))
-    inputs = [
-        (tree, trace, instances, path, ExpontentialPathWeighter(matching))
-        for tree, trace, instances, matching
-        in inputs 
-        for path 
-        in matching
-    ]
-    weights = pool( 
-        delayed(partial)
-        (tree, traces, instances, path, inst_w)
-        for tree, traces, instances, path, inst_w 
-        in InfoIteratorProcessor("processing variant-paths for guard-precision", 
-            inputs,
-            stack=8
-        )
-    )
-    info("completed processing.")
-    info(f"computed weights across flows (upper,lower) :: {weights}")
-    upper_sum = sum(
-        up 
-        for up,low 
-        in weights
-    )
-    lower_sum = sum( 
-        low 
-        for up,low 
-        in weights
-    )
+    weights = _compute_variant_weights(log, tree, matching, precision=True,
+        partitioning=partitioning)
+    upper_sum = sum( w[2] for w in weights )
+    lower_sum = sum( w[3] for w in weights )
     prec = (1 + upper_sum) / (1 + lower_sum)
-    info(f"computed guard recall of {prec:.3f}")
+    info(f"computed guard precision of {prec:.3f}")
     return prec
 
 def compute_guard_precision(log:ComplexEventLog, model:PetriNetWithData,
@@ -305,18 +371,74 @@ def compute_guard_precision(log:ComplexEventLog, model:PetriNetWithData,
     data.
     """
     # find longest observed trace
-    long = None
-    for trace,_ in log:
-        if long == None:
-            long = trace 
-        elif len(trace) > len(long):
-            long = trace 
-    long = len(long)
-    # prepare model
-    tree = construct_from_model(model, longest_playout=long)
+    long = _find_longest(log)
+    # prepare model, where the optimised computation only expands the 
+    # vertices that matching reaches within the cost bound of the variants
+    tree = construct_from_model(model, longest_playout=long, lazy=optimised)
     if optimised:
-        return _optimised_guard_precision(log, tree)
+        return _optimised_guard_precision(log, tree, 
+                partitioning=_partition_model(model))
     else:
         matching = construct_many_matching(log, tree)
         # compute measure
         return _computation_guard_precision(tree, matching, log)
+
+def _optimised_guard_measures(log:ComplexEventLog, tree:TransitionTree,
+        precomputed_matching:ManyMatching=None, 
+        partitioning:GuardPartitioning=None) -> Tuple[float,float]:
+    """
+    The computation of guard recall and guard precision together, whereby we
+    only loop over the log once and share the outcomes of guards between 
+    both measures.
+    """
+    # matchings for inputs
+    info("preparing work")
+    if precomputed_matching != None:
+        matching = precomputed_matching
+    else:
+        matching = construct_many_matching(log, tree)
+    # computation of work
+    weights = _compute_variant_weights(log, tree, matching, precision=True,
+        partitioning=partitioning)
+    flow_weight = sum( w[0] for w in weights )
+    total_weight = sum( w[1] for w in weights )
+    upper_sum = sum( w[2] for w in weights )
+    lower_sum = sum( w[3] for w in weights )
+    recall = flow_weight / total_weight
+    prec = (1 + upper_sum) / (1 + lower_sum)
+    info(f"computed guard recall of {recall:.3f}")
+    info(f"computed guard precision of {prec:.3f}")
+    return recall, prec
+
+@enable_logging
+def compute_guard_measures(log:ComplexEventLog, model:PetriNetWithData,
+    optimised:bool=True, precomputed_matching:ManyMatching=None) \
+    -> Tuple[float,float]:
+    """
+    Quanitfies the quality between an event log and a data-aware process model 
+    using both guard-recall and guard-precision, where a data-aware process 
+    model is a Petri net with data. The tree and matching are only built once
+    for both measures.
+
+    Returns a pair of (guard-recall, guard-precision).
+    """
+    # find longest observed trace
+    long = _find_longest(log)
+    # prepare model, where the optimised computation only expands the 
+    # vertices that matching reaches within the cost bound of the variants
+    tree = construct_from_model(model, longest_playout=long, lazy=optimised)
+    if (optimised):
+        return _optimised_guard_measures(log, tree, 
+                precomputed_matching=precomputed_matching,
+                partitioning=_partition_model(model))
+    else:
+        info("creating matchings between all traces")
+        if precomputed_matching == None:
+            matching = construct_many_matching(log, tree)
+        else:
+            matching = precomputed_matching
+        # compute the measures 
+        return (
+            _computation_guard_recall(tree, matching, log),
+            _computation_guard_precision(tree, matching, log)
+        )
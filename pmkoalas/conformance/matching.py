@@ -2,10 +2,11 @@
 This module contains an alignment like process for transition trees, called 
 matchings.
 """
-from typing import Any, Union, Dict, List, Set, Iterable, Tuple
+from typing import Any, Union, Dict, List, Set, Iterable, Tuple, FrozenSet
 from copy import deepcopy
-
-from joblib import Parallel, delayed
+from collections import OrderedDict
+from os import path, makedirs, replace, getpid
+import pickle
 
 from pmkoalas.models.transitiontree import TransitionTreeFlow
 from pmkoalas.models.transitiontree import TransitionTree
@@ -134,23 +135,7 @@ def find_path_in_tree(tree:TransitionTree, tgt:TransitionTreeVertex)\
     """
     Constructs a path from the root to the given node in a tree.
     """
-    seq = []
-    breakdown = Trace([])
-    goal = tgt.sigma_sequence().sequence
-    while breakdown != tgt.sigma_sequence():
-        step = Trace(breakdown.sequence + [goal.pop(0)])
-        found = False
-        for flow in tree.flows():
-            if flow.offering().sigma_sequence() == breakdown:
-                if flow.next().sigma_sequence() == step:
-                    seq.append(flow)
-                    breakdown = step 
-                    found = True 
-                    break 
-        if (not found):
-            raise ValueError("Unable to find a interconnected "\
-                             +"sequence of flows.")
-    return Path(seq)
+    return Path(list(tree.path_to(tgt)))
 
 def mutate_path_with_skips(path:Path, k:int) -> Set[Path]:
     """
@@ -217,6 +202,184 @@ def cost_of_path(path:Path, trace:Trace, root_is_terminal:bool=False) -> int:
         term_cost = 0 if root_is_terminal else 1
     return len_cost + act_cost + term_cost
 
+# the cost of consuming a step of a trace with a skip in the tree, being one
+# for the skip and one for the step not being matched by a flow
+SKIP_STEP_COST = 2
+
+class _VariantTrieNode():
+    """
+    A node in a trie of variants, where each node is a shared prefix.
+    """
+
+    def __init__(self) -> None:
+        self.children:Dict[str,'_VariantTrieNode'] = dict()
+        self.ends:List[Trace] = list()
+        self.longest = 0
+
+def _construct_variant_trie(traces:Iterable[Trace]) -> _VariantTrieNode:
+    """
+    Constructs a trie over the given variants, where each node knows the 
+    length of the longest variant below it.
+    """
+    root = _VariantTrieNode()
+    for trace in traces:
+        node = root
+        node.longest = max([node.longest, len(trace)])
+        for act in trace:
+            if act not in node.children:
+                node.children[act] = _VariantTrieNode()
+            node = node.children[act]
+            node.longest = max([node.longest, len(trace)])
+        node.ends.append(trace)
+    return root
+
+def _term_cost(vertex:TransitionTreeVertex) -> int:
+    return 0 if vertex.terminal() else 1
+
+def _next_matching_layer(layer:Dict[str,tuple], act:str, 
+        tree:TransitionTree, bound:int) \
+        -> Dict[str,tuple]:
+    """
+    Computes the states after consuming the given activity from the states 
+    of a layer, only keeping states that do not cost more than the bound.
+    """
+    ret = dict()
+    for key,(vertex, cost, _) in layer.items():
+        if cost > bound:
+            continue
+        moves = [ (vertex, SKIP_STEP_COST, Skipper()) ]
+        for flow in tree.outgoing(vertex):
+            moves.append(
+                (flow.next(), 0 if flow.activity() == act else 1, flow)
+            )
+        for nvertex, ncost, step in moves:
+            ncost = cost + ncost
+            if ncost > bound:
+                continue
+            nkey = nvertex.id()
+            if nkey not in ret or ncost < ret[nkey][1]:
+                ret[nkey] = (nvertex, ncost, [(key, step)])
+            elif ncost == ret[nkey][1]:
+                ret[nkey][2].append((key, step))
+    return ret
+
+def _walk_back_least_costy(layers:List[Dict[str,tuple]], least:int) \
+    -> Set[Path]:
+    """
+    Recovers all paths that complete with the least cost, where the trace 
+    has as many steps as there are layers after the first.
+    """
+    steps = len(layers) - 1
+    ret = set()
+    stack = [ 
+        (j, key, [])
+        for j,layer in enumerate(layers)
+        for key,(vertex,cost,_) in layer.items()
+        if cost + (steps - j) + _term_cost(vertex) == least
+    ]
+    while len(stack) > 0:
+        j, key, suffix = stack.pop()
+        if j == 0:
+            ret.add(Path(suffix[::-1]))
+            continue
+        for pkey, step in layers[j][key][2]:
+            stack.append((j-1, pkey, suffix + [step]))
+    return ret
+
+def _fitting_paths(tree:TransitionTree, trace:Trace) -> Union[Set[Path],None]:
+    """
+    Finds the paths of zero cost for the trace by walking the tree by 
+    activity, or None if the walk does not end in a terminal vertex. These
+    are the least costy paths for a trace that fits the tree.
+    """
+    vertex = tree.root()
+    for act in trace:
+        vertex = tree.child(vertex, act)
+        if vertex == None:
+            return None
+    if not vertex.terminal():
+        return None
+    return _decode_paths(tree, [tuple(trace)])
+
+def find_least_costy_paths_for_variants(tree:TransitionTree, 
+        traces:Iterable[Trace]) \
+        -> Dict[Trace,Set[Path]]:
+    """
+    Finds the least costy paths in the tree for each of the given traces, 
+    without constructing every candidate path.
+
+    The cost of a path (see cost_of_path) is built up one step of the trace
+    at a time, so a layered dynamic program over (vertex, consumed steps) 
+    finds the least cost. A layer only depends on the prefix of the trace
+    consumed so far, so the traces are first arranged in a trie and each
+    layer is computed once per node of the trie, being shared by all traces 
+    below that node. States that cost more than the best complete path for 
+    every trace below a node are pruned. All paths of least cost are then 
+    recovered by walking back through the states. For each trace, the 
+    result is the same set of paths as find_least_costy_paths over all 
+    candidates of at most the length of the trace.
+
+    Traces that fit the tree are matched first by walking the tree by 
+    activity (see _fitting_paths), so that only the remaining traces are
+    arranged in the trie.
+
+    Parameters
+    ----------
+    `tree`: the tree to find paths in.\n
+    `traces`: the traces to match.
+    """
+    # walk over shared views of the tree, rather than copies
+    tree = tree.freeze()
+    root = tree.root()
+    ret = dict()
+    remaining = []
+    for trace in traces:
+        fitting = _fitting_paths(tree, trace)
+        if fitting != None:
+            ret[trace] = fitting
+        else:
+            remaining.append(trace)
+    info(f"{len(ret)} variants fit the tree, searching for "
+         f"{len(remaining)} variants")
+    trie = _construct_variant_trie(remaining)
+    # completing a trace of length n from a state at layer j costs
+    # cost + (n - j) + term, so the best completion for any n is tracked
+    # by the least (cost - j + term) seen along the prefix
+    layers = []
+    bests = []
+    stack = [ (trie, 0, None) ]
+    while len(stack) > 0:
+        node, depth, act = stack.pop()
+        # drop the layers of previously explored branches
+        del layers[depth:]
+        del bests[depth:]
+        if depth == 0:
+            layer = { root.id() : (root, 0, []) }
+            best = _term_cost(root)
+        else:
+            bound = bests[-1] + node.longest
+            layer = _next_matching_layer(layers[-1], act, tree, bound)
+            best = min([bests[-1]] + [ 
+                cost - depth + _term_cost(vertex)
+                for vertex, cost, _ in layer.values()
+            ])
+        layers.append(layer)
+        bests.append(best)
+        for trace in node.ends:
+            ret[trace] = _walk_back_least_costy(layers, best + depth)
+        for act, child in node.children.items():
+            stack.append((child, depth+1, act))
+    return ret
+
+def find_least_costy_paths_in_tree(tree:TransitionTree, trace:Trace) \
+    -> Set[Path]:
+    """
+    Finds the least costy paths in the tree for the given trace, without 
+    constructing every candidate path, see 
+    find_least_costy_paths_for_variants.
+    """
+    return find_least_costy_paths_for_variants(tree, [trace])[trace]
+
 def find_least_costy_paths(paths:Set[Path], trace:Trace, 
         root_is_terminal:bool=False) -> set[Path]:
     """
@@ -269,19 +432,32 @@ class ExpontentialPathWeighter():
         """
         return 1 / self.size
         
-def _computation_many_matching(trace, tree, allcads) -> Tuple[Trace,Set[Path]]:
+def _computation_many_matching(trace, tree, allcads=None) \
+    -> Tuple[Trace,Set[Path]]:
     """
-    The individual work for a given trace, to find a matching.
+    The individual work for a given trace, to find a matching. If no 
+    candidates are given, the least costy paths are found directly in the 
+    tree.
     """
     # noskips = find_non_skipping_candidates(tree, trace)
     # skippings = find_skipping_candidates(tree,trace)
     # terminals = find_terminal_candidates(tree,trace)
-    if len(allcads) > 0:
-        least_costy = find_least_costy_paths(
-            allcads,
-            trace,
-            root_is_terminal=tree.root() in tree.terminals()
-        )
+    if allcads == None:
+        least_costy = find_least_costy_paths_in_tree(tree, trace)
+    elif len(allcads) > 0:
+        # paths of zero cost are always least costy, so only score the 
+        # candidates when the trace does not fit
+        fitting = _fitting_paths(tree.freeze(), trace)
+        if fitting != None:
+            fitting = fitting.intersection(allcads)
+        if fitting != None and len(fitting) > 0:
+            least_costy = fitting
+        else:
+            least_costy = find_least_costy_paths(
+                allcads,
+                trace,
+                root_is_terminal=tree.root() in tree.terminals()
+            )
     else: 
         raise Exception(f"Unable to find any candidates for :: {trace}")
     cost = 0
@@ -291,28 +467,188 @@ def _computation_many_matching(trace, tree, allcads) -> Tuple[Trace,Set[Path]]:
     info(f"for trace {trace}, we found {len(least_costy)} paths of cost={cost}")
     return (trace, least_costy)
 
+def _encode_path(path:Path) -> Tuple[Union[str,None]]:
+    """
+    Encodes a path as the activity of each flow, or None for a skip, which 
+    is enough to find the path again as children are unique by activity.
+    """
+    return tuple( 
+        None if isinstance(step, Skipper) else step.activity() 
+        for step in path 
+    )
+
+def _decode_paths(tree:TransitionTree, 
+        encoded:Iterable[Tuple[Union[str,None]]]) -> Set[Path]:
+    """
+    Finds the paths in the tree for the given encodings, where an encoding 
+    is a path for each flow between the same vertices.
+    """
+    tree = tree.freeze()
+    ret = set()
+    for steps in encoded:
+        partials = [ (tree.root(), []) ]
+        for step in steps:
+            nexts = []
+            for vertex, seq in partials:
+                if step == None:
+                    nexts.append((vertex, seq + [Skipper()]))
+                    continue
+                for flow in tree.outgoing(vertex):
+                    if flow.activity() == step:
+                        nexts.append((flow.next(), seq + [flow]))
+            partials = nexts
+        for _, seq in partials:
+            ret.add(Path(seq))
+    return ret
+
+class MatchingStore():
+    """
+    A store of the least costy paths found for variants, keyed by the 
+    fingerprint of the tree (see TransitionTree.fingerprint) and the 
+    variant. Paths only depend on the activities of a variant and the shape
+    of the tree, so variants that have been matched before against the same
+    tree are not matched again.
+
+    The paths for the most recently used trees are kept in memory, and when
+    a directory is given, the paths for each tree are also kept on disk, 
+    which outlives the process. A store with a size of zero and no directory
+    is disabled, which is how MATCHING_STORE starts.
+    """
+
+    def __init__(self, maxsize:int=8, directory:str=None) -> None:
+        self._maxsize = maxsize
+        self.directory = directory
+        self._store:OrderedDict[str,Dict[Tuple[str],FrozenSet[Tuple]]] = \
+            OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        " the number of trees for which paths can be kept in memory."
+        return self._maxsize
+    
+    @property
+    def enabled(self) -> bool:
+        " whether paths are kept, in memory or on disk."
+        return self._maxsize > 0 or self.directory != None
+    
+    def resize(self, maxsize:int) -> None:
+        """
+        Changes the number of trees for which paths can be kept in memory,
+        dropping the least recently used trees if needed.
+        """
+        self._maxsize = max([maxsize, 0])
+        while len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def _disk_path(self, fingerprint:str) -> str:
+        return path.join(self.directory, f"{fingerprint}.pkl")
+
+    def _load(self, fingerprint:str) -> Dict[Tuple[str],FrozenSet[Tuple]]:
+        if self.directory == None:
+            return dict()
+        try:
+            with open(self._disk_path(fingerprint), "rb") as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return dict()
+
+    def _paths_for(self, fingerprint:str) \
+        -> Dict[Tuple[str],FrozenSet[Tuple]]:
+        " returns the encoded paths of variants kept for the tree."
+        if fingerprint in self._store:
+            self._store.move_to_end(fingerprint)
+            return self._store[fingerprint]
+        paths = self._load(fingerprint)
+        if self._maxsize > 0:
+            self._store[fingerprint] = paths
+            if len(self._store) > self._maxsize:
+                self._store.popitem(last=False)
+        return paths
+
+    def lookup(self, tree:TransitionTree, traces:Iterable[Trace]) \
+        -> Tuple[Dict[Trace,Set[Path]],List[Trace]]:
+        """
+        Returns the paths for the traces that have been matched against the 
+        tree before, and the traces that have not.
+        """
+        paths = self._paths_for(tree.fingerprint())
+        found = dict()
+        missing = list()
+        for trace in traces:
+            variant = tuple(trace.sequence)
+            if variant in paths:
+                found[trace] = _decode_paths(tree, paths[variant])
+            else:
+                missing.append(trace)
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+    
+    def add(self, tree:TransitionTree, matched:Dict[Trace,Set[Path]]) \
+        -> None:
+        " keeps the paths found for each trace against the tree."
+        fingerprint = tree.fingerprint()
+        paths = self._paths_for(fingerprint)
+        for trace, found in matched.items():
+            paths[tuple(trace.sequence)] = frozenset(
+                _encode_path(path) for path in found
+            )
+        if self.directory != None:
+            # keep the paths added by other processes as well
+            stored = self._load(fingerprint)
+            stored.update(paths)
+            paths.update(stored)
+            makedirs(self.directory, exist_ok=True)
+            temp = self._disk_path(fingerprint) + f".{getpid()}.tmp"
+            with open(temp, "wb") as file:
+                pickle.dump(stored, file, protocol=pickle.HIGHEST_PROTOCOL)
+            replace(temp, self._disk_path(fingerprint))
+
+    def clear(self) -> None:
+        " drops all paths kept in memory and resets the counters."
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum( len(paths) for paths in self._store.values() )
+    
+    def __str__(self) -> str:
+        return f"MatchingStore(variants={len(self)}, " + \
+            f"directory={self.directory}, hits={self.hits}, " + \
+            f"misses={self.misses})"
+
+# the store used by construct_many_matching by default, which is disabled 
+# until given a size with MatchingStore.resize, or a directory to keep paths
+# on disk
+MATCHING_STORE = MatchingStore(maxsize=0)
+
 def construct_many_matching(log:Union[EventLog,ComplexEventLog], 
-                            tree:TransitionTree) \
+                            tree:TransitionTree, 
+                            store:MatchingStore=MATCHING_STORE) \
      -> ManyMatching:
     """
     Constructs a set of likely cadidate paths for each trace in the log,
-    then constructs a map from traces to these sets.
+    then constructs a map from traces to these sets. When the given store is
+    enabled, only variants that are not in the store for the tree are 
+    matched, and the paths found are added to it.
     """
     mapping = ManyMatching(dict())
-    max_length = max(
-        [len(trace) for trace,_ in log]
-    )
-    allcads = find_all_paths(tree, max_length)
-    rets = Parallel(n_jobs=-2)(
-        delayed(_computation_many_matching)(trace,tree,allcads)
-        for trace,allcads
-        in InfoIteratorProcessor(
-            "matchings", 
-            [ (trace,set([ cad for cad in allcads if len(cad) <= len(trace)]))
-             for trace,_ in log ]
-            ,stack=8)
-    )
-    for trace,least_costy in rets:
+    traces = [ trace for trace,_ in log ]
+    if store != None and store.enabled:
+        rets, missing = store.lookup(tree, traces)
+    else:
+        rets, missing = dict(), traces
+    if len(missing) > 0:
+        computed = find_least_costy_paths_for_variants(tree, missing)
+        if store != None and store.enabled:
+            store.add(tree, computed)
+        rets.update(computed)
+    info(f"matched {len(missing)} of {len(traces)} variants")
+    for trace in traces:
+        least_costy = rets[trace]
         info(f"no. of matching generated for {trace} was {len(least_costy)}")
         mapping.add_to_map(trace, least_costy)
     return mapping
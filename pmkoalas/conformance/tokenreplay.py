@@ -2,8 +2,8 @@
 This module focuses on providing ways to produce a log from models in the class
 of Petri nets.
 """
-from copy import deepcopy
-from typing import Dict, Iterable, Mapping,Set,List
+from copy import copy, deepcopy
+from typing import Dict, Iterable, Iterator, Mapping, Set, List, Tuple
 
 from pmkoalas import __version__
 from pmkoalas.complex import ComplexEventLog, ComplexTrace, ComplexEvent
@@ -14,7 +14,8 @@ from pmkoalas._logging import info, InfoQueueProcessor, InfoIteratorProcessor
 #typing imports
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
-    from pmkoalas.models.guards import Guard, GuardOutcomes
+    from pmkoalas.models.guards import Guard, GuardOutcomes, DataStateBlock
+    import numpy as np
     from pmkoalas.models.petrinet import LabelledPetriNet, PetriNetWithData
     from pmkoalas.models.petrinet import Place, Transition
 
@@ -32,6 +33,9 @@ class PlayoutTransitionGuard(TransitionTreeGuard):
     def check(self, data: ComplexEvent) -> 'GuardOutcomes':
         return self._guard.evaluate_data(data)
     
+    def check_batch(self, block: 'DataStateBlock') -> 'np.ndarray':
+        return self._guard.evaluate_batch(block)
+    
     def html_label(self) -> str:
         return f"g<sub>{self._id}</sub>"
     
@@ -90,7 +94,10 @@ class PetriNetMarking():
             next_mark[incoming] = next_mark[incoming] - 1
         for outcoming in self._outcoming[firing]:
             next_mark[outcoming] = next_mark[outcoming] + 1
-        return PetriNetMarking(self._net, next_mark)
+        # share the places around transitions, rather than scanning arcs 
+        next = copy(self)
+        next._mark = next_mark
+        return next
     
     # data-model functions
     def __eq__(self, other: object) -> bool:
@@ -164,6 +171,131 @@ class PetriNetFiringSequence():
         return hash( tuple(self._seq + [self.reached_final()]))
 
 
+class CompiledPetriNet():
+    """
+    A Petri net compiled into integer incidence vectors, where places and 
+    transitions are referred to by their index and a marking is a tuple of
+    token counts over places. The reachability graph of the net is explored
+    on demand and cached by marking, so that the successors of a marking 
+    are only computed once.
+    """
+
+    def __init__(self, model:'LabelledPetriNet') -> None:
+        self._transitions:List['Transition'] = sorted(
+            model.transitions, key=lambda t: (t.name, t.tid)
+        )
+        self._places:List['Place'] = sorted(
+            model.places, key=lambda p: (p.name, p.pid)
+        )
+        place_ids = dict( (p,i) for i,p in enumerate(self._places) )
+        trans_ids = dict( (t,i) for i,t in enumerate(self._transitions) )
+        self._pre:List[List[int]] = [ [] for _ in self._transitions ]
+        self._post:List[List[int]] = [ [] for _ in self._transitions ]
+        for arc in model.arcs:
+            if arc.to_node in trans_ids:
+                self._pre[trans_ids[arc.to_node]].append(
+                    place_ids[arc.from_node]
+                )
+            else:
+                self._post[trans_ids[arc.from_node]].append(
+                    place_ids[arc.to_node]
+                )
+        # the change in tokens over places for each transition
+        self._delta:List[Tuple[int]] = []
+        for pre,post in zip(self._pre, self._post):
+            delta = [0] * len(self._places)
+            for place in pre:
+                delta[place] -= 1
+            for place in post:
+                delta[place] += 1
+            self._delta.append(tuple(delta))
+        self._silent = [ t.silent for t in self._transitions ]
+        self._graph:Dict[Tuple[int],List[Tuple[int,Tuple[int]]]] = dict()
+
+    def transition(self, index:int) -> 'Transition':
+        " returns the transition at the given index."
+        return self._transitions[index]
+    
+    def silent(self, index:int) -> bool:
+        " returns whether the transition at the given index is silent."
+        return self._silent[index]
+
+    def marking(self, marking:PetriNetMarking) -> Tuple[int]:
+        " returns the given marking as a tuple of token counts."
+        return tuple( marking._mark.get(p, 0) for p in self._places )
+    
+    def successors(self, marking:Tuple[int]) \
+        -> List[Tuple[int,Tuple[int]]]:
+        """
+        returns the transitions that can fire from the given marking, with 
+        the marking reached by firing each.
+        """
+        if marking not in self._graph:
+            ret = []
+            for trans,pre in enumerate(self._pre):
+                if all( marking[place] > 0 for place in pre ):
+                    ret.append((trans, tuple( 
+                        m + d for m,d in zip(marking, self._delta[trans]) 
+                    )))
+            self._graph[marking] = ret
+        return self._graph[marking]
+    
+    def reachable(self) -> int:
+        " returns the number of markings explored so far."
+        return len(self._graph)
+
+def playout_sequences(model:'LabelledPetriNet', max_length:int,
+        initial_marking:'PetriNetMarking', final_marking:'PetriNetMarking') \
+        -> Iterator[Tuple[List['Transition'],bool]]:
+    """
+    Generates the firing sequences of a model, that have at least one and at 
+    most max_length visible transitions, with whether each sequence reaches
+    the final marking. Sequences are not extended past the final marking, and
+    a silent transition is not fired a third time in a row of silent 
+    transitions.
+
+    Sequences are found by unfolding the cached reachability graph of the 
+    model (see CompiledPetriNet) depth first, where each sequence is only 
+    kept as a link to the sequence it extends.
+    """
+    net = CompiledPetriNet(model)
+    final = net.marking(final_marking)
+    # a partial sequence is (marking, prefix, transition, visible, silents)
+    # where silents are the trailing silent transitions fired
+    stack = [ (net.marking(initial_marking), None, None, 0, tuple()) ]
+    pbar = InfoQueueProcessor(itername="processed partials",
+                              starting_size=len(stack)
+    )
+    while len(stack) > 0:
+        partial = stack.pop()
+        marking, _, _, visible, silents = partial
+        reached = marking == final
+        if visible > 0:
+            fired = []
+            link = partial
+            while link[1] != None:
+                fired.append(net.transition(link[2]))
+                link = link[1]
+            yield fired[::-1], reached
+        if not reached:
+            for trans, next_marking in net.successors(marking):
+                if net.silent(trans):
+                    if silents.count(trans) > 1:
+                        continue
+                    stack.append(
+                        (next_marking, partial, trans, visible, 
+                         silents + (trans,))
+                    )
+                elif visible < max_length:
+                    stack.append(
+                        (next_marking, partial, trans, visible+1, tuple())
+                    )
+                else:
+                    continue
+                pbar.extent(1)
+        pbar.update()
+    info(f"explored {net.reachable()} markings in play-out.")
+
 class PlayoutEvent(ComplexEvent):
     """
     An abstraction for playout events.
@@ -222,75 +354,62 @@ class PlayoutTrace(ComplexTrace):
         """
         return self[i].guard
 
-def construct_playout_log(model:'PetriNetWithData', max_length:int, 
+def playout_steps(model:'PetriNetWithData', max_length:int, 
         initial_marking:'PetriNetMarking', final_marking:'PetriNetMarking') \
-        -> ComplexEventLog:
-    """ 
-    Constructs a log of play-out traces from a model with a length of 
-    max_length + 1.
+        -> Iterator[Tuple[List[Tuple[str,TransitionTreeGuard]],bool]]:
+    """
+    Generates the play-out of a model as sequences of steps, where a step is
+    the activity of a visible transition with the guard for taking it, and
+    whether each sequence reaches the final marking. The guards of silent 
+    transitions are merged into the guard of the next step, and dropped if 
+    no step follows. See playout_sequences.
     """
     # importing here to remove circular dependencies.
     from pmkoalas.models.transitiontree import TransitionTreeMerge
 
-    playout_traces = list()
-    completed:Set[PetriNetFiringSequence] = set()
-    incomplete = [ 
-        PetriNetFiringSequence(initial_marking, list(), final_marking)
-    ]
-    seen = set()
-    pbar = InfoQueueProcessor(itername="processed partials",
-                                 starting_size=len(incomplete)
-    )
-    while len(incomplete) > 0:
-        select = incomplete.pop(0)
-        if (len(select) > 0):
-            completed.add(select)
-        seen.add(select)
-        potentials = list()
-        for firing in select.next():
-            potentials.append(select.fire(firing))
-        for pot in potentials:
-            if pot not in seen and len(pot) <= max_length:
-                incomplete.append(pot)
-                pbar.extent(1)
-        pbar.update()        
-    # now for each completed trace, we need to produce a complex trace
-    trace_id = 1
-    guard_id = 1
-    guard_ids = {}
-    for comp in InfoIteratorProcessor("play-out traces", completed):
-        trace_map = {
-            "concept:name" : f"play-out trace {trace_id}"
-        }
-        trace_seq = list()
+    guards:Dict['Guard',PlayoutTransitionGuard] = dict()
+    for fired_seq, reached_final in playout_sequences(model, max_length, 
+            initial_marking, final_marking):
+        steps = list()
         leftover_guard = None 
-        # build sequence of fired transitions
-        ## but profilerate guards on silence, without recording them
-        for fired in comp.fired():
-            if fired.guard not in guard_ids:
-                guard_ids[fired.guard] = guard_id
-                guard_id += 1
+        for fired in fired_seq:
+            if fired.guard not in guards:
+                guards[fired.guard] = PlayoutTransitionGuard(
+                    fired.guard, len(guards) + 1
+                )
+            guard = guards[fired.guard]
             if fired.silent:
                 if leftover_guard == None:
-                    leftover_guard = PlayoutTransitionGuard(
-                        fired.guard,
-                        guard_ids[fired.guard]
-                    )
+                    leftover_guard = guard
                 else:
                     leftover_guard = TransitionTreeMerge(
-                        leftover_guard, 
-                        PlayoutTransitionGuard(fired.guard, guard_ids[fired.guard])
+                        leftover_guard, guard
                     )
             else:
-                guard = PlayoutTransitionGuard(fired.guard, guard_ids[fired.guard])
                 if leftover_guard != None:
                     guard = TransitionTreeMerge(leftover_guard, guard)
                     leftover_guard = None
-                trace_seq.append(
-                    PlayoutEvent(fired.name, guard)
-                )
+                steps.append((fired.name, guard))
+        yield steps, reached_final
+
+def construct_playout_log(model:'PetriNetWithData', max_length:int, 
+        initial_marking:'PetriNetMarking', final_marking:'PetriNetMarking') \
+        -> ComplexEventLog:
+    """ 
+    Constructs a log of play-out traces from a model with a length of 
+    max_length + 1.
+    """
+    playout_traces = list()
+    # for each sequence in the play-out, we need to produce a complex trace
+    trace_id = 1
+    for steps, reached_final in playout_steps(model, max_length, 
+            initial_marking, final_marking):
+        trace_map = {
+            "concept:name" : f"play-out trace {trace_id}"
+        }
+        trace_seq = [ PlayoutEvent(act, guard) for act,guard in steps ]
         # add halt symbol if required
-        if comp.reached_final():
+        if reached_final:
             trace_seq.append(PlayoutEnd())
         # construct trace and store
         playout_traces.append(
@@ -306,4 +425,4 @@ def construct_playout_log(model:'PetriNetWithData', max_length:int,
         "meta:generator:version" : __version__
         }), 
         f"playout log for {model._name}"
-    )
\ No newline at end of file
+    )
@@ -6,6 +6,7 @@ with data.
 from pmkoalas._logging import debug
 from pmkoalas.complex import ComplexTrace
 
+import numpy as np
 
 from pyparsing import (
     Word,
@@ -18,9 +19,11 @@ from pyparsing import (
     Literal,
 )
 
-from typing import Any,Set,Dict, Union
+from typing import Any,Set,Dict, Union, Callable, Mapping, List, Iterable
+from typing import Tuple
 from copy import deepcopy,copy
 from enum import Enum
+from collections import OrderedDict
 
 class EvalLiteral:
     "Class to evaluate a parsed literal"
@@ -31,6 +34,16 @@ class EvalLiteral:
     def eval(self):
         return eval( self.value.replace('&#34;',"'"))
 
+    def compile(self) -> Callable[[Mapping[str,object]], Any]:
+        "returns a function over a data state that produces this literal"
+        value = self.eval()
+        return lambda state: value
+
+    def compile_batch(self) -> Callable[[Mapping[str,np.ndarray]], Any]:
+        "returns a function over columns of data states for this value"
+        value = self.eval()
+        return lambda columns: value
+
     def __call__(self, tokens) -> Any:
         self.value = tokens[0]
         return copy(self)
@@ -54,6 +67,20 @@ class EvalVariable:
             return self._state_space[self.value]
         raise ValueError(f"Undefined variable :: {self.value}")
 
+    def compile(self) -> Callable[[Mapping[str,object]], Any]:
+        "returns a function that looks up this variable in a data state"
+        name = self.value
+        def variable(state):
+            if name in state:
+                return state[name]
+            raise ValueError(f"Undefined variable :: {name}")
+        return variable
+
+    def compile_batch(self) -> Callable[[Mapping[str,np.ndarray]], Any]:
+        "returns a function that selects the column for this variable"
+        name = self.value
+        return lambda columns: columns[name]
+
     def seen_variables(self) -> Set:
         return self._observed_variables
     
@@ -75,10 +102,65 @@ class EvalConstant:
             return False
         return float(self.value)
 
+    def compile(self) -> Callable[[Mapping[str,object]], Any]:
+        "returns a function over a data state that produces this constant"
+        value = self.eval()
+        return lambda state: value
+
+    def compile_batch(self) -> Callable[[Mapping[str,np.ndarray]], Any]:
+        "returns a function over columns of data states for this value"
+        value = self.eval()
+        return lambda columns: value
+
     def __call__(self, tokens) -> Any:
         self.value = tokens[0]
         return copy(self)
 
+def _truthy(value:object) -> Union[bool,np.ndarray]:
+    "returns the truthiness of a value or elementwise over a column"
+    if isinstance(value, np.ndarray):
+        if value.dtype == bool:
+            return value
+        elif value.dtype.kind in "iuf":
+            return value != 0
+        return np.array([ bool(v) for v in value ], dtype=bool)
+    return bool(value)
+
+def _is_numeric(value:object) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in "biuf"
+    return isinstance(value, (int, float))
+
+def _inexact_pair(ints:object, floats:object) -> bool:
+    """
+    returns whether comparing the first operand against the second as 
+    floats would round integers that are not exact as floats, which python
+    avoids by comparing them exactly.
+    """
+    if not (isinstance(ints, np.ndarray) and ints.dtype.kind in "iu"):
+        return False
+    if isinstance(floats, np.ndarray):
+        if floats.dtype.kind != "f":
+            return False
+    elif not isinstance(floats, float):
+        return False
+    return ints.size > 0 and int(np.abs(ints).max()) > _EXACT_FLOAT_INT
+
+def _batch_comparison(fn:Callable[[Any,Any],Any]) \
+    -> Callable[[Any,Any],np.ndarray]:
+    """
+    returns an elementwise version of a comparison, where non-numeric values
+    are compared as python objects.
+    """
+    def comparison(a, b):
+        if not (_is_numeric(a) and _is_numeric(b)) or \
+            _inexact_pair(a, b) or _inexact_pair(b, a):
+            if isinstance(a, np.ndarray):
+                a = a.astype(object)
+            if isinstance(b, np.ndarray):
+                b = b.astype(object)
+        return fn(a, b)
+    return comparison
 
 class EvalComparisonOp:
     "Class to evaluate comparison expressions"
@@ -96,6 +178,20 @@ class EvalComparisonOp:
         '&&': lambda a,b: a and b,
         '||': lambda a,b: a or b
     }
+    batchMap = {
+        "&lt;" : _batch_comparison(lambda a, b: a < b),
+        "&lt;=" : _batch_comparison(lambda a,b: a <= b),
+        "&gt;" : _batch_comparison(lambda a, b: a > b),
+        "&gt;=" : _batch_comparison(lambda a,b: a >= b),
+        "==": _batch_comparison(lambda a, b: a == b),
+        '&amp;&amp;': lambda a,b: np.logical_and(_truthy(a), _truthy(b)),
+        "<" : _batch_comparison(lambda a, b: a < b),
+        "<=" : _batch_comparison(lambda a,b: a <= b),
+        ">" : _batch_comparison(lambda a, b: a > b),
+        ">=" : _batch_comparison(lambda a,b: a >= b),
+        '&&': lambda a,b: np.logical_and(_truthy(a), _truthy(b)),
+        '||': lambda a,b: np.logical_or(_truthy(a), _truthy(b))
+    }
 
     def __init__(self):
         self.value = None
@@ -116,6 +212,49 @@ class EvalComparisonOp:
         debug("resulting in false")
         return False
 
+    def compile(self) -> Callable[[Mapping[str,object]], bool]:
+        """
+        returns a function over a data state that follows the same chained
+        semantics as eval, i.e. operands are only evaluated until the first 
+        failing pair.
+        """
+        first = self.value[0].compile()
+        pairs = [ 
+            (EvalComparisonOp.opMap[op], val.compile()) 
+            for op, val 
+            in self.operatorOperands(self.value[1:])
+        ]
+        def comparison(state):
+            val1 = first(state)
+            for fn, operand in pairs:
+                val2 = operand(state)
+                if not fn(val1, val2):
+                    return False
+                val1 = val2
+            return True
+        return comparison
+
+    def compile_batch(self) -> Callable[[Mapping[str,np.ndarray]], Any]:
+        """
+        returns a function over columns of data states, which computes every
+        pair elementwise and requires all pairs to hold.
+        """
+        first = self.value[0].compile_batch()
+        pairs = [ 
+            (EvalComparisonOp.batchMap[op], val.compile_batch()) 
+            for op, val 
+            in self.operatorOperands(self.value[1:])
+        ]
+        def comparison(columns):
+            val1 = first(columns)
+            check = True
+            for fn, operand in pairs:
+                val2 = operand(columns)
+                check = np.logical_and(check, _truthy(fn(val1, val2)))
+                val1 = val2
+            return check
+        return comparison
+
     def operatorOperands(self,tokenlist):
         "generator to extract operators and operands in pairs"
         it = iter(tokenlist)
@@ -189,26 +328,276 @@ class ExpressionParser():
     def result(self):
         return self._result.eval()
     
+    def compile(self) -> Callable[[Mapping[str,object]], Any]:
+        """
+        returns an executable form of the parsed expression, which takes a 
+        data state and returns the result of the expression.
+        """
+        return self._result.compile()
+    
+    def compile_batch(self) -> Callable[[Mapping[str,np.ndarray]], Any]:
+        """
+        returns an executable form of the parsed expression, which takes 
+        columns of data states and returns the result for each row.
+        """
+        return self._result.compile_batch()
+    
 class GuardOutcomes(Enum):
     TRUE = True 
     FALSE = False
     UNDEF = "undefined"
+
+# batch evaluations use the index of an outcome in this ordering as its code
+OUTCOME_ORDER = [GuardOutcomes.FALSE, GuardOutcomes.TRUE, GuardOutcomes.UNDEF]
+OUTCOME_FALSE = OUTCOME_ORDER.index(GuardOutcomes.FALSE)
+OUTCOME_TRUE = OUTCOME_ORDER.index(GuardOutcomes.TRUE)
+OUTCOME_UNDEF = OUTCOME_ORDER.index(GuardOutcomes.UNDEF)
+# the truthiness of each outcome in python, which is used by the batch forms
+# of the checks on merged and joined guards to follow their scalar forms. 
+# Members of an enum are always truthy, including FALSE and UNDEF, so the 
+# scalar `and`/`or` over outcomes keep the last/first outcome, and so do the
+# batch forms.
+OUTCOME_TRUTH = np.array([ bool(o) for o in OUTCOME_ORDER ], dtype=bool)
+
+def outcome_code(outcome:GuardOutcomes) -> int:
+    " returns the code used for the given outcome in batch evaluations."
+    return OUTCOME_ORDER.index(outcome)
+
+def outcomes_from_codes(codes:np.ndarray) -> List[GuardOutcomes]:
+    " converts a vector of codes from a batch evaluation into outcomes."
+    return [ OUTCOME_ORDER[c] for c in codes ]
+
+class GuardOutcomeCache():
+    """
+    A bounded cache of outcomes of expressions, keyed by the expression and 
+    the data state projected onto the variables the expression reads. When
+    full, the least recently used outcome is dropped. Hits and misses are 
+    counted, to report how often outcomes are reused. A cache with a size of
+    zero is disabled.
+    """
+
+    def __init__(self, maxsize:int=2**16) -> None:
+        self._maxsize = maxsize
+        self._store:OrderedDict[Tuple,int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        " the number of outcomes that can be kept."
+        return self._maxsize
+    
+    @property
+    def enabled(self) -> bool:
+        " whether outcomes are kept."
+        return self._maxsize > 0
+    
+    def resize(self, maxsize:int) -> None:
+        """
+        Changes the number of outcomes that can be kept, dropping the least 
+        recently used outcomes if needed.
+        """
+        self._maxsize = max([maxsize, 0])
+        while len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def get(self, key:Tuple) -> Union[int,None]:
+        " returns the outcome code for the key, or None if not kept."
+        code = self._store.get(key, None)
+        if code == None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._store.move_to_end(key)
+        return code
     
+    def put(self, key:Tuple, code:int) -> None:
+        " keeps the outcome code for the key."
+        if not self.enabled:
+            return
+        self._store[key] = code
+        self._store.move_to_end(key)
+        if len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        " returns the share of lookups that found an outcome."
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+    
+    def clear(self) -> None:
+        " drops all outcomes and resets the counters."
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
+    
+    def __str__(self) -> str:
+        return f"GuardOutcomeCache(size={len(self)}/{self.maxsize}, " + \
+            f"hits={self.hits}, misses={self.misses}, " + \
+            f"hit rate={self.hit_rate():.3f})"
+
+# the cache used by all expressions, which is disabled until given a size 
+# with GuardOutcomeCache.resize
+GUARD_OUTCOME_CACHE = GuardOutcomeCache(maxsize=0)
+
+# the largest magnitude below which every integer is exact as a float
+_EXACT_FLOAT_INT = 2**53
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+def _column_type(values:List[object]) -> object:
+    """
+    returns the type to store a column of the given values with, being 
+    int64 for integers, float for numbers where every integer is exact as 
+    a float, and object for anything else, so comparisons follow python.
+    """
+    if all( isinstance(v, int) for v in values ):
+        if all( _INT64_MIN <= v <= _INT64_MAX for v in values ):
+            return np.int64
+        return object
+    if all( isinstance(v, (int, float)) for v in values ):
+        if all( abs(v) <= _EXACT_FLOAT_INT 
+                for v in values if isinstance(v, int) ):
+            return float
+    return object
+
+class DataStateBlock():
+    """
+    A columnar block of data states, where each row is a data state and each
+    attribute is stored as a column alongside a mask of the rows that define
+    it. Columns of integers are stored as int64 arrays, and columns of 
+    numbers as float arrays when every integer is exact as a float, while 
+    all other columns are stored as arrays of python objects.
+    """
+
+    def __init__(self, states:Iterable[Mapping[str,object]]) -> None:
+        self._states = list(states)
+        self._size = len(self._states)
+        self._columns:Dict[str,np.ndarray] = dict()
+        self._defined:Dict[str,np.ndarray] = dict()
+        keys = set( key for state in self._states for key in state )
+        for key in keys:
+            defined = np.array(
+                [ key in state for state in self._states ], dtype=bool
+            )
+            values = [ state.get(key, None) for state in self._states ]
+            present = [ v for v, d in zip(values, defined) if d ]
+            dtype = _column_type(present)
+            if dtype != object:
+                column = np.array(
+                    [ v if d else 0 for v,d in zip(values, defined) ],
+                    dtype=dtype
+                )
+            else:
+                column = np.empty(self._size, dtype=object)
+                for row, value in enumerate(values):
+                    column[row] = value
+            self._columns[key] = column
+            self._defined[key] = defined
+
+    @classmethod
+    def from_instances(cls, instances:Iterable[ComplexTrace], i:int) \
+        -> 'DataStateBlock':
+        """
+        Constructs a block from the data states of each instance before the 
+        i-th event.
+        """
+        return cls( instance.get_state_as_of(i) for instance in instances )
+
+    @property
+    def size(self) -> int:
+        " the number of data states in this block."
+        return self._size
+
+    def column(self, key:str) -> np.ndarray:
+        " returns the column of values for the given attribute."
+        if key in self._columns:
+            return self._columns[key]
+        return np.empty(self._size, dtype=object)
+
+    def defined(self, key:str) -> np.ndarray:
+        " returns a mask of the rows that define the given attribute."
+        if key in self._defined:
+            return self._defined[key]
+        return np.zeros(self._size, dtype=bool)
+
+    def state(self, row:int) -> Mapping[str,object]:
+        " returns the data state of the given row."
+        return self._states[row]
+
+    def __len__(self) -> int:
+        return self._size
+    
+def _distinct_rows(columns:Mapping[str,np.ndarray], order:Tuple[str]) \
+    -> Union[Tuple[np.ndarray,np.ndarray],None]:
+    """
+    Finds the distinct rows over the given columns, where values of object 
+    columns are told apart by their type and value. Returns the position of 
+    the first row of each distinct row, and for each row the index of its 
+    distinct row, or None if the rows cannot be compared.
+    """
+    if len(order) == 0:
+        return None
+    labels = []
+    for req in order:
+        column = columns[req]
+        if column.dtype != object:
+            labels.append(np.unique(column, return_inverse=True)[1])
+            continue
+        seen = dict()
+        try:
+            labels.append(np.array(
+                [ seen.setdefault((type(v), v), len(seen)) for v in column ],
+                dtype=np.int64
+            ))
+        except TypeError:
+            return None
+    matrix = np.stack([ label.reshape(-1) for label in labels ], axis=1)
+    _, found, inverse = np.unique(
+        matrix, axis=0, return_index=True, return_inverse=True
+    )
+    return found, inverse.reshape(-1)
+
 class Expression():
     """
     A representation of reasoning extractable from a boolean logic expression.
+
+    By default, the expression is compiled once into an executable form, 
+    which is reused for every evaluation. Setting `compiled` to False reparses
+    the expression for each evaluation instead. When GUARD_OUTCOME_CACHE is
+    enabled, outcomes of single evaluations are kept in it, so an expression
+    is only evaluated once for the values of the variables it reads. Batch 
+    evaluations project the states onto these variables and only evaluate 
+    each distinct projected state once, consulting the cache for distinct 
+    states rather than for every state.
     """
 
-    def __init__(self, exp:str,) -> None:
+    def __init__(self, exp:str, compiled:bool=True) -> None:
         self._org_exp = exp 
         self._parser = ExpressionParser(dict(), exp)
         self._parsed_exp = None
-        self._dom = self._find_dom(exp)
-
-    def _find_dom(self, exp:str) -> Set[str]:
-        parser = ExpressionParser(dict(), exp)
-        return parser.get_observed_vars()
+        self._dom = self._parser.get_observed_vars()
+        self._dom_order = tuple(sorted(self._dom))
+        self._compiled = self._parser.compile() if compiled else None
+        self._batch = self._parser.compile_batch()
+
+    def variables(self) -> Set[str]:
+        " returns the variables read by this expression."
+        return set(self._dom)
     
+    def comparisons(self) -> Tuple[Dict[str,Set[object]],Set[str]]:
+        """
+        returns the constants that each variable is compared against, and 
+        the variables that are read in any other way.
+        """
+        constants:Dict[str,Set[object]] = dict()
+        exact:Set[str] = set()
+        _collect_comparisons(self._parser._result, constants, exact)
+        return constants, exact
+
     def can_evaluate(self, data:Dict[str,object]) -> bool:
         """
         Checks if all variables are present for evaluation.
@@ -218,14 +607,46 @@ class Expression():
                 return False
         return True
 
+    def _cache_key(self, data:Mapping[str,object]) -> Union[Tuple,None]:
+        """
+        Returns the key for outcomes on the given data, i.e. the expression 
+        and the typed values of the variables it reads, or None if the 
+        values cannot be kept.
+        """
+        key = (self._org_exp, tuple( 
+            (type(data[req]), data[req]) for req in self._dom_order 
+        ))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
     def evaluate(self, data:Dict[str,object]) -> GuardOutcomes:
         """
         Evalutes the expression using the given data.
         """
         if (not self.can_evaluate(data)):
             return GuardOutcomes.UNDEF
+        key = None
+        if GUARD_OUTCOME_CACHE.enabled:
+            key = self._cache_key(data)
+        if key != None:
+            code = GUARD_OUTCOME_CACHE.get(key)
+            if code != None:
+                return OUTCOME_ORDER[code]
+        outcome = self._evaluate(data)
+        if key != None:
+            GUARD_OUTCOME_CACHE.put(key, outcome_code(outcome))
+        return outcome
+    
+    def _evaluate(self, data:Dict[str,object]) -> GuardOutcomes:
+        " evaluates the expression using the given data, without the cache."
         try:
-            ret = ExpressionParser(data, self._org_exp).result()
+            if self._compiled != None:
+                ret = self._compiled(data)
+            else:
+                ret = ExpressionParser(data, self._org_exp).result()
             if ret:
                 return GuardOutcomes.TRUE
             else:
@@ -233,6 +654,76 @@ class Expression():
         except Exception as e:
             debug(f"Failed to evaluate :: {e}")
             return GuardOutcomes.UNDEF
+        
+    def evaluate_batch(self, block:DataStateBlock) -> np.ndarray:
+        """
+        Evaluates the expression for each data state in the given block, and 
+        returns a vector of outcome codes (see `OUTCOME_ORDER`). States that
+        are missing a variable are undefined.
+        """
+        codes = np.full(block.size, OUTCOME_UNDEF, dtype=np.int8)
+        rows = np.ones(block.size, dtype=bool)
+        for req in self._dom:
+            rows &= block.defined(req)
+        if not rows.any():
+            return codes
+        columns = dict( 
+            (req, block.column(req)[rows]) 
+            for req 
+            in self._dom 
+        )
+        # only evaluate each distinct projected state once
+        distinct = _distinct_rows(columns, self._dom_order)
+        if distinct == None:
+            found = np.arange(rows.sum())
+            inverse = found
+        else:
+            found, inverse = distinct
+            columns = dict( 
+                (req, column[found]) for req, column in columns.items() 
+            )
+        try:
+            found_codes = self._lookup_batch(block, rows, found, columns)
+            codes[rows] = found_codes[inverse]
+        except Exception as e:
+            # fall back to evaluating each state, e.g. for incomparable types
+            debug(f"Failed to evaluate in batch :: {e}")
+            for row in np.flatnonzero(rows):
+                codes[row] = outcome_code(self.evaluate(block.state(row)))
+        return codes
+
+    def _lookup_batch(self, block:DataStateBlock, rows:np.ndarray, 
+        found:np.ndarray, columns:Mapping[str,np.ndarray]) -> np.ndarray:
+        """
+        Returns the outcome codes for the distinct states at the given 
+        positions of the defined rows, taking kept outcomes from 
+        GUARD_OUTCOME_CACHE when it is enabled and evaluating the columns of
+        the others.
+        """
+        codes = np.full(found.size, OUTCOME_UNDEF, dtype=np.int8)
+        missing = np.ones(found.size, dtype=bool)
+        keys = dict()
+        if GUARD_OUTCOME_CACHE.enabled:
+            block_rows = np.flatnonzero(rows)[found]
+            for pos, row in enumerate(block_rows):
+                key = self._cache_key(block.state(row))
+                code = None if key == None else GUARD_OUTCOME_CACHE.get(key)
+                if code != None:
+                    codes[pos] = code
+                    missing[pos] = False
+                elif key != None:
+                    keys[pos] = key
+        if missing.all():
+            ret = _truthy(self._batch(columns))
+            codes[:] = np.where(ret, OUTCOME_TRUE, OUTCOME_FALSE)
+        elif missing.any():
+            ret = _truthy(self._batch(dict( 
+                (req, column[missing]) for req, column in columns.items()
+            )))
+            codes[missing] = np.where(ret, OUTCOME_TRUE, OUTCOME_FALSE)
+        for pos, key in keys.items():
+            GUARD_OUTCOME_CACHE.put(key, int(codes[pos]))
+        return codes
 
     def __str__(self) -> str:
         return self._org_exp
@@ -247,6 +738,10 @@ class Expression():
     
     def __repr__(self) -> str:
         return f"Expression('{self._org_exp}')"
+    
+    def __deepcopy__(self, memo) -> 'Expression':
+        # expressions are immutable, so copies can share the parsed form
+        return self
 
 class Guard():
     """
@@ -273,6 +768,24 @@ class Guard():
         Evaluates the guard in the context of the given data state.
         """
         return self._exp.evaluate(data)
+    
+    def evaluate_batch(self, block:DataStateBlock) -> np.ndarray:
+        """
+        Evaluates the guard for each data state in the given block, returning
+        a vector of outcome codes.
+        """
+        return self._exp.evaluate_batch(block)
+    
+    def variables(self) -> Set[str]:
+        " returns the variables read by this guard."
+        return self._exp.variables()
+    
+    def comparisons(self) -> Tuple[Dict[str,Set[object]],Set[str]]:
+        """
+        returns the constants that each variable is compared against, and 
+        the variables that are read in any other way.
+        """
+        return self._exp.comparisons()
 
     def __str__(self) -> str:
         return str(self._exp)
@@ -286,4 +799,110 @@ class Guard():
         return False
     
     def __repr__(self) -> str:
-        return f'Guard({self._exp.__repr__()})'
\ No newline at end of file
+        return f'Guard({self._exp.__repr__()})'
+
+# comparison operators over a pair of operands, rather than logical operators
+_PAIR_COMPARISONS = set([
+    "&lt;", "&lt;=", "&gt;", "&gt;=", "==", "<", "<=", ">", ">="
+])
+_CONSTANTS = (EvalConstant, EvalLiteral)
+
+def _collect_comparisons(node:object, constants:Dict[str,Set[object]], 
+        exact:Set[str]) -> None:
+    """
+    Walks a parsed expression, collecting the constants that each variable
+    is compared against, and the variables that are read in any other way.
+    """
+    if isinstance(node, EvalVariable):
+        exact.add(node.value)
+    elif isinstance(node, EvalComparisonOp):
+        pairs = list(node.operatorOperands(node.value[1:]))
+        operands = [ node.value[0] ] + [ val for _,val in pairs ]
+        comparison = all( op in _PAIR_COMPARISONS for op,_ in pairs )
+        for i,operand in enumerate(operands):
+            if not isinstance(operand, EvalVariable):
+                _collect_comparisons(operand, constants, exact)
+                continue
+            neighbours = operands[max([i-1, 0]):i] + operands[i+1:i+2]
+            if comparison and all( 
+                isinstance(n, _CONSTANTS) for n in neighbours ):
+                if operand.value not in constants:
+                    constants[operand.value] = set()
+                for n in neighbours:
+                    constants[operand.value].add(n.eval())
+            else:
+                exact.add(operand.value)
+
+class GuardPartitioning():
+    """
+    Partitions data states into classes, where states in the same class have
+    the same outcome for each of the given guards. A variable that is only 
+    compared against constants is mapped to how it compares against each 
+    constant, i.e. which interval between constants it falls in, while a 
+    variable that is read in any other way keeps its value. Variables that 
+    no guard reads are ignored.
+    """
+
+    UNDEFINED = "undefined"
+    INCOMPARABLE = "incomparable"
+
+    def __init__(self, guards:Iterable['Guard']) -> None:
+        constants:Dict[str,Set[object]] = dict()
+        exact:Set[str] = set()
+        for guard in guards:
+            compared, others = guard.comparisons()
+            for var, values in compared.items():
+                constants[var] = constants.get(var, set()).union(values)
+            exact = exact.union(others)
+        self._exact = tuple(sorted(exact))
+        self._constants = tuple(
+            (var, tuple(sorted(constants[var], key=repr)))
+            for var 
+            in sorted(constants.keys())
+            if var not in exact
+        )
+
+    def interval_variables(self) -> Set[str]:
+        " returns the variables mapped to intervals between constants."
+        return set( var for var,_ in self._constants )
+    
+    def exact_variables(self) -> Set[str]:
+        " returns the variables that keep their value."
+        return set(self._exact)
+
+    def _compare(self, value:object, constant:object) -> Tuple:
+        try:
+            return (value < constant, value == constant, value > constant)
+        except TypeError:
+            return (self.INCOMPARABLE, value == constant)
+
+    def state_class(self, state:Mapping[str,object]) -> Tuple:
+        """
+        returns the class of the given data state, where states of the same
+        class cannot be told apart by the guards.
+        """
+        ret = []
+        for var, consts in self._constants:
+            if var not in state:
+                ret.append(self.UNDEFINED)
+            else:
+                ret.append(tuple( 
+                    self._compare(state[var], const) for const in consts 
+                ))
+        for var in self._exact:
+            if var not in state:
+                ret.append(self.UNDEFINED)
+            else:
+                ret.append((type(state[var]), state[var]))
+        return tuple(ret)
+    
+    def trace_class(self, trace:ComplexTrace) -> Tuple:
+        """
+        returns the class of the given trace, being the class of the data 
+        state before each event and after the last event.
+        """
+        return tuple( 
+            self.state_class(trace.get_state_as_of(i)) 
+            for i 
+            in range(len(trace)+1)
+        )
@@ -12,11 +12,12 @@ For an depth understanding or introduction to Petri Nets, see:
 
 from collections.abc import Iterable
 from copy import deepcopy
-from typing import Union,FrozenSet,Dict
+from typing import Union,FrozenSet,Dict,Set
 import xml.etree.ElementTree as ET
 from xml.etree.ElementTree import parse
 from os import path
 from uuid import uuid4
+from hashlib import blake2b
 
 #typing imports
 from typing import TYPE_CHECKING
@@ -260,6 +261,34 @@ class LabelledPetriNet:
                 marked[place] = 0
         self._fmarking = PetriNetMarking(self, marked)
 
+    def fingerprint(self) -> str:
+        """
+        returns a hash of the places, transitions (with any guards), arcs and
+        markings of this net, which is the same for nets with the same 
+        content regardless of the order of their elements or the process.
+        """
+        def marking(mark:'PetriNetMarking'):
+            if mark == None:
+                return None
+            return sorted( 
+                (place.pid, count) for place,count in mark._mark.items() 
+                if count > 0 
+            )
+        canonical = (
+            sorted( (p.pid, p.name) for p in self._places ),
+            sorted( 
+                (t.tid, t.name, t.silent, t.weight, 
+                 str(t.guard) if isinstance(t, GuardedTransition) else None)
+                for t in self._transitions 
+            ),
+            sorted( 
+                (a.from_node.nodeId, a.to_node.nodeId) for a in self._arcs 
+            ),
+            marking(self._imarking),
+            marking(self._fmarking)
+        )
+        return blake2b(repr(canonical).encode(), digest_size=16).hexdigest()
+
     def __eq__(self,other) -> bool:
         if isinstance(other,self.__class__):
             return self._name  == other._name and \
@@ -423,6 +452,13 @@ class PetriNetWithData(LabelledPetriNet):
     def transitions(self) -> FrozenSet[GuardedTransition]:
         return deepcopy(self._transitions)
     
+    def guard_variables(self) -> Set[str]:
+        " returns the variables read by the guards of this net."
+        ret = set()
+        for transition in self._transitions:
+            ret = ret.union(transition.guard.variables())
+        return ret
+    
     def __repr__(self) -> str:
         repr = "PetriNetWithData(\n"
         # add places
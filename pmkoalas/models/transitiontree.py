@@ -3,16 +3,33 @@ This module outlines a data structure for transitions tree as proposed by Hidder
  Dumas, M., van der Aalst, W.M.P., ter Hofstede, A.H.M., Verelst, J.: When are two
  workflows the same? In: CATS. ACS (2005); These trees can be modified for future work.
 """
-from typing import Any, Set, List, Tuple, Union
+from typing import Set, List, Tuple, Union, FrozenSet, Dict, Iterable
 from copy import deepcopy
 from dataclasses import dataclass
 from functools import reduce
-from os import path,mkdir
+from os import path,mkdir,makedirs,listdir,replace,getpid
+from collections import OrderedDict
+from hashlib import blake2b
+import pickle
 
 from pmkoalas.simple import Trace, EventLog
 from pmkoalas.complex import ComplexEvent, ComplexEventLog
+from pmkoalas.models.guards import DataStateBlock, OUTCOME_FALSE, OUTCOME_TRUTH
 from pmkoalas._logging import info, InfoQueueProcessor, InfoIteratorProcessor
 
+import numpy as np
+
+def _structure_fingerprint(vertices:Iterable['TransitionTreeVertex']) -> str:
+    """
+    Returns a hash of the partial traces of the given vertices and which of
+    them are terminal, which is the same across processes. Flows are implied
+    by the partial traces, but their guards are not part of the hash.
+    """
+    canonical = sorted(
+        (tuple(v.sigma_sequence().sequence), v.terminal()) for v in vertices
+    )
+    return blake2b(repr(canonical).encode(), digest_size=16).hexdigest()
+
 class TransitionTreeVertex():
     """
     Data class for a vertex in a transition tree.
@@ -73,7 +90,8 @@ class TransitionTreeVertex():
         return False
     
     def __hash__(self) -> int:
-        return hash((self.sigma_sequence().__hash__()))
+        # hashes the partial trace directly, avoiding a copy
+        return hash((self._partial.__hash__()))
     
 class TransitionTreeRoot(TransitionTreeVertex):
     """
@@ -210,6 +228,13 @@ class TransitionTreeGuard():
         " return whether the given data is supported by this guard."
         return False
     
+    def check_batch(self, block:DataStateBlock) -> np.ndarray:
+        """
+        returns a vector of outcome codes, one for each data state in the 
+        given block.
+        """
+        return np.full(block.size, OUTCOME_FALSE, dtype=np.int8)
+    
     def required(self) -> Set[str]:
         " returns the required data attributes for this guard."
         return set()
@@ -257,6 +282,21 @@ class TransitionTreeMerge(TransitionTreeGuard):
             check = check and exp.check(data)
         return check
     
+    def check_batch(self, block: DataStateBlock) -> np.ndarray:
+        # follows check, carrying the outcome while it remains truthy, 
+        # where every outcome is truthy (see OUTCOME_TRUTH), so the outcome 
+        # of the last guard is kept as in check
+        check = None
+        for exp in self._contains:
+            outcome = exp.check_batch(block)
+            if check is None:
+                check = outcome
+            else:
+                check = np.where(OUTCOME_TRUTH[check], outcome, check)
+        if check is None:
+            return super().check_batch(block)
+        return check
+    
     def required(self) -> Set[str]:
         ret = set()
         for exp in self._contains:
@@ -305,6 +345,21 @@ class TransitionTreeJoin(TransitionTreeGuard):
             check = check or exp.check(data)
         return check
     
+    def check_batch(self, block: DataStateBlock) -> np.ndarray:
+        # follows check, keeping the first truthy outcome, where every
+        # outcome is truthy (see OUTCOME_TRUTH), so the outcome of the first
+        # guard is kept as in check
+        check = None
+        for exp in self._contains:
+            outcome = exp.check_batch(block)
+            if check is None:
+                check = outcome
+            else:
+                check = np.where(OUTCOME_TRUTH[check], check, outcome)
+        if check is None:
+            return super().check_batch(block)
+        return check
+    
     def required(self) -> Set[str]:
         ret = set()
         for exp in self._contains:
@@ -381,26 +436,39 @@ class TransitionTree():
     """
     A transition tree is a connected, rooted, edge-labeled and directioned graph
     without cycles. See 'When are two  workflows the same?' In: CATS. ACS (2005).
+
+    A tree can be frozen, in which case the given vertices and flows are 
+    not copied and the accessors return shared read-only views (frozensets), 
+    rather than a copy of the tree on each call. The vertices and flows given
+    to a frozen tree must not be changed afterwards.
     """
 
     def __init__(self, 
                  vertices:Set[TransitionTreeVertex], 
                  root:TransitionTreeRoot,
-                 flows:Set[TransitionTreeFlow]) -> None:
+                 flows:Set[TransitionTreeFlow],
+                 frozen:bool=False) -> None:
         # check types and input
-        if not (isinstance(vertices, set)) or vertices == None:
+        if not (isinstance(vertices, (set, frozenset))) or vertices == None:
             raise ValueError(f"Unexpected vertices, was expecting a set but got"+
                              f" {type(vertices)}.")
         elif not (isinstance(root, TransitionTreeRoot)) or root == None:
             raise ValueError(f"Unexpected root, was expecting a "+
                              f"`TransitionTreeRoot` but got {type(root)}.")
-        elif not (isinstance(flows, set)) or flows == None:
+        elif not (isinstance(flows, (set, frozenset))) or flows == None:
             raise ValueError("Unexpected flows, was expecting a set but got "+
                              f"{type(flows)}")
-        # create copies
-        self._vertices = deepcopy(vertices)
-        self._root = deepcopy(root) 
-        self._flows = deepcopy(flows)
+        self._frozen = frozen
+        if (frozen):
+            # share the given structures
+            self._vertices = frozenset(vertices)
+            self._root = root 
+            self._flows = frozenset(flows)
+        else:
+            # create copies
+            self._vertices = deepcopy(vertices)
+            self._root = deepcopy(root) 
+            self._flows = deepcopy(flows)
         # precompute
         self._attrs = set([ a for f in self._flows for a in f.attributes() ])
         self._pops = [ 
@@ -415,18 +483,174 @@ class TransitionTree():
             in self._flows
             if isinstance(f, TransitionTreeGuardFlow)
         ])
+        self._terminals = None
+        self._fingerprint = None
+        if (frozen):
+            self._attrs = frozenset(self._attrs)
+            self._guards = frozenset(self._guards)
+            self._terminals = frozenset(
+                node
+                for node 
+                in self._vertices
+                if node.terminal()
+            )
+        self._index()
+
+    def _index(self) -> None:
+        """
+        Builds lookups over the flows of this tree, for the outgoing and
+        incoming flows of each vertex and the children of a vertex by 
+        activity. Root paths are added to the lookups as they are requested.
+        """
+        self._outgoing:Dict[TransitionTreeVertex,Set[TransitionTreeFlow]] \
+            = dict()
+        self._incoming:Dict[TransitionTreeVertex,Set[TransitionTreeFlow]] \
+            = dict()
+        self._children:Dict[TransitionTreeVertex,
+                            Dict[str,TransitionTreeVertex]] = dict()
+        # the flow used to reach each vertex in root paths
+        self._reaching:Dict[TransitionTreeVertex,TransitionTreeFlow] = dict()
+        self._paths:Dict[TransitionTreeVertex,Tuple[TransitionTreeFlow]] = {
+            self._root : tuple()
+        }
+        for flow in self._flows:
+            offering = flow.offering()
+            nxt = flow.next()
+            if offering not in self._outgoing:
+                self._outgoing[offering] = set()
+                self._children[offering] = dict()
+            self._outgoing[offering].add(flow)
+            self._children[offering][flow.activity()] = nxt
+            if nxt not in self._incoming:
+                self._incoming[nxt] = set()
+                self._reaching[nxt] = flow
+            self._incoming[nxt].add(flow)
+        if (self._frozen):
+            self._outgoing = dict( 
+                (v, frozenset(flows)) for v,flows in self._outgoing.items()
+            )
+            self._incoming = dict( 
+                (v, frozenset(flows)) for v,flows in self._incoming.items()
+            )
+
+    def is_frozen(self) -> bool:
+        """
+        returns whether this tree is frozen, i.e. accessors return shared 
+        read-only views.
+        """
+        return self._frozen
+    
+    def fingerprint(self) -> str:
+        """
+        returns a hash of the vertices of this tree, ignoring guards, which 
+        is the same for trees with the same shape across processes.
+        """
+        if self._fingerprint != None:
+            return self._fingerprint
+        fingerprint = _structure_fingerprint(self._vertices)
+        if (self._frozen):
+            self._fingerprint = fingerprint
+        return fingerprint
+    
+    def freeze(self) -> 'TransitionTree':
+        """
+        returns a frozen version of this tree, where accessors return shared
+        read-only views.
+        """
+        if (self._frozen):
+            return self
+        # copy together, so that flows and vertices share the same objects
+        vertices, root, flows = deepcopy(
+            (self._vertices, self._root, self._flows)
+        )
+        return TransitionTree(vertices, root, flows, frozen=True)
+
+    # lookups
+    def outgoing(self, vertex:TransitionTreeVertex) \
+        -> Union[Set[TransitionTreeFlow],FrozenSet[TransitionTreeFlow]]:
+        """
+        returns the set of flows that are outgoing from the given vertex.
+        """
+        out = self._outgoing.get(vertex, frozenset())
+        if (self._frozen):
+            return out
+        return deepcopy(set(out))
+    
+    def incoming(self, vertex:TransitionTreeVertex) \
+        -> Union[Set[TransitionTreeFlow],FrozenSet[TransitionTreeFlow]]:
+        """
+        returns the set of flows that are directed towards the given vertex.
+        """
+        out = self._incoming.get(vertex, frozenset())
+        if (self._frozen):
+            return out
+        return deepcopy(set(out))
+    
+    def parent(self, vertex:TransitionTreeVertex) \
+        -> Union[TransitionTreeVertex,None]:
+        """
+        returns the vertex offering a flow to the given vertex, or None for
+        the root.
+        """
+        if vertex not in self._reaching:
+            return None
+        parent = self._reaching[vertex].offering()
+        if (self._frozen):
+            return parent
+        return deepcopy(parent)
+    
+    def child(self, vertex:TransitionTreeVertex, act:str) \
+        -> Union[TransitionTreeVertex,None]:
+        """
+        returns the vertex reached from the given vertex by the given 
+        activity, or None if no such flow exists.
+        """
+        child = self._children.get(vertex, dict()).get(act, None)
+        if (self._frozen or child == None):
+            return child
+        return deepcopy(child)
+    
+    def path_to(self, vertex:TransitionTreeVertex) \
+        -> Union[List[TransitionTreeFlow],Tuple[TransitionTreeFlow]]:
+        """
+        returns the sequence of flows from the root to the given vertex.
+        """
+        # walk up until a vertex with a known path
+        climb = []
+        curr = vertex
+        while curr not in self._paths:
+            if curr not in self._reaching:
+                raise ValueError("Unable to find a interconnected "\
+                                 +"sequence of flows.")
+            climb.append(curr)
+            curr = self._reaching[curr].offering()
+        # then fill in the paths on the way back down
+        for curr in reversed(climb):
+            self._paths[curr] = self._paths[
+                self._reaching[curr].offering()
+            ] + (self._reaching[curr],)
+        path = self._paths[vertex]
+        if (self._frozen):
+            return path
+        return deepcopy(list(path))
 
     # properties
-    def vertices(self) -> Set[TransitionTreeVertex]:
+    def vertices(self) -> Union[Set[TransitionTreeVertex],
+                                FrozenSet[TransitionTreeVertex]]:
         """
         returns the full set of vertices that are defined by this transition tree.
         """ 
+        if (self._frozen):
+            return self._vertices
         return deepcopy(self._vertices)
     
-    def terminals(self) -> Set[TransitionTreeVertex]:
+    def terminals(self) -> Union[Set[TransitionTreeVertex],
+                                 FrozenSet[TransitionTreeVertex]]:
         """
         returns the set of vertices that are terminal in this tree.
         """
+        if (self._frozen):
+            return self._terminals
         return set(
             deepcopy(node) 
             for node 
@@ -438,12 +662,17 @@ class TransitionTree():
         """
         returns the root vertex of this transition tree.
         """ 
+        if (self._frozen):
+            return self._root
         return deepcopy(self._root)
 
-    def flows(self) -> Set[TransitionTreeFlow]:
+    def flows(self) -> Union[Set[TransitionTreeFlow],
+                             FrozenSet[TransitionTreeFlow]]:
         """
         returns the full set of flows that are defined by this transition tree.
         """
+        if (self._frozen):
+            return self._flows
         return deepcopy(self._flows)
 
     def strict_vertices(self) -> Set[TransitionTreeVertex]:
@@ -451,9 +680,8 @@ class TransitionTree():
         returns the partial set of vertices that have at least two outgoing flows.
         """
         out = set()
-        flows = self.flows()
         for vertex in self.vertices():
-            if len(vertex.outgoing(flows)) > 1:
+            if len(self._outgoing.get(vertex, [])) > 1:
                 out.add(vertex)
         return out
 
@@ -462,25 +690,28 @@ class TransitionTree():
         returns the full set of offers that could happen based on this transition tree.
         """ 
         out = set()
-        flows = self.flows()
         for vertex in self.vertices():
             acts = set()
-            for flow in vertex.outgoing(flows):
+            for flow in self._outgoing.get(vertex, []):
                 acts.add(flow.activity())
             out.add(Offer(vertex.sigma_sequence(), set(acts)))
         return out
 
-    def attributes(self) -> Set[str]:
+    def attributes(self) -> Union[Set[str],FrozenSet[str]]:
         """
         returns a set of attribute names that are used within the information attached to flows.
         """ 
+        if (self._frozen):
+            return self._attrs
         return deepcopy(self._attrs)
 
-    def guards(self) -> Set:
+    def guards(self) -> Union[Set,FrozenSet]:
         """
         returns the set of guards used in flows, that imply a population of data 
         attribute mappings.
         """
+        if (self._frozen):
+            return self._guards
         return deepcopy(self._guards)
 
     def choices(self) -> Set:
@@ -489,10 +720,9 @@ class TransitionTree():
         vertices with many outgoing flows.
         """
         out = set()
-        flows = self.flows()
         for vertex in self.strict_vertices():
             acts = set()
-            for flow in vertex.outgoing(flows):
+            for flow in self._outgoing.get(vertex, []):
                 acts.add(flow.activity())
             out.add(Offer(vertex.sigma_sequence(), set(acts)))
         return out
@@ -528,7 +758,7 @@ class TransitionTree():
                 ROOT_VERT.format(id=root.id(), html=root.html_label())
             )
             # walk from root, adding vertices and flows
-            flows = root.outgoing(self.flows())
+            flows = self.outgoing(root)
             seen_flows = dict()
             seen_verts = set()
             currnt_flow = 1
@@ -570,13 +800,462 @@ class TransitionTree():
                 flows = []
                 for v in verts:
                     if (v not in seen_verts):
-                        flows += v.outgoing(self.flows())
+                        flows += self.outgoing(v)
                         seen_verts.add(v)
             # close and write footer
             f.write(FILE_FOOTER)
             
     # comparision functions
 
+class CompactTransitionVertex(TransitionTreeVertex):
+    """
+    A read-only view of a vertex in a compact transition tree, where the 
+    partial trace is recovered on demand by walking parents.
+    """
+
+    def __init__(self, tree:'CompactTransitionTree', index:int) -> None:
+        self._tree = tree
+        self._index = index
+        self._label = self.VERTEX_FORMAT.format(id=index+1)
+        self._hash = None
+
+    def index(self) -> int:
+        " returns the index of this vertex in the compact tree."
+        return self._index
+
+    def sigma_sequence(self) -> Trace:
+        return self._tree.prefix(self._index)
+    
+    def is_root(self) -> bool:
+        return self._index == 0
+    
+    def set_as_terminal(self):
+        raise ValueError("Vertices of a compact tree cannot be changed.")
+    
+    def terminal(self) -> bool:
+        return self._tree.is_terminal(self._index)
+    
+    def html_label(self) -> str:
+        if self.is_root():
+            return "<v<sub>r</sub>>"
+        return super().html_label()
+    
+    def __hash__(self) -> int:
+        if self._hash == None:
+            self._hash = hash((self.sigma_sequence().__hash__()))
+        return self._hash
+    
+    def __deepcopy__(self, memo) -> 'CompactTransitionVertex':
+        # views are read-only, so they can be shared
+        return self
+    
+class CompactTransitionFlow(TransitionTreeFlow):
+    """
+    A read-only view of a flow in a compact transition tree.
+    """
+
+    def __init__(self, tree:'CompactTransitionTree', index:int) -> None:
+        self._tree = tree 
+        self._index = index
+        self._hash = None
+
+    def index(self) -> int:
+        " returns the index of this flow in the compact tree."
+        return self._index
+
+    def offering(self) -> CompactTransitionVertex:
+        return self._tree.vertex(self._tree.flow_source(self._index))
+    
+    def next(self) -> CompactTransitionVertex:
+        return self._tree.vertex(self._tree.flow_target(self._index))
+    
+    def activity(self) -> str:
+        return self._tree.flow_activity(self._index)
+    
+    def __hash__(self) -> int:
+        if self._hash == None:
+            self._hash = super().__hash__()
+        return self._hash
+    
+    def __deepcopy__(self, memo) -> 'CompactTransitionFlow':
+        # views are read-only, so they can be shared
+        return self
+    
+class CompactTransitionGuardFlow(CompactTransitionFlow, 
+                                 TransitionTreeGuardFlow):
+    """
+    A read-only view of a flow with a guard in a compact transition tree.
+    """
+
+    def guard(self) -> TransitionTreeGuard:
+        return self._tree.flow_guard(self._index)
+    
+    def label(self) -> Tuple[str, TransitionTreeGuard]:
+        return (self.activity(), self.guard())
+    
+    def attributes(self) -> Set[str]:
+        return self.guard().required()
+
+class CompactTransitionTree():
+    """
+    A transition tree stored as arrays over integer indices, rather than as
+    objects for each vertex and flow. 
+    
+    Activities are interned to integer ids. Vertices are linked through 
+    parent, first-child and next-sibling arrays, with the root at index 
+    zero, and each vertex records the activity of the flows reaching it. 
+    Flows are grouped by the vertex they reach, and each flow refers to its
+    guard through an index into a table of guards. Partial traces are not 
+    stored and are recovered on demand by walking parents.
+
+    A compact tree is always frozen and offers the same accessors as a 
+    frozen TransitionTree, where vertices and flows are read-only views 
+    created on first use and kept by the tree. See convert_to_compact_tree.
+    """
+
+    NO_VERTEX = -1
+    NO_GUARD = -1
+
+    def __init__(self, 
+                 activities:List[str],
+                 parent:np.ndarray,
+                 act:np.ndarray,
+                 first_child:np.ndarray,
+                 next_sibling:np.ndarray,
+                 terminal:np.ndarray,
+                 flow_start:np.ndarray,
+                 flow_guard:np.ndarray,
+                 guards:List[TransitionTreeGuard]) -> None:
+        sizes = set([ len(parent), len(act), len(first_child), 
+                      len(next_sibling), len(terminal), len(flow_start)-1])
+        if len(sizes) > 1:
+            raise ValueError("Expected the arrays over vertices to have the"+
+                             f" same size, but got sizes {sizes}.")
+        self._acts = list(activities)
+        self._act_ids = dict( (a,i) for i,a in enumerate(self._acts) )
+        self._parent = parent
+        self._act = act
+        self._first_child = first_child
+        self._next_sibling = next_sibling
+        self._terminal = terminal
+        self._flow_start = flow_start
+        self._flow_guard = flow_guard
+        self._guard_table = list(guards)
+        # the vertex reached by each flow
+        self._flow_target = np.repeat(
+            np.arange(len(parent), dtype=np.int32), np.diff(flow_start)
+        )
+        self._fingerprint = None
+        # views of vertices and flows, and sets of them, made on first use
+        self._vertex_views:List[CompactTransitionVertex] = \
+            [ None ] * len(parent)
+        self._flow_views:List[CompactTransitionFlow] = \
+            [ None ] * len(flow_guard)
+        self._vertex_set:FrozenSet[CompactTransitionVertex] = None
+        self._flow_set:FrozenSet[CompactTransitionFlow] = None
+        self._terminal_set:FrozenSet[CompactTransitionVertex] = None
+
+    def is_frozen(self) -> bool:
+        " returns whether this tree is frozen, which is always the case."
+        return True
+    
+    def freeze(self) -> 'CompactTransitionTree':
+        " returns this tree, as it is always frozen."
+        return self
+    
+    def fingerprint(self) -> str:
+        """
+        returns a hash of the vertices of this tree, ignoring guards, which 
+        is the same for trees with the same shape across processes.
+        """
+        if self._fingerprint == None:
+            self._fingerprint = _structure_fingerprint(self.vertices())
+        return self._fingerprint
+    
+    # index level lookups
+    def size(self) -> int:
+        " returns the number of vertices in this tree."
+        return len(self._parent)
+    
+    def activity_id(self, act:str) -> int:
+        " returns the interned id for the activity, or -1 if unknown."
+        return self._act_ids.get(act, -1)
+    
+    def is_terminal(self, index:int) -> bool:
+        " returns whether the vertex at the given index is terminal."
+        return bool(self._terminal[index])
+    
+    def parent_index(self, index:int) -> int:
+        " returns the index of the parent of a vertex, or -1 for the root."
+        return int(self._parent[index])
+    
+    def children_indices(self, index:int) -> List[int]:
+        " returns the indices of the children of a vertex."
+        ret = []
+        child = int(self._first_child[index])
+        while child != self.NO_VERTEX:
+            ret.append(child)
+            child = int(self._next_sibling[child])
+        return ret
+    
+    def flows_into(self, index:int) -> range:
+        " returns the indices of the flows reaching a vertex."
+        return range(
+            int(self._flow_start[index]), int(self._flow_start[index+1])
+        )
+    
+    def flow_source(self, flow:int) -> int:
+        " returns the index of the vertex offering a flow."
+        return int(self._parent[self._flow_target[flow]])
+    
+    def flow_target(self, flow:int) -> int:
+        " returns the index of the vertex reached by a flow."
+        return int(self._flow_target[flow])
+    
+    def flow_activity(self, flow:int) -> str:
+        " returns the activity of a flow."
+        return self._acts[self._act[self._flow_target[flow]]]
+    
+    def flow_guard(self, flow:int) -> Union[TransitionTreeGuard,None]:
+        " returns the guard of a flow, or None if the flow has no guard."
+        guard = int(self._flow_guard[flow])
+        if guard == self.NO_GUARD:
+            return None
+        return self._guard_table[guard]
+    
+    def prefix(self, index:int) -> Trace:
+        " returns the partial trace from the root to a vertex."
+        seq = []
+        while index > 0:
+            seq.append(self._acts[self._act[index]])
+            index = int(self._parent[index])
+        return Trace(seq[::-1])
+    
+    # views
+    def vertex(self, index:int) -> CompactTransitionVertex:
+        " returns a view of the vertex at the given index."
+        view = self._vertex_views[index]
+        if view == None:
+            view = CompactTransitionVertex(self, index)
+            self._vertex_views[index] = view
+        return view
+    
+    def flow(self, index:int) -> CompactTransitionFlow:
+        " returns a view of the flow at the given index."
+        view = self._flow_views[index]
+        if view == None:
+            if self._flow_guard[index] == self.NO_GUARD:
+                view = CompactTransitionFlow(self, index)
+            else:
+                view = CompactTransitionGuardFlow(self, index)
+            self._flow_views[index] = view
+        return view
+    
+    def _index_of(self, vertex:TransitionTreeVertex) -> int:
+        """
+        returns the index of the given vertex in this tree, or -1 if the 
+        vertex is not in this tree.
+        """
+        if isinstance(vertex, CompactTransitionVertex) \
+            and vertex._tree is self:
+            return vertex.index()
+        index = 0
+        for act in vertex.sigma_sequence():
+            index = self._child_index(index, self.activity_id(act))
+            if index == self.NO_VERTEX:
+                break
+        return index
+    
+    def _child_index(self, index:int, act:int) -> int:
+        child = int(self._first_child[index])
+        while child != self.NO_VERTEX and self._act[child] != act:
+            child = int(self._next_sibling[child])
+        return child
+
+    # lookups
+    def outgoing(self, vertex:TransitionTreeVertex) \
+        -> FrozenSet[CompactTransitionFlow]:
+        """
+        returns the set of flows that are outgoing from the given vertex.
+        """
+        index = self._index_of(vertex)
+        if index == self.NO_VERTEX:
+            return frozenset()
+        return frozenset(
+            self.flow(flow)
+            for child in self.children_indices(index)
+            for flow in self.flows_into(child)
+        )
+    
+    def incoming(self, vertex:TransitionTreeVertex) \
+        -> FrozenSet[CompactTransitionFlow]:
+        """
+        returns the set of flows that are directed towards the given vertex.
+        """
+        index = self._index_of(vertex)
+        if index == self.NO_VERTEX:
+            return frozenset()
+        return frozenset( self.flow(flow) for flow in self.flows_into(index) )
+    
+    def parent(self, vertex:TransitionTreeVertex) \
+        -> Union[CompactTransitionVertex,None]:
+        """
+        returns the vertex offering a flow to the given vertex, or None for
+        the root.
+        """
+        index = self._index_of(vertex)
+        if index <= 0:
+            return None
+        return self.vertex(self.parent_index(index))
+    
+    def child(self, vertex:TransitionTreeVertex, act:str) \
+        -> Union[CompactTransitionVertex,None]:
+        """
+        returns the vertex reached from the given vertex by the given 
+        activity, or None if no such flow exists.
+        """
+        index = self._index_of(vertex)
+        if index == self.NO_VERTEX:
+            return None
+        child = self._child_index(index, self.activity_id(act))
+        if child == self.NO_VERTEX:
+            return None
+        return self.vertex(child)
+    
+    def path_to(self, vertex:TransitionTreeVertex) \
+        -> Tuple[CompactTransitionFlow]:
+        """
+        returns the sequence of flows from the root to the given vertex.
+        """
+        index = self._index_of(vertex)
+        if index == self.NO_VERTEX:
+            raise ValueError("Unable to find a interconnected "\
+                             +"sequence of flows.")
+        seq = []
+        while index > 0:
+            seq.append(self.flow(self.flows_into(index)[0]))
+            index = self.parent_index(index)
+        return tuple(seq[::-1])
+
+    # properties
+    def vertices(self) -> FrozenSet[CompactTransitionVertex]:
+        """
+        returns the full set of vertices that are defined by this transition tree.
+        """
+        if self._vertex_set == None:
+            self._vertex_set = frozenset( 
+                self.vertex(i) for i in range(self.size()) 
+            )
+        return self._vertex_set
+    
+    def terminals(self) -> FrozenSet[CompactTransitionVertex]:
+        """
+        returns the set of vertices that are terminal in this tree.
+        """
+        if self._terminal_set == None:
+            self._terminal_set = frozenset( 
+                self.vertex(int(i)) for i in np.flatnonzero(self._terminal) 
+            )
+        return self._terminal_set
+    
+    def root(self) -> CompactTransitionVertex:
+        """
+        returns the root vertex of this transition tree.
+        """
+        return self.vertex(0)
+    
+    def flows(self) -> FrozenSet[CompactTransitionFlow]:
+        """
+        returns the full set of flows that are defined by this transition tree.
+        """
+        if self._flow_set == None:
+            self._flow_set = frozenset( 
+                self.flow(i) for i in range(len(self._flow_guard)) 
+            )
+        return self._flow_set
+    
+    def attributes(self) -> FrozenSet[str]:
+        """
+        returns a set of attribute names that are used within the guards
+        attached to flows.
+        """
+        return frozenset( 
+            attr for guard in self._guard_table for attr in guard.required()
+        )
+    
+    def guards(self) -> FrozenSet[TransitionTreeGuard]:
+        """
+        returns the set of guards used in flows.
+        """
+        return frozenset(self._guard_table)
+    
+def convert_to_compact_tree(tree:TransitionTree) -> CompactTransitionTree:
+    """
+    Converts a transition tree into a compact transition tree. Only flows 
+    without information or with a guard can be converted.
+    """
+    info("converting tree to compact form.")
+    tree = tree.freeze()
+    acts = dict()
+    guards = dict()
+    parent = [CompactTransitionTree.NO_VERTEX]
+    act = [-1]
+    children = [[]]
+    terminal = [tree.root().terminal()]
+    flow_guards = [[]]
+    # assign indices breadth first, so vertices are grouped by depth
+    queue = [tree.root()]
+    for index,vertex in enumerate(queue):
+        by_child = dict()
+        for flow in tree.outgoing(vertex):
+            if flow.next() not in by_child:
+                by_child[flow.next()] = []
+            by_child[flow.next()].append(flow)
+        for child in sorted(by_child, key=lambda v: v.sigma_sequence()[-1]):
+            cindex = len(queue)
+            queue.append(child)
+            parent.append(index)
+            act.append(acts.setdefault(
+                child.sigma_sequence()[-1], len(acts)
+            ))
+            children.append([])
+            children[index].append(cindex)
+            terminal.append(child.terminal())
+            glist = []
+            for flow in by_child[child]:
+                if isinstance(flow, TransitionTreeGuardFlow):
+                    glist.append(
+                        guards.setdefault(flow.guard(), len(guards))
+                    )
+                elif type(flow) == TransitionTreeFlow:
+                    glist.append(CompactTransitionTree.NO_GUARD)
+                else:
+                    raise ValueError("Unable to convert a flow of type "+
+                                     f"{type(flow)} to a compact tree.")
+            flow_guards.append(glist)
+    first_child = [ 
+        kids[0] if len(kids) > 0 else CompactTransitionTree.NO_VERTEX
+        for kids in children
+    ]
+    next_sibling = [CompactTransitionTree.NO_VERTEX] * len(queue)
+    for kids in children:
+        for left,right in zip(kids, kids[1:]):
+            next_sibling[left] = right
+    flow_start = np.cumsum([0] + [ len(g) for g in flow_guards ])
+    return CompactTransitionTree(
+        list(acts.keys()),
+        np.array(parent, dtype=np.int32),
+        np.array(act, dtype=np.int32),
+        np.array(first_child, dtype=np.int32),
+        np.array(next_sibling, dtype=np.int32),
+        np.array(terminal, dtype=np.bool_),
+        flow_start.astype(np.int32),
+        np.array(
+            [ g for glist in flow_guards for g in glist ], dtype=np.int32
+        ),
+        list(guards.keys())
+    )
+
 def apply_flow_reduction(tree:TransitionTree):
     """
     Ensures that only one flow exists between nodes in a tree.
@@ -585,7 +1264,7 @@ def apply_flow_reduction(tree:TransitionTree):
     info("applying flow reduction on playout tree.")
     new_flows = set()
     for node in InfoIteratorProcessor("checking nodes", tree.vertices()):
-        outgoing = node.outgoing(tree.flows())
+        outgoing = tree.outgoing(node)
         next_nodes = set( out.next() for out in outgoing )
         for next in next_nodes:
             act = next.sigma_sequence()
@@ -608,7 +1287,8 @@ def apply_flow_reduction(tree:TransitionTree):
     return TransitionTree(
         tree.vertices(),
         tree.root(),
-        new_flows
+        new_flows,
+        frozen=tree.is_frozen()
     )
 
 
@@ -628,76 +1308,644 @@ def convert_playout_to_tree(playout_log:ComplexEventLog, k:int ,
     """
     # import here to avoid cirular dependenies
     from pmkoalas.conformance.tokenreplay import PlayoutEnd
+    def playout():
+        for _,instances in playout_log:
+            for trace in instances:
+                reached = len(trace) > 0 \
+                    and isinstance(trace[len(trace)-1], PlayoutEnd)
+                steps = len(trace) - 1 if reached else len(trace)
+                yield [ 
+                    (trace.act(i), trace.guard(i)) for i in range(steps)
+                ], reached
+    return construct_from_playout(playout(), k, freduce=freduce)
+
+def construct_from_playout(
+        playout:Iterable[Tuple[List[Tuple[str,TransitionTreeGuard]],bool]],
+        k:int, freduce:bool=True) -> TransitionTree:
+    """
+    Constructs a transition tree from a play-out, using a flow reduction step
+    which may combine flows using a disjunction of guards. Each sequence of 
+    the play-out is added to the tree as it is given, so the play-out does 
+    not need to be kept in memory.
+
+    Parameters
+    ----------
+    `playout`: sequences of steps, i.e. an activity and the guard for taking 
+    it, with whether the sequence reaches the final marking, see 
+    pmkoalas.conformance.tokenreplay.playout_steps\n
+    `k`: the length of the longest observed trace, used to limit tree depth.\n
+    `freduce`: should flow reduction step be applied to ensure that only one
+    flow exists between nodes.
+    """
+    # import here to avoid cirular dependenies
+    from pmkoalas.conformance.tokenreplay import PlayoutEnd
+    halt = PlayoutEnd()
     # construct root
     root = TransitionPlayoutRoot()
-    # holder for ids
-    class Idder():
-        
-        def __init__(self) -> None:
-            self._counter = 1
-        
-        def __call__(self, *args: Any, **kwds: Any) -> Any:
-            self._counter += 1
-            return self._counter
-    idder = Idder()
-    # constuct nodes
-    nodes = set()
-    pbar = InfoQueueProcessor("built nodes of tree", 
-                              starting_size=len(playout_log)
-    )
-    for _,instances in playout_log:
-        for trace in instances:
-            for i in range(0, min([k+1, len(trace)])):
-                nodes.add(trace.acut(i+1))
-            pbar.update()
-    map_nodes = dict(
-        (node, TransitionPlayoutVertex(idder(), node))
-        for node
-        in nodes
-    )
-    map_nodes[Trace([])] = root
-    nodes.add(root)
-    # construct flows
+    children:Dict[Tuple[TransitionTreeVertex,str],TransitionTreeVertex] = \
+        dict()
     flows = set()
-    pbar = InfoQueueProcessor("built flows of tree",
-                              starting_size=len(playout_log)
-    )
-    for _,instances in playout_log:
-        for trace in instances:
-            for i in range(0,min([k+1, len(trace)])):
-                flows.add(
-                    TransitionTreeGuardFlow(
-                        map_nodes[trace.acut(i)],
-                        trace.act(i),
-                        map_nodes[trace.acut(i+1)],
-                        trace.guard(i)
-                    )
-                )    
-            pbar.update()
-    # set final nodes
-    pbar = InfoQueueProcessor("check for terminals",
-                              starting_size=len(playout_log)
-    )
-    for _,instances in playout_log:
-        for trace in instances:
-            i = min([k+1, len(trace)-1])
-            if isinstance(trace[i],  PlayoutEnd):
-                map_nodes[trace.acut(i)].set_as_terminal()
-            pbar.update()
-    # construct tree
+    consumed = 0
+    for steps, reached_final in playout:
+        # walk down from the root, adding vertices and flows as needed
+        if reached_final:
+            steps = steps + [(halt.activity(), halt.guard)]
+        curr = root
+        # the vertex reached before halting
+        end = root
+        seq = []
+        for i,(act, guard) in enumerate(steps[:k+1]):
+            seq.append(act)
+            if (curr, act) not in children:
+                children[(curr, act)] = TransitionPlayoutVertex(
+                    len(children) + 2, Trace(seq)
+                )
+            next = children[(curr, act)]
+            flows.add(
+                TransitionTreeGuardFlow(curr, act, next, guard)
+            )
+            curr = next
+            if (i < len(steps) - 1):
+                end = curr
+        # set final nodes
+        if reached_final and len(steps) <= k + 2:
+            end.set_as_terminal()
+        consumed += 1
+    info(f"built tree from {consumed} play-out sequences.")
+    # construct tree, which is frozen as the nodes and flows are not 
+    # shared outside of this function
     tree = TransitionTree(
-        set(list(map_nodes.values())),
+        set([root] + list(children.values())),
         root,
-        flows 
+        flows,
+        frozen=True
     )
     if (freduce):
         tree = apply_flow_reduction(tree)
     info("constructed tree.")
     return tree
 
+class LazyTransitionVertex(TransitionPlayoutVertex):
+    """
+    A vertex of a lazy transition tree, which is expanded when its flows or
+    whether it is terminal are first needed. Copies of a lazy vertex share
+    the same vertex, as it is a view into a growing tree.
+    """
 
-def construct_from_model(model:object, longest_playout:int, freduce:bool=True)\
-    -> TransitionTree:
+    def __init__(self, id:int, partial_trace:Trace, 
+                 tree:'LazyTransitionTree') -> None:
+        super().__init__(id, partial_trace)
+        self._tree = tree
+
+    def terminal(self) -> bool:
+        return self._tree._terminal(self)
+    
+    def __deepcopy__(self, memo) -> 'LazyTransitionVertex':
+        return self
+    
+class LazyTransitionRoot(LazyTransitionVertex):
+    """
+    The root of a lazy transition tree.
+    """
+
+    def __init__(self, tree:'LazyTransitionTree') -> None:
+        super().__init__(1, Trace([]), tree)
+
+    def is_root(self) -> bool:
+        return True
+    
+    def html_label(self) -> str:
+        return "< &lt;&gt; >"
+
+class TransitionDagNode():
+    """
+    A suffix of the play-out of a model, being the steps that can be taken 
+    from a set of markings with a number of visible steps remaining. A node 
+    is shared by every prefix that reaches the same markings with the same 
+    remaining steps.
+    """
+
+    def __init__(self, markings:FrozenSet[Tuple[int]], 
+                 remaining:Union[int,None]) -> None:
+        self.markings = markings
+        self.remaining = remaining
+        # the steps by activity, as (guards, next node), once expanded
+        self.steps:Dict[str,Tuple[FrozenSet[TransitionTreeGuard],
+                                  'TransitionDagNode']] = None
+        self.reached = False
+
+    def expanded(self) -> bool:
+        " returns whether the steps of this node have been generated."
+        return self.steps != None
+
+class TransitionDag():
+    """
+    A hash-consed form of the play-out of a Petri net with data, where 
+    identical suffixes, i.e. the same markings with the same number of 
+    visible steps remaining, are stored once as a TransitionDagNode and 
+    shared by all prefixes reaching them. Nodes are only expanded when 
+    their steps are first needed. As nodes know their remaining steps, the
+    same DAG serves prefixes of any length, where the remaining steps are 
+    unbounded when no length is given.
+
+    The steps of a node follow the rules of playout_sequences, where the 
+    guards of silent transitions are merged into the guard of the next
+    visible step (see playout_steps).
+    """
+
+    def __init__(self, model:object) -> None:
+        # import here to avoid cirular dependenies
+        from pmkoalas.conformance.tokenreplay import CompiledPetriNet
+        self._net = CompiledPetriNet(model)
+        self._initial = frozenset([self._net.marking(model.initial_marking)])
+        self._final = self._net.marking(model.final_marking)
+        self._fingerprint = model.fingerprint()
+        self._guards:Dict[object,TransitionTreeGuard] = dict()
+        self._nodes:Dict[Tuple,TransitionDagNode] = dict()
+
+    def fingerprint(self) -> str:
+        " returns the fingerprint of the model of this DAG."
+        return self._fingerprint
+
+    def root(self, remaining:Union[int,None]) -> TransitionDagNode:
+        " returns the node for the initial marking and remaining steps."
+        return self.node(self._initial, remaining)
+    
+    def node(self, markings:FrozenSet[Tuple[int]], 
+             remaining:Union[int,None]) -> TransitionDagNode:
+        " returns the shared node for the markings and remaining steps."
+        key = (markings, remaining)
+        if key not in self._nodes:
+            self._nodes[key] = TransitionDagNode(markings, remaining)
+        return self._nodes[key]
+    
+    def nodes(self) -> int:
+        " returns the number of nodes generated so far."
+        return len(self._nodes)
+
+    def _guard(self, trans:int) -> TransitionTreeGuard:
+        " returns the play-out guard of a transition, as in playout_steps."
+        from pmkoalas.conformance.tokenreplay import PlayoutTransitionGuard
+        guard = self._net.transition(trans).guard
+        if guard not in self._guards:
+            self._guards[guard] = PlayoutTransitionGuard(
+                guard, len(self._guards) + 1
+            )
+        return self._guards[guard]
+
+    def expand(self, node:TransitionDagNode) -> TransitionDagNode:
+        """
+        Generates the steps of the node, if not already generated, by firing 
+        silent transitions from its markings until a visible transition 
+        fires. Returns the node.
+        """
+        if node.expanded():
+            return node
+        steps:Dict[str,Tuple[Set[Tuple[int]],Set[TransitionTreeGuard]]] = \
+            dict()
+        for marking in node.markings:
+            # a partial is (marking, trailing silents, merged silent guard)
+            stack = [ (marking, tuple(), None) ]
+            while len(stack) > 0:
+                marking, silents, leftover = stack.pop()
+                if marking == self._final:
+                    node.reached = True
+                    continue
+                for trans, next_marking in self._net.successors(marking):
+                    guard = self._guard(trans)
+                    if leftover != None:
+                        guard = TransitionTreeMerge(leftover, guard)
+                    if self._net.silent(trans):
+                        if silents.count(trans) > 1:
+                            continue
+                        stack.append(
+                            (next_marking, silents + (trans,), guard)
+                        )
+                        continue
+                    if node.remaining == 0:
+                        continue
+                    act = self._net.transition(trans).name
+                    if act not in steps:
+                        steps[act] = (set(), set())
+                    steps[act][0].add(next_marking)
+                    steps[act][1].add(guard)
+        remaining = None if node.remaining == None else node.remaining - 1
+        node.steps = dict(
+            (act, (frozenset(guards), self.node(frozenset(markings), remaining)))
+            for act, (markings, guards) in steps.items()
+        )
+        return node
+
+class LazyTransitionTree():
+    """
+    A transition tree for the play-out of a Petri net with data, presenting
+    a vertex for each prefix over the shared suffixes of a TransitionDag. 
+    The children of a vertex are only generated when the flows of the 
+    vertex are first requested, so a matching only expands the vertices 
+    that it reaches within the cost bound of the variants below them (see 
+    find_least_costy_paths_for_variants), however long other variants are.
+    Whether a vertex is terminal is found without generating its children.
+
+    The suffixes of the DAG are unbounded, so they are shared between 
+    prefixes of any length. A longest playout only limits the depth of the
+    tree, where a vertex at that depth offers no steps besides halting, as
+    in the tree from construct_from_model for the same longest playout. 
+    vertices(), flows() and terminals() only cover the vertices expanded so
+    far, and expand_all() expands every vertex of a bounded tree, after 
+    which they are the same as for that tree. A lazy tree is always frozen
+    and offers the lookups of a frozen TransitionTree. Trees over the same 
+    model can share a DAG, by giving the DAG of one tree when constructing
+    another.
+    """
+
+    def __init__(self, model:object, freduce:bool=True, 
+                 longest_playout:int=None, dag:TransitionDag=None) -> None:
+        # import here to avoid cirular dependenies
+        from pmkoalas.conformance.tokenreplay import PlayoutEnd
+        self._dag = TransitionDag(model) if dag == None else dag
+        self._freduce = freduce
+        self._longest = longest_playout
+        self._model_fingerprint = self._dag.fingerprint()
+        self._halt = PlayoutEnd()
+        self._root = LazyTransitionRoot(self)
+        # the shared suffix of each prefix, until the prefix is expanded
+        self._nodes:Dict[Tuple[str],TransitionDagNode] = {
+            tuple() : self._dag.root(None)
+        }
+        self._by_key:Dict[Tuple[str],LazyTransitionVertex] = {
+            tuple() : self._root
+        }
+        self._outgoing:Dict[Tuple[str],FrozenSet[TransitionTreeFlow]] = dict()
+        self._reaching:Dict[Tuple[str],TransitionTreeFlow] = dict()
+
+    def _key(self, vertex:TransitionTreeVertex) -> Tuple[str]:
+        return tuple(vertex._partial.sequence)
+    
+    def _child(self, key:Tuple[str], act:str) -> LazyTransitionVertex:
+        ckey = key + (act,)
+        if ckey not in self._by_key:
+            self._by_key[ckey] = LazyTransitionVertex(
+                len(self._by_key) + 1, Trace(list(ckey)), self
+            )
+        return self._by_key[ckey]
+
+    def _expand(self, vertex:TransitionTreeVertex) -> None:
+        """
+        Generates the children of the vertex from the steps of its shared 
+        suffix.
+        """
+        key = self._key(vertex)
+        if key in self._outgoing:
+            return
+        vertex = self._by_key[key]
+        node = self._dag.expand(self._nodes.pop(key))
+        steps = node.steps
+        if self._longest != None and len(key) >= self._longest:
+            steps = dict()
+        flows = set()
+        for act, (guards, next_node) in steps.items():
+            child = self._child(key, act)
+            self._nodes[self._key(child)] = next_node
+            act_flows = set( 
+                TransitionTreeGuardFlow(vertex, act, child, guard)
+                for guard in guards
+            )
+            if self._freduce and len(act_flows) > 1:
+                act_flows = set([ TransitionTreeGuardFlow(
+                    vertex, act, child, TransitionTreeJoin(act_flows)
+                ) ])
+            flows = flows.union(act_flows)
+        # as in construct_from_playout, a vertex halts when a sequence of 
+        # the play-out reaching the final marking ends at it, where the 
+        # sequences of a play-out have at least one visible step (see 
+        # playout_sequences), so the root only halts if it is given a step
+        if node.reached and not vertex.is_root():
+            vertex.set_as_terminal()
+            halt = self._child(key, self._halt.activity())
+            self._outgoing[self._key(halt)] = frozenset()
+            flows.add(TransitionTreeGuardFlow(
+                vertex, self._halt.activity(), halt, self._halt.guard
+            ))
+        for flow in flows:
+            self._reaching[self._key(flow.next())] = flow
+        self._outgoing[key] = frozenset(flows)
+
+    def _terminal(self, vertex:TransitionTreeVertex) -> bool:
+        """
+        Returns whether the vertex is terminal, only expanding its shared 
+        suffix if the vertex has not been expanded.
+        """
+        key = self._key(vertex)
+        if key not in self._nodes:
+            return vertex._end
+        node = self._dag.expand(self._nodes[key])
+        return node.reached and not vertex.is_root()
+
+    def expand_all(self) -> None:
+        """
+        Expands every vertex up to the longest playout, when this tree is 
+        bounded, otherwise does nothing.
+        """
+        if self._longest == None:
+            return
+        stack = list(self._nodes.keys())
+        while len(stack) > 0:
+            key = stack.pop()
+            self._expand(self._by_key[key])
+            stack.extend( 
+                self._key(flow.next()) for flow in self._outgoing[key] 
+                if self._key(flow.next()) not in self._outgoing
+            )
+
+    def dag(self) -> TransitionDag:
+        " returns the shared suffixes under this tree."
+        return self._dag
+
+    def is_frozen(self) -> bool:
+        " returns whether this tree is frozen, which is always the case."
+        return True
+    
+    def freeze(self) -> 'LazyTransitionTree':
+        " returns this tree, as it is always frozen."
+        return self
+    
+    def fingerprint(self) -> str:
+        """
+        returns a hash of the model, flow reduction and longest playout of
+        this tree, which is the same across processes.
+        """
+        key = ("lazy", self._model_fingerprint, self._freduce)
+        if self._longest != None:
+            key = key + (self._longest,)
+        return blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+    # lookups
+    def outgoing(self, vertex:TransitionTreeVertex) \
+        -> FrozenSet[TransitionTreeFlow]:
+        " returns the flows offered by the vertex, expanding it if needed."
+        key = self._key(vertex)
+        if key not in self._by_key:
+            return frozenset()
+        self._expand(vertex)
+        return self._outgoing[key]
+    
+    def incoming(self, vertex:TransitionTreeVertex) \
+        -> FrozenSet[TransitionTreeFlow]:
+        " returns the flows directed towards the vertex."
+        key = self._key(vertex)
+        if key not in self._reaching:
+            return frozenset()
+        parent = self._reaching[key].offering()
+        return frozenset( 
+            flow for flow in self.outgoing(parent) 
+            if self._key(flow.next()) == key
+        )
+    
+    def parent(self, vertex:TransitionTreeVertex) \
+        -> Union[TransitionTreeVertex,None]:
+        " returns the parent of the vertex, or None for the root."
+        key = self._key(vertex)
+        if key not in self._reaching:
+            return None
+        return self._reaching[key].offering()
+    
+    def child(self, vertex:TransitionTreeVertex, act:str) \
+        -> Union[TransitionTreeVertex,None]:
+        " returns the child reached by the activity, or None if no such child."
+        key = self._key(vertex)
+        if key not in self._by_key:
+            return None
+        self._expand(vertex)
+        return self._by_key.get(key + (act,), None)
+    
+    def path_to(self, vertex:TransitionTreeVertex) \
+        -> Tuple[TransitionTreeFlow]:
+        " returns the flows from the root to the vertex."
+        key = self._key(vertex)
+        flows = []
+        while key in self._reaching:
+            flows.append(self._reaching[key])
+            key = key[:-1]
+        return tuple(flows[::-1])
+
+    # accessors
+    def root(self) -> LazyTransitionRoot:
+        " returns the root of this tree."
+        return self._root
+    
+    def vertices(self) -> FrozenSet[LazyTransitionVertex]:
+        " returns the vertices generated so far, see expand_all."
+        return frozenset(self._by_key.values())
+    
+    def terminals(self) -> FrozenSet[LazyTransitionVertex]:
+        " returns the terminal vertices expanded so far, see expand_all."
+        return frozenset( 
+            v for key,v in self._by_key.items() 
+            if key in self._outgoing and v._end 
+        )
+    
+    def flows(self) -> FrozenSet[TransitionTreeFlow]:
+        " returns the flows of the vertices expanded so far, see expand_all."
+        return frozenset( 
+            flow for flows in self._outgoing.values() for flow in flows 
+        )
+
+def truncate_tree(tree:TransitionTree, k:int) -> TransitionTree:
+    """
+    Truncates a tree constructed from a play-out to the tree that would be
+    constructed for a shallower length of the longest observed trace, i.e.
+    the vertices with at most k activities and the halting vertices below 
+    them. The truncated tree shares vertices and flows with the given tree.
+    """
+    # import here to avoid cirular dependenies
+    from pmkoalas.conformance.tokenreplay import PlayoutEnd
+    halt = PlayoutEnd().activity()
+    def keep(vertex:TransitionTreeVertex) -> bool:
+        depth = len(vertex._partial)
+        return depth <= k or \
+            (depth == k + 1 and vertex._partial[depth-1] == halt)
+    vertices = set( v for v in tree.vertices() if keep(v) )
+    flows = set( 
+        f for f in tree.flows() if f.next() in vertices 
+    )
+    return TransitionTree(vertices, tree.root(), flows, 
+                          frozen=tree.is_frozen())
+
+class TransitionTreeCache():
+    """
+    A cache of trees constructed from models, keyed by the fingerprint of 
+    the model (see LabelledPetriNet.fingerprint), the length of the longest
+    observed trace and whether flow reduction was applied. A tree for a 
+    longer length also answers requests for shorter lengths, by truncation
+    (see truncate_tree).
+
+    Trees are kept in memory, dropping the least recently used tree when 
+    full, and optionally in a directory on disk, which outlives the process.
+    A cache with a size of zero and no directory is disabled, which is how
+    TRANSITION_TREE_CACHE starts.
+
+    Lazy trees (see LazyTransitionTree) are only kept in memory, as they 
+    grow while they are explored. A lazy tree for a model answers requests
+    for other lengths with a new tree over the same DAG.
+    """
+
+    def __init__(self, maxsize:int=8, directory:str=None) -> None:
+        self._maxsize = maxsize
+        self.directory = directory
+        self._store:OrderedDict[Tuple[str,bool,int,bool],
+                                Union[TransitionTree,LazyTransitionTree]] = \
+            OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        " the number of trees that can be kept in memory."
+        return self._maxsize
+    
+    @property
+    def enabled(self) -> bool:
+        " whether trees are kept, in memory or on disk."
+        return self._maxsize > 0 or self.directory != None
+    
+    def resize(self, maxsize:int) -> None:
+        """
+        Changes the number of trees that can be kept in memory, dropping the 
+        least recently used trees if needed.
+        """
+        self._maxsize = max([maxsize, 0])
+        while len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def _disk_path(self, key:Tuple[str,bool,int,bool]) -> str:
+        fingerprint, freduce, k, _ = key
+        return path.join(self.directory, f"{fingerprint}-{int(freduce)}-{k}.pkl")
+
+    def _deeper_on_disk(self, fingerprint:str, freduce:bool, k:int) \
+        -> Union[int,None]:
+        " returns the shortest length at least k with a tree on disk."
+        if self.directory == None or not path.exists(self.directory):
+            return None
+        prefix = f"{fingerprint}-{int(freduce)}-"
+        lengths = [
+            int(name[len(prefix):-4])
+            for name in listdir(self.directory)
+            if name.startswith(prefix) and name.endswith(".pkl")
+        ]
+        lengths = [ length for length in lengths if length >= k ]
+        return min(lengths) if len(lengths) > 0 else None
+
+    def _load(self, key:Tuple[str,bool,int,bool]) \
+        -> Union[TransitionTree,None]:
+        try:
+            with open(self._disk_path(key), "rb") as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _keep(self, key:Tuple[str,bool,int,bool], 
+              tree:Union[TransitionTree,LazyTransitionTree]) -> None:
+        if self._maxsize < 1:
+            return
+        self._store[key] = tree
+        self._store.move_to_end(key)
+        if len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def get(self, fingerprint:str, k:int, freduce:bool, lazy:bool=False) \
+        -> Union[TransitionTree,LazyTransitionTree,None]:
+        """
+        returns the tree for the model and length, truncating a tree for a
+        longer length if needed, or None if no such tree is kept.
+        """
+        key = (fingerprint, freduce, k, lazy)
+        if key in self._store:
+            self.hits += 1
+            self._store.move_to_end(key)
+            return self._store[key]
+        if lazy:
+            return self._get_lazy(key)
+        deeper = [ 
+            other for other in self._store.keys() 
+            if other[:2] == key[:2] and other[2] > k and not other[3]
+        ]
+        tree = None
+        if len(deeper) > 0:
+            other = min(deeper, key=lambda other: other[2])
+            info(f"truncating cached tree for length {other[2]} to {k}.")
+            tree = truncate_tree(self._store[other], k)
+        else:
+            length = self._deeper_on_disk(fingerprint, freduce, k)
+            if length != None:
+                tree = self._load((fingerprint, freduce, length, False))
+                if tree != None:
+                    info(f"loaded tree for length {length} from disk.")
+                    self._keep((fingerprint, freduce, length, False), tree)
+                    if length > k:
+                        tree = truncate_tree(tree, k)
+        if tree == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._keep(key, tree)
+        return tree
+    
+    def _get_lazy(self, key:Tuple[str,bool,int,bool]) \
+        -> Union[LazyTransitionTree,None]:
+        " returns a lazy tree over the DAG of a kept lazy tree for the model."
+        fingerprint, freduce, k, _ = key
+        others = [ 
+            other for other in self._store.keys() 
+            if other[0] == fingerprint and other[3]
+        ]
+        if len(others) == 0:
+            self.misses += 1
+            return None
+        dag = self._store[others[-1]].dag()
+        info(f"sharing cached play-out of {dag.nodes()} suffixes.")
+        tree = LazyTransitionTree(None, freduce=freduce, longest_playout=k, 
+                                  dag=dag)
+        self.hits += 1
+        self._keep(key, tree)
+        return tree
+    
+    def put(self, fingerprint:str, k:int, freduce:bool, 
+            tree:Union[TransitionTree,LazyTransitionTree], 
+            lazy:bool=False) -> None:
+        " keeps the tree for the model and length."
+        key = (fingerprint, freduce, k, lazy)
+        self._keep(key, tree)
+        if self.directory != None and not lazy:
+            # guards hold compiled functions, which need cloudpickle (a 
+            # dependency of joblib) to be kept on disk
+            import cloudpickle
+            makedirs(self.directory, exist_ok=True)
+            temp = self._disk_path(key) + f".{getpid()}.tmp"
+            with open(temp, "wb") as file:
+                cloudpickle.dump(tree, file)
+            replace(temp, self._disk_path(key))
+
+    def clear(self) -> None:
+        " drops all trees kept in memory and resets the counters."
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._store)
+    
+    def __str__(self) -> str:
+        return f"TransitionTreeCache(size={len(self)}/{self.maxsize}, " + \
+            f"directory={self.directory}, hits={self.hits}, " + \
+            f"misses={self.misses})"
+
+# the cache used by construct_from_model, which is disabled until given a 
+# size with TransitionTreeCache.resize, or a directory to keep trees on disk
+TRANSITION_TREE_CACHE = TransitionTreeCache(maxsize=0)
+
+def construct_from_model(model:object, longest_playout:int, freduce:bool=True,
+                         compact:bool=False, lazy:bool=False)\
+    -> Union[TransitionTree,CompactTransitionTree,LazyTransitionTree]:
     """ 
     Constructs a transition tree from an executable model.
     Currently only supports petri nets.
@@ -707,20 +1955,57 @@ def construct_from_model(model:object, longest_playout:int, freduce:bool=True)\
     `model`: the model which will be used to generate the tree. 
     `longest_playout`: the length of the longest observed trace, used to limit tree depth.\n
     `freduce`: should flow reduction step be applied to ensure that only one
-    flow exists between nodes.
+    flow exists between nodes.\n
+    `compact`: should the tree be returned in compact form, see 
+    CompactTransitionTree.\n
+    `lazy`: should the tree only be expanded as it is explored, over the 
+    shared suffixes of the play-out, where the longest playout only limits
+    the depth of the tree, see LazyTransitionTree and TransitionDag.
+
+    When TRANSITION_TREE_CACHE is enabled, trees are kept in it, so a tree 
+    is only constructed once for the same model, length and flow reduction.
     """
     # import here to avoid cirular dependenies
     from pmkoalas.models.petrinet import LabelledPetriNet
-    from pmkoalas.conformance.tokenreplay import construct_playout_log
+    from pmkoalas.conformance.tokenreplay import playout_steps
     # the work
-    if (issubclass(type(model), LabelledPetriNet)):
-        playout_log = construct_playout_log(
-            model, longest_playout,
-            model.initial_marking,
-            model.final_marking
-        )
-        return convert_playout_to_tree(playout_log, longest_playout, 
-                                       freduce=freduce)
+    if (issubclass(type(model), LabelledPetriNet) and lazy):
+        fingerprint = model.fingerprint()
+        tree = None
+        if TRANSITION_TREE_CACHE.enabled:
+            tree = TRANSITION_TREE_CACHE.get(fingerprint, longest_playout, 
+                                             freduce, lazy=True)
+        if tree == None:
+            tree = LazyTransitionTree(model, freduce=freduce, 
+                                      longest_playout=longest_playout)
+            if TRANSITION_TREE_CACHE.enabled:
+                TRANSITION_TREE_CACHE.put(fingerprint, longest_playout, 
+                                          freduce, tree, lazy=True)
+        else:
+            info(f"reusing cached tree :: {TRANSITION_TREE_CACHE}")
+        return tree
+    elif (issubclass(type(model), LabelledPetriNet)):
+        fingerprint = model.fingerprint()
+        tree = None
+        if TRANSITION_TREE_CACHE.enabled:
+            tree = TRANSITION_TREE_CACHE.get(fingerprint, longest_playout, 
+                                             freduce)
+        if tree == None:
+            playout = playout_steps(
+                model, longest_playout,
+                model.initial_marking,
+                model.final_marking
+            )
+            tree = construct_from_playout(playout, longest_playout, 
+                                          freduce=freduce)
+            if TRANSITION_TREE_CACHE.enabled:
+                TRANSITION_TREE_CACHE.put(fingerprint, longest_playout, 
+                                          freduce, tree)
+        else:
+            info(f"reusing cached tree :: {TRANSITION_TREE_CACHE}")
+        if (compact):
+            return convert_to_compact_tree(tree)
+        return tree
     else:
         raise ValueError("No known execution playout technique for model of" +\
                          f" type :: {type(model)}")
@@ -6,14 +6,19 @@ from dataclasses import dataclass
 from enum import Enum
 from os import path
 from datetime import datetime
-from typing import List, Mapping
+from typing import IO, Iterator, List, Mapping, Set, Tuple, Union
+from io import BytesIO
+import re
 from copy import deepcopy
 
-from xml.etree.ElementTree import Element, parse
+from xml.etree.ElementTree import Element, iterparse
 
 from pmkoalas.simple import EventLog, Trace
 from pmkoalas.complex import ComplexEvent, ComplexTrace, ComplexEventLog
 from pmkoalas._logging import debug, info, enable_logging
+from pmkoalas.work import WorkerPool, effective_jobs, CHUNKS_PER_WORKER
+from pmkoalas.cache import load_complex_log, store_complex_log
+from pmkoalas.cache import load_simple_log, store_simple_log
 from pmkoalas.xes import XES_CONCEPT,XES_TIME,XES_XML_NAMESPACE
 
 from pmkoalas.xes_export import XES_STRING_TAG, XES_TIME_TAG , XES_INT_TAG
@@ -96,132 +101,347 @@ def find_element(root:Element, find:str, use_namespace:bool) -> List[Element]:
     else: 
         return [ event for event in root.findall(f"{find}")]
 
+def _local_tag(element:Element) -> str:
+    " returns the tag of the element without any namespace."
+    return element.tag.rsplit("}", 1)[-1]
+
+def _read_attribute(element:Element) -> object:
+    " returns the value of the attribute described by the element."
+    return XesAttribute(
+        find_xes_type(element.tag),
+        element.attrib.get('key'),
+        element.attrib.get("value")
+    ).get()
+
+def stream_xes(filepath:Union[str,IO]) -> Iterator[Tuple[str,Element]]:
+    """
+    Streams the children of the log element in an XES formatted event log,
+    yielding pairs of (tag, element) as each child is completed, where tag
+    has no namespace. Each element is cleared once the next pair is 
+    requested, so that only one trace is held in memory at a time. A file
+    opened from a path is closed when the stream is closed or exhausted.
+    """
+    if hasattr(filepath, "read"):
+        yield from _stream_children(filepath)
+    else:
+        with open(filepath, "rb") as file:
+            yield from _stream_children(file)
+
+def _stream_children(file:IO) -> Iterator[Tuple[str,Element]]:
+    " streams the children of the log element, see stream_xes."
+    depth = 0
+    root = None
+    for action, element in iterparse(file, events=("start", "end")):
+        if action == "start":
+            if root == None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield _local_tag(element), element
+            element.clear()
+            root.clear()
+    if root == None:
+        raise ValueError("Unable to find log element in xml structure")
+    
+def _extract_label(event:Element, label_attribute:str) -> str:
+    " returns the label of the event, using its last label attribute."
+    label = None 
+    for child in event.iter():
+        if (child.attrib.get('key') == label_attribute):
+            label = XesAttribute(find_xes_type(child.tag), 
+                                label_attribute, child.attrib.get("value"))
+    return label.get()
+
+def _extract_complex_trace(trace:Element, label_attribute:str,
+        attributes:Set[str]=None) -> ComplexTrace:
+    """
+    Builds a complex trace from the trace element, where the data of events
+    are all the attributes (including nested ones) except the label, and the
+    data of the trace are its own attributes. If attributes are given, then
+    only attributes with these keys are decoded and kept.
+    """
+    events = []
+    trace_map = dict()
+    for child in trace:
+        key = child.attrib.get('key')
+        if (_local_tag(child) == "event"):
+            label = None 
+            map = dict()
+            for attr in child.iter():
+                key = attr.attrib.get('key')
+                if (key == label_attribute):
+                    label = XesAttribute(find_xes_type(attr.tag), 
+                                        key, attr.attrib.get("value"))
+                elif (key != None and 
+                      (attributes == None or key in attributes)):
+                    map[key] = _read_attribute(attr)
+            events.append(ComplexEvent(label.get(), map))
+        elif (key != None and (attributes == None or key in attributes)):
+            trace_map[key] = _read_attribute(child)
+    return ComplexTrace(events, data=trace_map)
+
+# the name of a log without a concept:name attribute
+_UNKNOWN_LOG_NAME = "Unknown Event log"
+
+def _read_log_attribute(element:Element, name:str, 
+        log_map:Mapping[str,object]) -> str:
+    """
+    Keeps the attribute described by a child of the log element in the given
+    map, returning the name of the log, being the value of the first 
+    concept:name attribute. Children without a key are ignored.
+    """
+    key = element.attrib.get('key')
+    if (key == None):
+        return name
+    if (key == XES_CONCEPT and name == _UNKNOWN_LOG_NAME):
+        name = element.attrib.get("value")
+        debug(f"extracted event log name :: {name}")
+    log_map[key] = _read_attribute(element)
+    return name
+
+def _read_header(stream:Iterator[Tuple[str,Element]]) \
+    -> Tuple[str, Mapping[str,object], Union[Element,None]]:
+    """
+    Reads a stream of an XES formatted event log up to the first trace, 
+    returning the name and attributes of the log, and the first trace if 
+    any. Log attributes after the first trace are left in the stream.
+    """
+    name = _UNKNOWN_LOG_NAME
+    log_map = dict()
+    first = None
+    for tag, element in stream:
+        if (tag == "trace"):
+            first = element
+            break
+        name = _read_log_attribute(element, name, log_map)
+    return name, log_map, first
+
+class _LogHeader():
+    """
+    The name and attributes of an XES formatted event log, which are 
+    completed by log attributes found between or after the traces as the 
+    traces are streamed.
+    """
+
+    def __init__(self, name:str, log_map:Mapping[str,object]) -> None:
+        self.name = name
+        self.data = log_map
+
+    def add(self, element:Element) -> None:
+        " keeps a log attribute found after the first trace."
+        self.name = _read_log_attribute(element, self.name, self.data)
+
+def _stream_header(filepath:str) -> Tuple[_LogHeader, Iterator[Element]]:
+    """
+    Streams an XES formatted event log up to the first trace, returning the 
+    name and attributes of the log, followed by an iterator over the trace 
+    elements, see _read_header. Log attributes found after the first trace
+    are added to the header while the traces are iterated, so the header is
+    only complete once the iterator is exhausted.
+    """
+    stream = stream_xes(filepath)
+    name, log_map, first = _read_header(stream)
+    header = _LogHeader(name, log_map)
+    def traces() -> Iterator[Element]:
+        if first == None:
+            return
+        yield first
+        for tag, element in stream:
+            if (tag == "trace"):
+                yield element
+            else:
+                header.add(element)
+    return header, traces()
+
+# the size of file, in bytes, below which traces are read in this process
+PARALLEL_READ_SIZE = 8 * 2**20
+# the size of blocks, in bytes, read while looking for the start of a trace
+_SCAN_BLOCK = 2**20
+_LOG_START = re.compile(rb"<((?:[\w.-]+:)?log)[\s>]")
+_TRACE_START = re.compile(rb"<(?:[\w.-]+:)?trace[\s>/]")
+
+def _find_trace_start(file:IO, offset:int) -> int:
+    """
+    Returns the offset of the first trace start tag at or after the given
+    offset, or the size of the file if there is none.
+    """
+    file.seek(offset)
+    overlap = b""
+    base = offset
+    while True:
+        block = file.read(_SCAN_BLOCK)
+        if len(block) == 0:
+            return base + len(overlap)
+        scanned = overlap + block
+        found = _TRACE_START.search(scanned)
+        if found != None:
+            return base + found.start()
+        # keep the end of the block, in case a tag spans two blocks
+        overlap = scanned[-16:]
+        base += len(scanned) - len(overlap)
+
+def _trace_aligned_ranges(filepath:str, parts:int) \
+    -> Tuple[bytes, bytes, List[Tuple[int,int]]]:
+    """
+    Splits an XES formatted event log into at most the given number of byte
+    ranges, each starting at a trace start tag. Returns the bytes before the
+    first trace, the closing tag of the log, and the (start, end) ranges in
+    document order. A trace start tag within a comment would misalign the 
+    ranges.
+    """
+    size = path.getsize(filepath)
+    with open(filepath, "rb") as file:
+        first = _find_trace_start(file, 0)
+        file.seek(0)
+        header = file.read(first)
+        found = _LOG_START.search(header)
+        if found == None:
+            raise ValueError("Unable to find log element in xml structure")
+        closing = b"</" + found.group(1) + b">"
+        file.seek(max([size - _SCAN_BLOCK, first]))
+        tail = file.read()
+        end = size - len(tail) + tail.rfind(closing)
+        if tail.rfind(closing) < 0 or end <= first:
+            return header, closing, []
+        starts = [ first ]
+        for part in range(1, parts):
+            start = _find_trace_start(file, 
+                        first + (part * (end - first)) // parts)
+            if start > starts[-1] and start < end:
+                starts.append(start)
+    ranges = [ 
+        (start, stop) for start,stop in zip(starts, starts[1:] + [end]) 
+    ]
+    return header, closing, ranges
+
+def _read_xes_range(filepath:str, header:bytes, closing:bytes, start:int, 
+        end:int, label_attribute:str, attributes:Set[str]) \
+        -> Tuple[List[ComplexTrace], List[Element]]:
+    """
+    Reads the complex traces in the given byte range of an XES formatted 
+    event log, by wrapping them in the log element of the file. Also returns
+    the log attributes in the range, i.e. those found after its first trace.
+    """
+    with open(filepath, "rb") as file:
+        file.seek(start)
+        body = file.read(end - start)
+    traces = []
+    log_attributes = []
+    for tag, element in stream_xes(BytesIO(header + body + closing)):
+        if tag == "trace":
+            traces.append(
+                _extract_complex_trace(element, label_attribute, attributes)
+            )
+        elif len(traces) > 0:
+            # keep a detached copy, as the element is cleared when streaming
+            log_attributes.append(Element(element.tag, element.attrib))
+    return traces, log_attributes
+
+def _read_xes_parallel(filepath:str, label_attribute:str, 
+        attributes:Set[str], n_jobs:int, header:_LogHeader=None) \
+        -> Iterator[ComplexTrace]:
+    """
+    Reads the complex traces of an XES formatted event log across worker 
+    processes, where each worker reads trace-aligned byte ranges of the 
+    file. Traces are returned in document order. Log attributes found after
+    the first trace are added to the given header, if any.
+    """
+    if path.getsize(filepath) < PARALLEL_READ_SIZE:
+        n_jobs = 1
+    parts = effective_jobs(n_jobs) * CHUNKS_PER_WORKER
+    start_bytes, closing, ranges = _trace_aligned_ranges(filepath, parts)
+    info(f"reading {len(ranges)} ranges of traces with "
+         f"{effective_jobs(n_jobs)} workers")
+    with WorkerPool(dict(), n_jobs=n_jobs) as pool:
+        chunks = pool.starmap(
+            _read_xes_range,
+            ( (filepath, start_bytes, closing, start, end, label_attribute,
+               attributes) 
+              for start,end in ranges )
+        )
+    for chunk, log_attributes in chunks:
+        for trace in chunk:
+            yield trace
+        if header != None:
+            for element in log_attributes:
+                header.add(element)
+
 @enable_logging
 def read_xes_complex(filepath:str,
-                    label_attribute=XES_CONCEPT) -> ComplexEventLog:
+                    label_attribute=XES_CONCEPT,
+                    attributes:Set[str]=None,
+                    n_jobs:int=1,
+                    cache:bool=False) -> ComplexEventLog:
     """
-    Reads an XES formatted event log and creates a simplified event log
-    object. Traces from the event log are sorted by the sort_attribute
-    (time:timestamp by default) before making the sequence of labels
-    (concept:name by default).
+    Reads an XES formatted event log and creates a complex event log
+    object. Traces from the event log are kept in document order, and each
+    is converted to a complex trace as soon as it has been read, so that
+    memory is bounded by the largest trace rather than the whole file 
+    (see stream_xes).
 
     Parameters
     ----------
     filepath: `str`
     \t the filepath to the xes file to read.
-    sort_attribute: `str`=`time:timestamp`
-    \t the xes attribute to sort on.
     label_attribute: `str`=`concept:name`
     \t the xes attribute for the process label for an event
-    debug: `bool`=`True`
-    \t whether to print debug messages or not
-    sort: `bool`=`False`
-    \t whether to sort activity labels by another xes attribute or not
+    attributes: `Set[str]`=`None`
+    \t if given, only event and trace attributes with these keys are kept,
+    \t e.g. the variables of a Petri net with data (see 
+    \t PetriNetWithData.guard_variables), otherwise all are kept.
+    n_jobs: `int`=`1`
+    \t the number of worker processes to read traces with, following 
+    \t joblib for negative numbers. Files smaller than PARALLEL_READ_SIZE
+    \t are read in this process.
+    cache: `bool`=`False`
+    \t whether to load the log from, or store it into, the on-disk cache 
+    \t (see pmkoalas.cache), which is invalidated when the file changes.
     """ 
 
     # check that file exists
     if not path.exists(filepath):
         raise FileNotFoundError("event log file not found at :: "+filepath)
     
-    # parse traces
-    xml_tree = parse(filepath)
-    log = xml_tree.getroot()
-
-    if (log == None):
-        raise ValueError("Unable to find log element in xml structure")
-    
-    # find name of log
-    log_attrs = log.find(".*[@key='concept:name']")
-
-    name = "Unknown Event log"
-    if log_attrs != None:
-        name = log_attrs.attrib.get("value")
-        debug(f"extracted event log name :: {name}")
-
-    # check with namespace
-    ns_traces = [ trace for trace in log.findall("xes:trace",
-     XES_XML_NAMESPACE)]
-    #  check without namespace
-    nns_traces = [ trace for trace in log.findall("trace",
-     XES_XML_NAMESPACE)]
-    #  decide what to do with namespace
-    use_namespace = True
-    if (len(ns_traces) == nns_traces):
-        traces = ns_traces 
-        del nns_traces
-    elif (len(ns_traces) < len(nns_traces)):
-        traces = nns_traces
-        use_namespace = False
-        del ns_traces 
-    else: 
-        traces = ns_traces
-        del ns_traces
-
-    info(f"parsing {len(traces)} traces ...")
-    # extract the following from a trace,
-    # a sequence of activity labels
-    # sort traces by time:timestamp before 
-    extracted_traces = []
-    for trace in traces:
-        trace_ins = [] # each element is a EventExtract
-        events = find_element(trace, "event", use_namespace)
-        for id,event in enumerate(events):
-            label = None 
-            sorter = None 
-            map = dict()
-            for child in event.iter():
-                key = child.attrib.get('key')
-                # print(key)
-                if (key == label_attribute):
-                    label = XesAttribute(find_xes_type(child.tag), 
-                                        key, child.attrib.get("value"))
-                else:
-                    if (key == None):
-                        continue
-                    map[key] = XesAttribute(
-                        find_xes_type(child.tag),
-                        key, 
-                        child.attrib.get("value")                        
-                    ).get()
-            extract = EventExtract(id, label , sorter, map)
-            trace_ins.append(extract)
-        # handle complex event construction
-        # collect any trace level attributes
-        trace_map = dict()
-        for child in trace:
-            key = child.attrib.get('key')
-            if (key == None):
-                continue
-            trace_map[key] = XesAttribute(
-                        find_xes_type(child.tag),
-                        key, 
-                        child.attrib.get("value")                        
-                    ).get()
-        # build complex events and trace
-        trace_ins = ComplexTrace(
-            [ ComplexEvent(t.get_label(),t.get_data()) for t in trace_ins ],
-             data=trace_map)
-        # store complex trace
-        extracted_traces.append(trace_ins) 
-    # build log-level attributes
-    log_map = dict()
-    for child in log:
-        key = child.attrib.get('key')
-        if (key == None):
-            continue
-        log_map[key] = XesAttribute(
-                    find_xes_type(child.tag),
-                    key, 
-                    child.attrib.get("value")                        
-                ).get()
-    return ComplexEventLog(extracted_traces, name=name, data=log_map)
+    if attributes != None:
+        attributes = set(attributes)
+        info(f"only keeping attributes :: {sorted(attributes)}")
+    options = ("complex", label_attribute, 
+               None if attributes == None else tuple(sorted(attributes)))
+    if cache:
+        log = load_complex_log(filepath, options)
+        if log != None:
+            return log
+    # stream traces
+    info(f"streaming traces from :: {filepath}")
+    if effective_jobs(n_jobs) > 1:
+        # only the header is read here, as workers read the traces
+        stream = stream_xes(filepath)
+        try:
+            header = _LogHeader(*_read_header(stream)[:2])
+        finally:
+            stream.close()
+        traces = list(_read_xes_parallel(filepath, label_attribute, 
+                                         attributes, n_jobs, header))
+    else:
+        header, traces = _stream_header(filepath)
+        traces = [ _extract_complex_trace(trace, label_attribute, attributes) 
+                   for trace in traces ]
+    # traces are read before the log, as log attributes can follow them
+    log = ComplexEventLog(traces, name=header.name, data=header.data)
+    if cache:
+        store_complex_log(filepath, options, log)
+    return log
 
 @enable_logging
-def read_xes_simple(filepath:str, label_attribute=XES_CONCEPT) -> EventLog:
+def read_xes_simple(filepath:str, label_attribute=XES_CONCEPT,
+                    cache:bool=False) -> EventLog:
     """
     Reads an XES formatted event log and creates a simplified event log 
     object. Traces from the event log are kept in document order before 
-    making the sequence of labels (concept:name by default).
+    making the sequence of labels (concept:name by default), and each is 
+    converted as soon as it has been read (see stream_xes).
 
     Parameters
     ----------
@@ -229,66 +449,33 @@ def read_xes_simple(filepath:str, label_attribute=XES_CONCEPT) -> EventLog:
     \t the filepath to the xes file to read.
     label_attribute: `str`=`concept:name`
     \t the xes attribute for the process label for an event
+    cache: `bool`=`False`
+    \t whether to load the log from, or store it into, the on-disk cache 
+    \t (see pmkoalas.cache), which is invalidated when the file changes.
     """
 
     # check that file exists
     if not path.exists(filepath):
         raise FileNotFoundError("event log file not found at :: "+filepath)
 
-    # parse traces
-    xml_tree = parse(filepath)
-    log = xml_tree.getroot()
-
-    if (log == None):
-        raise ValueError("Unable to find log element in xml structure")
-
-    # find name of log
-    log_attrs = log.find(".*[@key='concept:name']")
-
-    name = "Unknown Event log"
-    if log_attrs != None:
-        name = log_attrs.attrib.get("value")
-        debug(f"extracted event log name :: {name}")
-
-    # check with namespace
-    ns_traces = [ trace for trace in log.findall("xes:trace",
-     XES_XML_NAMESPACE)]
-    #  check without namespace
-    nns_traces = [ trace for trace in log.findall("trace",
-     XES_XML_NAMESPACE)]
-    #  decide what to do with namespace
-    use_namespace = True
-    if (len(ns_traces) == nns_traces):
-        traces = ns_traces 
-        del nns_traces
-    elif (len(ns_traces) < len(nns_traces)):
-        traces = nns_traces
-        use_namespace = False
-        del ns_traces 
-    else: 
-        traces = ns_traces
-        del ns_traces
-
-    info(f"parsing {len(traces)} traces ...")
-    # extract the following from a trace,
-    # a sequence of activity labels
-    # sort traces by time:timestamp before 
-    extracted_traces = []
-    for trace in traces:
-        trace_ins = [] # eache element is a EventExtract
-        events = find_element(trace, "event", use_namespace)
-        for id,event in enumerate(events):
-            label = None 
-            sorter = None 
-            for child in event.iter():
-                key = child.attrib.get('key')
-                # print(key)
-                if (key == label_attribute):
-                    label = XesAttribute(find_xes_type(child.tag), 
-                                        key, child.attrib.get("value"))
-            extract = EventExtract(id, label , sorter)
-            trace_ins.append(extract)
-        trace_ins = Trace([ t.get_label() for t in trace_ins ])
-        extracted_traces.append(trace_ins) 
-    return EventLog(extracted_traces, name)
-
+    options = ("simple", label_attribute)
+    if cache:
+        log = load_simple_log(filepath, options)
+        if log != None:
+            return log
+    # stream traces
+    header, traces = _stream_header(filepath)
+    info(f"streaming traces from :: {filepath}")
+    traces = [ 
+        Trace([ 
+            _extract_label(event, label_attribute) 
+            for event in trace
+            if _local_tag(event) == "event" 
+        ]) 
+        for trace in traces 
+    ]
+    # traces are read before the log, as its name can follow them
+    log = EventLog(traces, header.name)
+    if cache:
+        store_simple_log(filepath, options, log)
+    return log
@@ -28,6 +28,11 @@ class Trace():
         self._len = len(self.sequence)
         self._hash = hash(tuple(event for event in self.sequence))
         self._acts = set(self.sequence)
+
+    def __setstate__(self, state:dict) -> None:
+        # hashes of strings differ between processes, so recompute on load
+        self.__dict__.update(state)
+        self._hash = hash(tuple(event for event in self.sequence))
     
     # accessors
     def get_id(self) -> str:
@@ -94,23 +99,40 @@ class EventLog():
         info("Computing language...")
         start = time()
         for trace in traces:
-            if (trace in self._freqset.keys()):
-                self._freqset[trace] += 1
-            else:
-                self._acts = self._acts.union(
-                    trace.seen_activities()
-                )
-                if (len(trace) > 0):
-                    self._start_acts.add(trace[0])
-                    self._end_acts.add(trace[-1])
-                self._freqset[trace] = 1
-                self._variants += 1
-            self._len += 1
+            self._add_variant(trace, 1)
         self._traces = set([ t for t in self._freqset.keys() ])
         info(f"Computed language in {(time()-start)*1000:.0f}ms")
         self.name = name 
         self._relations = None
 
+    @classmethod
+    def from_frequencies(cls, variants:Iterable[Tuple[Trace,int]],
+            name:str=DEFAULT_SIMPLE_LOG_NAME) -> 'EventLog':
+        """
+        Creates a log from each variant and its frequency, without 
+        repeating the variant for each instance.
+        """
+        log = cls([], name=name)
+        for trace, freq in variants:
+            log._add_variant(trace, freq)
+        log._traces = set([ t for t in log._freqset.keys() ])
+        return log
+
+    def _add_variant(self, trace:Trace, freq:int) -> None:
+        " adds the given number of instances of a variant to this log."
+        if (trace in self._freqset.keys()):
+            self._freqset[trace] += freq
+        else:
+            self._acts = self._acts.union(
+                trace.seen_activities()
+            )
+            if (len(trace) > 0):
+                self._start_acts.add(trace[0])
+                self._end_acts.add(trace[-1])
+            self._freqset[trace] = freq
+            self._variants += 1
+        self._len += freq
+
     def seen_activities(self) -> Set[str]:
         "Get a language of process activities from this language"
         return deepcopy(self._acts)
@@ -0,0 +1,220 @@
+"""
+This module provides a pool of worker processes that are started once and
+hold shared structures, such as a transition tree, so that tasks only need
+to refer to these structures by a handle.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from math import ceil
+from os import remove
+from tempfile import mkstemp
+from uuid import uuid4
+
+from joblib import cpu_count
+from joblib.externals.loky import get_reusable_executor
+
+from pmkoalas._logging import info
+
+# the estimated cost of work below which it is run in this process, as 
+# starting workers and sending tasks would cost more than the work itself
+PARALLEL_OVERHEAD = 25000
+# the number of chunks to aim for in each worker, so that workers finishing
+# early can pick up the remaining chunks
+CHUNKS_PER_WORKER = 4
+
+# the shared structures loaded into this process, by token of their pool 
+# and then by handle
+_SHARED:Dict[str,Dict[str,Any]] = dict()
+# the tokens of the pools whose tasks are running in this process
+_ACTIVE:List[str] = list()
+
+def _load_shared(structures:Dict[str,Any], token:str) -> None:
+    """
+    Loads the given structures into this process for the pool with the 
+    given token, keeping the structures of other pools.
+    """
+    _SHARED[token] = structures
+
+def _unload_shared(token:str) -> None:
+    """
+    Unloads the structures of the pool with the given token from this 
+    process, keeping the structures of other pools.
+    """
+    _SHARED.pop(token, None)
+
+def _run_in(token:str, func:Callable, args:Tuple) -> Any:
+    """
+    Runs a task with the structures of the pool with the given token.
+    """
+    _ACTIVE.append(token)
+    try:
+        return func(*args)
+    finally:
+        _ACTIVE.pop()
+
+def _run_task(token:str, filepath:str, func:Callable, args:Tuple) -> Any:
+    """
+    Runs a task in a worker, first loading the structures of the pool from 
+    the given file if this worker has not loaded them yet. A worker runs one
+    task at a time, so it only keeps the structures of the latest pool.
+    """
+    if token not in _SHARED:
+        import pickle
+        with open(filepath, "rb") as file:
+            structures = pickle.load(file)
+        _SHARED.clear()
+        _load_shared(structures, token)
+    return _run_in(token, func, args)
+
+def shared(handle:str) -> Any:
+    """
+    Returns the shared structure for the given handle, in either a worker or
+    the process that created the pool. Within a task, the structures of the
+    pool running the task are used, otherwise those of the most recently 
+    opened pool holding the handle.
+    """
+    if len(_ACTIVE) > 0:
+        structures = _SHARED.get(_ACTIVE[-1], dict())
+        if handle in structures:
+            return structures[handle]
+    else:
+        for structures in reversed(_SHARED.values()):
+            if handle in structures:
+                return structures[handle]
+    raise ValueError(f"No shared structure is loaded for :: {handle}")
+
+def effective_jobs(n_jobs:int) -> int:
+    """
+    Returns the number of workers to use, where a negative number follows
+    joblib, i.e. -1 is all cpus and -2 is all cpus but one.
+    """
+    if n_jobs < 0:
+        return max([cpu_count() + 1 + n_jobs, 1])
+    return max([n_jobs, 1])
+
+def split_ranges(size:int, parts:int) -> List[Tuple[int,int]]:
+    """
+    Splits range(size) into at most the given number of contiguous ranges of
+    similar length, as (start, end) pairs.
+    """
+    parts = max([min([parts, size]), 1])
+    step = ceil(size / parts)
+    return [ (start, min([start+step, size])) 
+             for start in range(0, size, step) ] if size > 0 else [(0,0)]
+
+def plan_chunks(items:List[Any], costs:List[float], target:float) \
+    -> List[List[Any]]:
+    """
+    Groups items into chunks of about the target cost, where an item costing
+    more than the target is a chunk on its own. Chunks are ordered from the 
+    most to the least costly, so that long running chunks start first.
+    """
+    order = sorted(range(len(items)), key=lambda i: costs[i], reverse=True)
+    chunks = []
+    current = []
+    current_cost = 0.0
+    for i in order:
+        if costs[i] >= target:
+            chunks.append(([items[i]], costs[i]))
+            continue
+        current.append(items[i])
+        current_cost += costs[i]
+        if current_cost >= target:
+            chunks.append((current, current_cost))
+            current = []
+            current_cost = 0.0
+    if len(current) > 0:
+        chunks.append((current, current_cost))
+    chunks.sort(key=lambda chunk: chunk[1], reverse=True)
+    return [ chunk for chunk,_ in chunks ]
+
+class WorkerPool():
+    """
+    A pool of worker processes, where the given structures are loaded into
+    each worker a single time as it starts. Tasks are functions at the top
+    level of a module, which look up structures with shared(handle), so that
+    only the arguments and results of a task are sent between processes.
+
+    If only one worker would be used, or the estimated cost of the work is 
+    below PARALLEL_OVERHEAD, tasks are run in this process instead. The 
+    structures are also loaded into this process while the pool is open, so
+    the pool should be used as a context manager.
+
+    Workers are kept by loky between pools. Rather than handing the 
+    structures to the executor, which loky compares to decide on reuse, a 
+    pool writes them to a temporary file that workers load from when they
+    first see a task of the pool, identified by a token.
+    """
+
+    def __init__(self, structures:Dict[str,Any], n_jobs:int=-2, 
+                 cost:float=None) -> None:
+        self._structures = structures
+        self._workers = effective_jobs(n_jobs)
+        if cost != None and cost < PARALLEL_OVERHEAD:
+            info(f"running work in process, as estimated cost {cost:.0f} "
+                 f"is below overhead of {PARALLEL_OVERHEAD}")
+            self._workers = 1
+        self._executor = None
+        self._token = None
+        self._filepath = None
+
+    @property
+    def workers(self) -> int:
+        " returns the number of workers used by this pool."
+        return self._workers
+
+    def open(self) -> 'WorkerPool':
+        """
+        Loads the structures and starts the workers of this pool.
+        """
+        self._token = uuid4().hex
+        _load_shared(self._structures, self._token)
+        if self._workers > 1:
+            info(f"starting {self._workers} workers with shared "
+                 f"{sorted(self._structures.keys())}")
+            # import here, as cloudpickle is only needed for workers
+            import cloudpickle
+            handle, self._filepath = mkstemp(prefix="pmkoalas-", 
+                                             suffix=".pkl")
+            with open(handle, "wb") as file:
+                cloudpickle.dump(self._structures, file)
+            self._executor = get_reusable_executor(
+                max_workers=self._workers
+            )
+        return self
+
+    def close(self) -> None:
+        """
+        Unloads the structures of this pool from this process, leaving those
+        of other open pools, and removes their file. The workers are kept 
+        for reuse by later pools.
+        """
+        _unload_shared(self._token)
+        if self._filepath != None:
+            try:
+                remove(self._filepath)
+            except OSError:
+                pass
+            self._filepath = None
+        self._executor = None
+
+    def starmap(self, func:Callable, tasks:Iterable[Tuple]) -> List[Any]:
+        """
+        Runs func for the arguments of each task, returning the results in
+        the order of tasks.
+        """
+        tasks = list(tasks)
+        if self._executor == None:
+            return [ _run_in(self._token, func, args) for args in tasks ]
+        futures = [ 
+            self._executor.submit(
+                _run_task, self._token, self._filepath, func, args
+            ) 
+            for args in tasks 
+        ]
+        return [ future.result() for future in futures ]
+
+    def __enter__(self) -> 'WorkerPool':
+        return self.open()
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -63,7 +63,7 @@ OPTIMISED_RUN = True
 @enable_logging
 def axiom_3():
     info("testing axiom 3 for proposal of guard-recall.")
-    log = read_xes_complex(AX_3_LOG)
+    log = read_xes_complex(AX_3_LOG, cache=True)
     mean_computes = []
     mean_runtimes = []
     for test_no,model_file in enumerate(AX_3_MODELS):
@@ -95,7 +95,7 @@ def axiom_3():
 def axiom_4():
     info("testing axiom 4 for proposal of guard-recall.")
     results = []
-    log = read_xes_complex(AX_4_LOG)
+    log = read_xes_complex(AX_4_LOG, cache=True)
     model = parse_pnml_for_dpn(AX_4_MODEL)
     runtimes = []
     for run in range(1,AX_RERUNS):
@@ -121,9 +121,9 @@ def axiom_5():
     from pmkoalas.simple import Trace
     info("testing axiom 5 for proposal of guard-recall.")
     model = parse_pnml_for_dpn(AX_5_MODEL)
-    log = read_xes_complex(AX_5_LOG)
+    log = read_xes_complex(AX_5_LOG, cache=True)
     model = parse_pnml_for_dpn(AX_5_MODEL)
-    log = read_xes_complex(AX_5_LOG)
+    log = read_xes_complex(AX_5_LOG, cache=True)
     least_cost_matching = construct_many_matching(log, 
                                 construct_from_model(model, 4)) 
     shorter_lcost_matching = construct_many_matching(log, 
@@ -179,7 +179,7 @@ def axiom_6():
         runtimes = []
         for run in range(1,AX_RERUNS):
             info(f"computing run {run}...")
-            log = read_xes_complex(logfile)
+            log = read_xes_complex(logfile, cache=True)
             stime = time()
             res = compute_guard_recall(log, model, optimised=OPTIMISED_RUN)
             runtimes.append(time() - stime)
@@ -204,7 +204,7 @@ def axiom_7():
     info("testing axiom 7 for unpublished measurement (gprec_F).")
     mean_runtimes = []
     mean_computes = []
-    log = read_xes_complex(AX_7_LOG)
+    log = read_xes_complex(AX_7_LOG, cache=True)
     for test_no,model_file in enumerate(AX_7_MODELS):
         results = []
         runtimes = []
@@ -234,7 +234,7 @@ def axiom_7():
 @enable_logging
 def axiom_8():
     info("testing axiom 8 for unpublished measurement (gprec_F).")
-    log = read_xes_complex(AX_8_LOG)
+    log = read_xes_complex(AX_8_LOG, cache=True)
     mean_computes = []
     mean_runtimes = []
     mean_neg_computes = []
@@ -298,7 +298,7 @@ def axiom_9():
         results = []
         runtimes = []
         for run in range(1,AX_RERUNS):
-            log = read_xes_complex(logfile)
+            log = read_xes_complex(logfile, cache=True)
             info(f"computing run {run}...")
             stime = time()
             res = compute_guard_precision(log, parse_pnml_for_dpn(AX_9_MODEL),
@@ -324,7 +324,7 @@ def axiom_9():
 def test():
     from pmkoalas.simple import Trace
     model = parse_pnml_for_dpn(AX_5_MODEL)
-    log = read_xes_complex(AX_5_LOG)
+    log = read_xes_complex(AX_5_LOG, cache=True)
     least_cost_matching = construct_many_matching(log, 
                                 construct_from_model(model, 4)) 
     one_path_matching = ManyMatching(
@@ -0,0 +1,60 @@
+"""
+Checks that logs loaded from the on-disk cache are the same as freshly read
+logs, and that entries are refreshed when the source file changes.
+"""
+from pmkoalas import cache as log_cache
+from pmkoalas.read import read_xes_complex, read_xes_simple
+
+from os.path import join, dirname
+from shutil import copyfile
+from glob import glob
+import pytest
+
+ROOT = dirname(dirname(__file__))
+LOGS = sorted(glob(join(ROOT, "axioms", "*", "*.xes"))) + [
+    join(ROOT, "paper example", "paper_example_log.xes"),
+]
+
+def _describe_trace(trace) -> tuple:
+    return (
+        sorted(trace.data().items()),
+        [ (event.activity(), sorted(event.data().items())) for event in trace ]
+    )
+
+def _describe(log) -> tuple:
+    " describes a complex log independently of the order of its variants."
+    return (
+        log.name, 
+        sorted(log.data().items()),
+        sorted( 
+            repr(_describe_trace(instance)) 
+            for _, instances in log for instance in instances 
+        )
+    )
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch) -> str:
+    monkeypatch.setattr(log_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    return log_cache.CACHE_DIR
+
+@pytest.mark.parametrize("filepath", LOGS)
+def test_cached_log_matches_uncached(filepath, cache_dir):
+    fresh = read_xes_complex(filepath)
+    stored = read_xes_complex(filepath, cache=True)
+    assert len(glob(join(cache_dir, "*"))) == 1
+    loaded = read_xes_complex(filepath, cache=True)
+    assert _describe(stored) == _describe(fresh)
+    assert _describe(loaded) == _describe(fresh)
+    assert [ (str(t), len(i)) for t,i in loaded ] == \
+        [ (str(t), len(i)) for t,i in fresh ]
+    simple = read_xes_simple(filepath)
+    read_xes_simple(filepath, cache=True)
+    assert list(read_xes_simple(filepath, cache=True)) == list(simple)
+
+def test_changed_log_is_read_again(cache_dir, tmp_path):
+    filepath = str(tmp_path / "log.xes")
+    copyfile(LOGS[0], filepath)
+    read_xes_complex(filepath, cache=True)
+    copyfile(LOGS[-1], filepath)
+    loaded = read_xes_complex(filepath, cache=True)
+    assert _describe(loaded) == _describe(read_xes_complex(LOGS[-1]))
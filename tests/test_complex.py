@@ -0,0 +1,78 @@
+"""
+Checks the data states of complex traces and the unique instances of
+complex logs.
+"""
+from pmkoalas.complex import ComplexEvent, ComplexTrace, ComplexEventLog
+from pmkoalas.simple import Trace
+
+import pytest
+
+@pytest.fixture
+def trace() -> ComplexTrace:
+    return ComplexTrace([
+        ComplexEvent("a", { "xx" : 1 }),
+        ComplexEvent("b", dict()),
+        ComplexEvent("c", { "xx" : 2, "yy" : "y" }),
+        ComplexEvent("d", { "zz" : 3.0 }),
+    ])
+
+def test_states_are_cumulative(trace):
+    expected = [
+        dict(),
+        { "xx" : 1 },
+        { "xx" : 1 },
+        { "xx" : 2, "yy" : "y" },
+        { "xx" : 2, "yy" : "y", "zz" : 3.0 },
+    ]
+    assert [ dict(trace.get_state_as_of(i)) for i in range(5) ] == expected
+    # states outside of the trace are clamped to its first and last state
+    assert dict(trace.get_state_as_of(-1)) == expected[0]
+    assert dict(trace.get_state_as_of(9)) == expected[-1]
+
+def test_states_are_built_on_request(trace):
+    # asking for a later state first gives the same states
+    last = dict(trace.get_state_as_of(4))
+    assert last == { "xx" : 2, "yy" : "y", "zz" : 3.0 }
+    assert dict(trace.get_state_as_of(1)) == { "xx" : 1 }
+    # events without data share the prior state
+    assert trace.get_state_as_of(1) is trace.get_state_as_of(2)
+
+def test_states_are_read_only(trace):
+    state = trace.get_state_as_of(1)
+    with pytest.raises(TypeError):
+        state["xx"] = 2
+    assert dict(trace.get_state_as_of(1)) == { "xx" : 1 }
+
+def _log() -> ComplexEventLog:
+    return ComplexEventLog([
+        ComplexTrace([ ComplexEvent("a", { "xx" : 1 }) ]),
+        ComplexTrace([ ComplexEvent("a", { "xx" : 1 }) ]),
+        ComplexTrace([ ComplexEvent("a", { "xx" : 2 }) ]),
+        ComplexTrace([ ComplexEvent("b", { "xx" : 1 }) ]),
+    ])
+
+def test_unique_instances_are_counted():
+    unique = _log().get_unique_instances()
+    counts = dict( 
+        (str(trace), sorted( 
+            (sorted(instance.get_state_as_of(1).items()), count) 
+            for instance, count in pairs 
+        ))
+        for trace, pairs in unique.items() 
+    )
+    assert counts == dict([
+        (str(Trace(["a"])), [ ([("xx", 1)], 2), ([("xx", 2)], 1) ]),
+        (str(Trace(["b"])), [ ([("xx", 1)], 1) ]),
+    ])
+
+def test_unique_instances_are_shared_and_read_only():
+    log = _log()
+    unique = log.get_unique_instances()
+    assert log.get_unique_instances() is unique
+    with pytest.raises(TypeError):
+        unique[Trace(["c"])] = tuple()
+    # the same key function is only grouped once
+    key = lambda instance: len(instance)
+    keyed = log.get_unique_instances(key=key)
+    assert log.get_unique_instances(key=key) is keyed
+    assert sorted( len(pairs) for pairs in keyed.values() ) == [1, 1]
@@ -0,0 +1,137 @@
+"""
+Checks that the batch forms of guards (evaluate_batch, check_batch) give the
+same outcomes as evaluating each data state on its own, with and without
+keeping outcomes in GUARD_OUTCOME_CACHE.
+"""
+from pmkoalas.models.guards import Expression, DataStateBlock, GuardOutcomes
+from pmkoalas.models.guards import GUARD_OUTCOME_CACHE, OUTCOME_FALSE
+from pmkoalas.models.guards import outcome_code
+from pmkoalas.models.transitiontree import construct_from_model
+from pmkoalas.models.petrinet import parse_pnml_for_dpn
+from pmkoalas.read import read_xes_complex
+
+from os.path import join, dirname
+from random import Random
+import pytest
+
+ROOT = dirname(dirname(__file__))
+MODELS = [
+    join(ROOT, "paper example", f"paper_example_dpn_{m}.pnml") for m in "abc"
+] + [
+    join(ROOT, "axioms", "axiom 7", f"ax7_model_{i}{b}.pnml")
+    for i in range(1,6) for b in ["", "b"]
+]
+LOGS = [
+    join(ROOT, "paper example", "paper_example_log.xes"),
+    join(ROOT, "axioms", "axiom 7", "log_1.xes"),
+]
+EXPRESSIONS = [
+    "true",
+    "xx > 2",
+    "xx >= 2.5",
+    'xx >= 2 && yy == "b"',
+    'xx < 3 || yy == "c"',
+    "xx == yy",
+    "xx < yy && yy <= 4",
+    "xx == 9007199254740992",
+    "zz == 9007199254740992",
+    "zz > 9007199254740992.0",
+    "zz == xx",
+]
+
+def _random_states(size:int, seed:int=7) -> list:
+    """
+    data states with missing, mixed and incomparable values, and integers 
+    that are not exact as floats.
+    """
+    rand = Random(seed)
+    states = []
+    for _ in range(size):
+        state = dict()
+        if rand.random() < 0.9:
+            state["xx"] = rand.choice([1, 2, 3, 4, 2.5, True, "a", 2**53+1])
+        if rand.random() < 0.9:
+            state["yy"] = rand.choice(["a", "b", "c", 3, 4.0])
+        if rand.random() < 0.9:
+            state["zz"] = rand.choice([2**53, 2**53+1, -(2**53+1), 1])
+        states.append(state)
+    return states
+
+def _log_states() -> list:
+    " the data states before each event of every instance in the logs."
+    states = []
+    for logfile in LOGS:
+        for _, instances in read_xes_complex(logfile):
+            for instance in instances:
+                states.extend( 
+                    instance.get_state_as_of(i) 
+                    for i in range(len(instance)+1) 
+                )
+    return states
+
+def _code(outcome) -> int:
+    if isinstance(outcome, GuardOutcomes):
+        return outcome_code(outcome)
+    return outcome_code(GuardOutcomes.TRUE) if outcome else OUTCOME_FALSE
+
+@pytest.fixture(params=[0, 64])
+def outcome_cache(request):
+    GUARD_OUTCOME_CACHE.resize(request.param)
+    GUARD_OUTCOME_CACHE.clear()
+    yield GUARD_OUTCOME_CACHE
+    GUARD_OUTCOME_CACHE.resize(0)
+    GUARD_OUTCOME_CACHE.clear()
+
+@pytest.mark.parametrize("exp", EXPRESSIONS)
+def test_evaluate_batch_matches_evaluate(exp, outcome_cache):
+    states = _random_states(400)
+    block = DataStateBlock(states)
+    expression = Expression(exp)
+    # twice, so that the second batch can use kept outcomes
+    for _ in range(2):
+        codes = expression.evaluate_batch(block).tolist()
+        assert codes == [ _code(expression.evaluate(s)) for s in states ]
+
+@pytest.mark.parametrize("values", [
+    list(range(10)),
+    # incomparable values, so the states are evaluated one by one
+    list(range(5)) + [ "a", "b", "c", "d", "e" ],
+])
+def test_outcome_cache_is_used(values, outcome_cache):
+    states = [ { "xx" : val } for val in values ] * 3
+    block = DataStateBlock(states)
+    expression = Expression("xx > 2")
+    codes = expression.evaluate_batch(block).tolist()
+    assert expression.evaluate_batch(block).tolist() == codes
+    assert expression.evaluate(states[0]) == GuardOutcomes.FALSE
+    if outcome_cache.enabled:
+        assert outcome_cache.misses >= len(values)
+        assert outcome_cache.hits >= len(values) + 1
+    else:
+        assert outcome_cache.hits + outcome_cache.misses == 0
+
+def test_integers_beyond_floats_compare_exactly():
+    state = { "xx" : 2**53 + 1 }
+    expression = Expression("xx == 9007199254740992")
+    block = DataStateBlock([ state ])
+    assert expression.evaluate(state) == GuardOutcomes.FALSE
+    assert expression.evaluate_batch(block).tolist() == [ OUTCOME_FALSE ]
+
+def test_compiled_matches_reparsed():
+    states = _random_states(100)
+    for exp in EXPRESSIONS:
+        compiled = Expression(exp)
+        reparsed = Expression(exp, compiled=False)
+        for state in states:
+            assert compiled.evaluate(state) == reparsed.evaluate(state)
+
+@pytest.mark.parametrize("modelfile", MODELS)
+def test_check_batch_matches_check(modelfile, outcome_cache):
+    states = _log_states()
+    block = DataStateBlock(states)
+    tree = construct_from_model(parse_pnml_for_dpn(modelfile), 4)
+    for flow in tree.flows():
+        guard = flow.guard()
+        codes = guard.check_batch(block).tolist()
+        assert codes == [ _code(guard.check(s)) for s in states ], \
+            str(flow)
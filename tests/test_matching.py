@@ -0,0 +1,120 @@
+"""
+Checks that the dynamic program over the tree finds the same least costy 
+paths as costing every candidate path (find_all_paths), for eager and lazy
+trees, and that a MatchingStore only reuses the paths found for the same
+model.
+"""
+from pmkoalas.conformance.matching import find_all_paths
+from pmkoalas.conformance.matching import find_least_costy_paths_for_variants
+from pmkoalas.conformance.matching import find_least_costy_paths_in_tree
+from pmkoalas.conformance.matching import _computation_many_matching
+from pmkoalas.conformance.matching import Skipper
+from pmkoalas.conformance.matching import MatchingStore
+from pmkoalas.conformance.matching import construct_many_matching
+from pmkoalas.models.transitiontree import construct_from_model
+from pmkoalas.models.petrinet import parse_pnml_for_dpn
+from pmkoalas.read import read_xes_complex
+
+from os.path import join, dirname
+import pytest
+
+ROOT = dirname(dirname(__file__))
+PAPER_LOG = join(ROOT, "paper example", "paper_example_log.xes")
+PAIRS = [
+    (PAPER_LOG, join(ROOT, "paper example", f"paper_example_dpn_{m}.pnml"))
+    for m in "abc"
+] + [
+    (join(ROOT, "axioms", "axiom 3", "log_1.xes"), 
+     join(ROOT, "axioms", "axiom 3", f"ax3_model_{i}.pnml"))
+    for i in range(1,7)
+] + [
+    (join(ROOT, "axioms", "axiom 7", "log_1.xes"), 
+     join(ROOT, "axioms", "axiom 7", "ax7_model_4b.pnml")),
+    (join(ROOT, "axioms", "axiom 8", "log_1.xes"), 
+     join(ROOT, "axioms", "axiom 8", "ax8_model_5.pnml")),
+]
+
+def _encode(path) -> tuple:
+    " describes a path by its steps, so paths of different trees compare."
+    return tuple(
+        None if isinstance(step, Skipper) 
+        else (step.activity(), hash(step.guard()))
+        for step in path
+    )
+
+def _setup(logfile:str, modelfile:str):
+    log = read_xes_complex(logfile)
+    model = parse_pnml_for_dpn(modelfile)
+    traces = [ trace for trace,_ in log ]
+    longest = max( len(trace) for trace in traces )
+    return model, traces, longest
+
+@pytest.mark.parametrize("logfile,modelfile", PAIRS)
+def test_variants_match_all_candidates(logfile, modelfile):
+    model, traces, longest = _setup(logfile, modelfile)
+    tree = construct_from_model(model, longest)
+    candidates = find_all_paths(tree, longest)
+    found = find_least_costy_paths_for_variants(tree, traces)
+    for trace in traces:
+        _, expected = _computation_many_matching(trace, tree, set( 
+            cand for cand in candidates if len(cand) <= len(trace)
+        ))
+        assert found[trace] == expected, str(trace)
+        assert find_least_costy_paths_in_tree(tree, trace) == expected
+
+@pytest.mark.parametrize("logfile,modelfile", PAIRS)
+def test_lazy_tree_matches_eager_tree(logfile, modelfile):
+    model, traces, longest = _setup(logfile, modelfile)
+    eager = find_least_costy_paths_for_variants(
+        construct_from_model(model, longest), traces
+    )
+    lazy = find_least_costy_paths_for_variants(
+        construct_from_model(model, longest, lazy=True), traces
+    )
+    for trace in traces:
+        assert set(map(_encode, lazy[trace])) == \
+            set(map(_encode, eager[trace])), str(trace)
+
+def _matched(matching, traces) -> dict:
+    return dict( 
+        (trace, set(map(_encode, matching[trace]))) for trace in traces 
+    )
+
+@pytest.fixture
+def paper_b():
+    return _setup(PAIRS[1][0], PAIRS[1][1])
+
+def test_store_reuses_paths_for_same_model(paper_b):
+    model, traces, longest = paper_b
+    store = MatchingStore(maxsize=4)
+    tree = construct_from_model(model, longest, lazy=True)
+    first = construct_many_matching(read_xes_complex(PAPER_LOG), tree, store)
+    assert (store.hits, store.misses) == (0, len(traces))
+    # a tree of the same model read again has the same fingerprint
+    again = construct_from_model(parse_pnml_for_dpn(PAIRS[1][1]), longest, 
+                                 lazy=True)
+    second = construct_many_matching(read_xes_complex(PAPER_LOG), again, 
+                                     store)
+    assert (store.hits, store.misses) == (len(traces), len(traces))
+    assert _matched(second, traces) == _matched(first, traces)
+
+def test_store_does_not_use_paths_of_other_model(paper_b):
+    model, traces, longest = paper_b
+    store = MatchingStore(maxsize=4)
+    tree = construct_from_model(model, longest, lazy=True)
+    construct_many_matching(read_xes_complex(PAPER_LOG), tree, store)
+    other = construct_from_model(parse_pnml_for_dpn(PAIRS[2][1]), longest, 
+                                 lazy=True)
+    assert other.fingerprint() != tree.fingerprint()
+    construct_many_matching(read_xes_complex(PAPER_LOG), other, store)
+    assert (store.hits, store.misses) == (0, 2 * len(traces))
+
+def test_store_keeps_paths_on_disk(paper_b, tmp_path):
+    model, traces, longest = paper_b
+    tree = construct_from_model(model, longest, lazy=True)
+    first = construct_many_matching(read_xes_complex(PAPER_LOG), tree, 
+        MatchingStore(maxsize=0, directory=str(tmp_path)))
+    store = MatchingStore(maxsize=0, directory=str(tmp_path))
+    second = construct_many_matching(read_xes_complex(PAPER_LOG), tree, store)
+    assert (store.hits, store.misses) == (len(traces), 0)
+    assert _matched(second, traces) == _matched(first, traces)
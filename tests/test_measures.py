@@ -0,0 +1,68 @@
+"""
+Locks in the guard-recall and guard-precision of the paper example and the
+axiom 3 models, as computed before the measures were optimised, and of the
+axiom 7 and 8 models whose guards read data written before the last event.
+"""
+from pmkoalas.conformance.dataaware import compute_guard_recall
+from pmkoalas.conformance.dataaware import compute_guard_precision
+from pmkoalas.conformance.dataaware import compute_guard_measures
+from pmkoalas.models.petrinet import parse_pnml_for_dpn
+from pmkoalas.read import read_xes_complex
+
+from os.path import join, dirname
+import pytest
+
+ROOT = dirname(dirname(__file__))
+PAPER_FOLD = join(ROOT, "paper example")
+PAPER_LOG = join(PAPER_FOLD, "paper_example_log.xes")
+AX_3_FOLD = join(ROOT, "axioms", "axiom 3")
+AX_3_LOG = join(AX_3_FOLD, "log_1.xes")
+AX_7_FOLD = join(ROOT, "axioms", "axiom 7")
+AX_7_LOG = join(AX_7_FOLD, "log_1.xes")
+AX_8_FOLD = join(ROOT, "axioms", "axiom 8")
+AX_8_LOG = join(AX_8_FOLD, "log_1.xes")
+# (log, model, guard-recall, guard-precision)
+EXPECTED = [
+    (PAPER_LOG, join(PAPER_FOLD, "paper_example_dpn_a.pnml"), 
+     0.250000, 1.000000),
+    (PAPER_LOG, join(PAPER_FOLD, "paper_example_dpn_b.pnml"), 
+     0.378056, 0.602034),
+    (PAPER_LOG, join(PAPER_FOLD, "paper_example_dpn_c.pnml"), 
+     0.878056, 0.539367),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_1.pnml"), 0.250000, 1.000000),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_2.pnml"), 0.289583, 0.634814),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_3.pnml"), 0.333056, 0.571327),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_4.pnml"), 0.378056, 0.602034),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_5.pnml"), 0.878056, 0.539367),
+    (AX_3_LOG, join(AX_3_FOLD, "ax3_model_6.pnml"), 1.000000, 0.500035),
+    (AX_7_LOG, join(AX_7_FOLD, "ax7_model_1b.pnml"), 0.813611, 0.646261),
+    (AX_7_LOG, join(AX_7_FOLD, "ax7_model_2b.pnml"), 0.878333, 0.631679),
+    (AX_7_LOG, join(AX_7_FOLD, "ax7_model_3b.pnml"), 0.914306, 0.566658),
+    (AX_7_LOG, join(AX_7_FOLD, "ax7_model_4b.pnml"), 0.914306, 0.526467),
+    (AX_8_LOG, join(AX_8_FOLD, "ax8_model_2.pnml"), 0.833333, 0.833356),
+    (AX_8_LOG, join(AX_8_FOLD, "ax8_model_3.pnml"), 0.791667, 0.791696),
+]
+# the values above are rounded to six decimals
+TOLERANCE = 5e-7
+
+@pytest.mark.parametrize("logfile,modelfile,recall,precision", EXPECTED)
+def test_optimised_measures(logfile, modelfile, recall, precision):
+    log = read_xes_complex(logfile)
+    model = parse_pnml_for_dpn(modelfile)
+    assert compute_guard_recall(log, model) == \
+        pytest.approx(recall, abs=TOLERANCE)
+    assert compute_guard_precision(log, model) == \
+        pytest.approx(precision, abs=TOLERANCE)
+    assert compute_guard_measures(log, model) == (
+        pytest.approx(recall, abs=TOLERANCE), 
+        pytest.approx(precision, abs=TOLERANCE)
+    )
+
+def test_unoptimised_measures_match_optimised():
+    _, modelfile, recall, precision = EXPECTED[1]
+    log = read_xes_complex(PAPER_LOG)
+    model = parse_pnml_for_dpn(modelfile)
+    assert compute_guard_recall(log, model, optimised=False) == \
+        pytest.approx(recall, abs=TOLERANCE)
+    assert compute_guard_precision(log, model, optimised=False) == \
+        pytest.approx(precision, abs=TOLERANCE)
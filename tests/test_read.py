@@ -0,0 +1,140 @@
+"""
+Checks that streaming (stream_xes) and parallel (_read_xes_parallel) reading
+of XES logs give the same logs as parsing the whole document at once.
+"""
+from pmkoalas import read as xes_read
+from pmkoalas.read import read_xes_complex, read_xes_simple, stream_xes
+from pmkoalas.read import XesAttribute, find_xes_type
+
+from xml.etree.ElementTree import parse
+from os.path import join, dirname
+from glob import glob
+import pytest
+
+ROOT = dirname(dirname(__file__))
+LOGS = sorted(glob(join(ROOT, "axioms", "*", "*.xes"))) + [
+    join(ROOT, "paper example", "paper_example_log.xes"),
+]
+LATE_ATTRIBUTE = '<string key="late" value="after traces"/>\n'
+
+def _value(element) -> object:
+    return XesAttribute(find_xes_type(element.tag), element.attrib.get("key"),
+                        element.attrib.get("value")).get()
+
+def _parse_reference(filepath:str) -> tuple:
+    """
+    Reads the log by parsing the whole document, as the reader did before 
+    streaming, returning the name, the log attributes and for each trace 
+    its attributes and the (activity, data) of each event.
+    """
+    log = parse(filepath).getroot()
+    found = log.find(".*[@key='concept:name']")
+    name = "Unknown Event log" if found == None else found.attrib["value"]
+    log_map = dict( 
+        (child.attrib["key"], _value(child)) 
+        for child in log if child.attrib.get("key") != None
+    )
+    traces = []
+    for trace in log:
+        if not trace.tag.endswith("trace"):
+            continue
+        data = dict(
+            (child.attrib["key"], _value(child)) 
+            for child in trace if child.attrib.get("key") != None
+        )
+        events = []
+        for event in trace:
+            if not event.tag.endswith("event"):
+                continue
+            label = None
+            attrs = dict()
+            for child in event.iter():
+                key = child.attrib.get("key")
+                if key == "concept:name":
+                    label = _value(child)
+                elif key != None:
+                    attrs[key] = _value(child)
+            events.append((label, attrs))
+        traces.append((data, events))
+    return name, log_map, traces
+
+def _describe_trace(trace) -> tuple:
+    return (
+        sorted(trace.data().items()),
+        [ (event.activity(), sorted(event.data().items())) for event in trace ]
+    )
+
+def _describe(log) -> tuple:
+    " describes a complex log independently of the order of its variants."
+    return (
+        log.name, 
+        sorted(log.data().items()),
+        sorted( 
+            repr(_describe_trace(instance)) 
+            for _, instances in log for instance in instances 
+        )
+    )
+
+def _describe_reference(filepath:str) -> tuple:
+    name, log_map, traces = _parse_reference(filepath)
+    return (
+        name,
+        sorted(log_map.items()),
+        sorted( 
+            repr((sorted(data.items()), 
+                  [ (act, sorted(attrs.items())) for act, attrs in events ]))
+            for data, events in traces
+        )
+    )
+
+@pytest.fixture
+def late_log(tmp_path) -> str:
+    " a log with a log attribute after its traces."
+    with open(LOGS[-1]) as file:
+        content = file.read()
+    end = content.rindex("</log>")
+    filepath = str(tmp_path / "late.xes")
+    with open(filepath, "w") as file:
+        file.write(content[:end] + LATE_ATTRIBUTE + content[end:])
+    return filepath
+
+@pytest.mark.parametrize("filepath", LOGS)
+def test_stream_xes_yields_children_of_log(filepath):
+    log = parse(filepath).getroot()
+    expected = [ child.tag.rsplit("}", 1)[-1] for child in log ]
+    assert [ tag for tag,_ in stream_xes(filepath) ] == expected
+
+@pytest.mark.parametrize("filepath", LOGS)
+def test_streamed_log_matches_reference(filepath):
+    assert _describe(read_xes_complex(filepath)) == \
+        _describe_reference(filepath)
+    simple = read_xes_simple(filepath)
+    name, _, traces = _parse_reference(filepath)
+    assert simple.name == name
+    assert sorted( 
+        (tuple(trace.sequence), freq) for trace, freq in simple 
+    ) == sorted( 
+        (variant, sum( 
+            1 for _, events in traces 
+            if tuple(act for act,_ in events) == variant
+        ))
+        for variant in set( 
+            tuple(act for act,_ in events) for _, events in traces 
+        )
+    )
+
+def test_log_attributes_after_traces_are_kept(late_log):
+    log = read_xes_complex(late_log)
+    assert log.data()["late"] == "after traces"
+    assert _describe(log) == _describe_reference(late_log)
+
+@pytest.mark.parametrize("filepath", LOGS)
+def test_parallel_log_matches_reference(filepath, monkeypatch):
+    monkeypatch.setattr(xes_read, "PARALLEL_READ_SIZE", 0)
+    assert _describe(read_xes_complex(filepath, n_jobs=2)) == \
+        _describe_reference(filepath)
+
+def test_parallel_log_keeps_attributes_after_traces(late_log, monkeypatch):
+    monkeypatch.setattr(xes_read, "PARALLEL_READ_SIZE", 0)
+    assert _describe(read_xes_complex(late_log, n_jobs=2)) == \
+        _describe_reference(late_log)
@@ -0,0 +1,94 @@
+"""
+Checks that compact transition trees (CompactTransitionTree) offer the same 
+vertices, flows and paths as the trees they are converted from, and give the
+same measures.
+"""
+from pmkoalas.conformance.dataaware import _optimised_guard_recall
+from pmkoalas.conformance.dataaware import _optimised_guard_precision
+from pmkoalas.models.transitiontree import construct_from_model
+from pmkoalas.models.transitiontree import convert_to_compact_tree
+from pmkoalas.models.transitiontree import CompactTransitionTree
+from pmkoalas.models.transitiontree import TRANSITION_TREE_CACHE
+from pmkoalas.models.petrinet import parse_pnml_for_dpn
+from pmkoalas.read import read_xes_complex
+
+from os.path import join, dirname
+import pytest
+
+ROOT = dirname(dirname(__file__))
+AX_3_FOLD = join(ROOT, "axioms", "axiom 3")
+AX_3_LOG = join(AX_3_FOLD, "log_1.xes")
+MODELS = [
+    join(ROOT, "paper example", f"paper_example_dpn_{m}.pnml") for m in "abc"
+] + [
+    join(AX_3_FOLD, f"ax3_model_{i}.pnml") for i in range(1,7)
+]
+# the values above are rounded to six decimals
+TOLERANCE = 5e-7
+
+def _describe_flow(flow) -> tuple:
+    " describes a flow by its steps, so flows of different trees compare."
+    guard = flow.guard() if hasattr(flow, "guard") else None
+    return (
+        tuple(flow.offering().sigma_sequence()),
+        flow.activity(),
+        None if guard == None else hash(guard)
+    )
+
+def _describe_flows(flows) -> list:
+    return sorted( map(_describe_flow, flows), key=repr )
+
+@pytest.mark.parametrize("modelfile", MODELS)
+def test_compact_tree_matches_tree(modelfile):
+    model = parse_pnml_for_dpn(modelfile)
+    tree = construct_from_model(model, 4)
+    compact = construct_from_model(model, 4, compact=True)
+    assert isinstance(compact, CompactTransitionTree)
+    assert compact.fingerprint() == \
+        convert_to_compact_tree(tree).fingerprint()
+    assert len(compact.vertices()) == len(tree.vertices())
+    assert _describe_flows(compact.flows()) == _describe_flows(tree.flows())
+    assert len(compact.terminals()) == len(tree.terminals())
+    for vertex in tree.vertices():
+        assert _describe_flows(compact.outgoing(vertex)) == \
+            _describe_flows(tree.outgoing(vertex)), str(vertex)
+        assert list(map(_describe_flow, compact.path_to(vertex))) == \
+            list(map(_describe_flow, tree.path_to(vertex))), str(vertex)
+
+def test_compact_tree_gives_same_measures():
+    log = read_xes_complex(AX_3_LOG)
+    model = parse_pnml_for_dpn(join(AX_3_FOLD, "ax3_model_2.pnml"))
+    longest = max( len(trace) for trace,_ in log )
+    compact = construct_from_model(model, longest, compact=True)
+    assert _optimised_guard_recall(log, compact) == \
+        pytest.approx(0.289583, abs=TOLERANCE)
+    assert _optimised_guard_precision(log, compact) == \
+        pytest.approx(0.634814, abs=TOLERANCE)
+
+@pytest.fixture
+def tree_cache():
+    TRANSITION_TREE_CACHE.resize(8)
+    TRANSITION_TREE_CACHE.clear()
+    yield TRANSITION_TREE_CACHE
+    TRANSITION_TREE_CACHE.resize(0)
+    TRANSITION_TREE_CACHE.clear()
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_cached_tree_is_reused_for_same_model(tree_cache, lazy):
+    model = parse_pnml_for_dpn(MODELS[1])
+    first = construct_from_model(model, 4, lazy=lazy)
+    assert (tree_cache.hits, tree_cache.misses) == (0, 1)
+    # a model read again has the same fingerprint
+    again = construct_from_model(parse_pnml_for_dpn(MODELS[1]), 4, lazy=lazy)
+    assert again is first
+    assert (tree_cache.hits, tree_cache.misses) == (1, 1)
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_cached_tree_is_not_used_for_other_model(tree_cache, lazy):
+    model = parse_pnml_for_dpn(MODELS[1])
+    changed = parse_pnml_for_dpn(MODELS[2])
+    assert changed.fingerprint() != model.fingerprint()
+    first = construct_from_model(model, 4, lazy=lazy)
+    other = construct_from_model(changed, 4, lazy=lazy)
+    assert other is not first
+    assert (tree_cache.hits, tree_cache.misses) == (0, 2)
@@ -0,0 +1,53 @@
+"""
+Checks that pools keep their shared structures apart when nested, and how
+work is split and scheduled across workers.
+"""
+from pmkoalas.work import WorkerPool, shared, split_ranges, plan_chunks
+from pmkoalas.work import effective_jobs, PARALLEL_OVERHEAD
+
+import pytest
+
+def _tree() -> object:
+    return shared("tree")
+
+def test_closing_inner_pool_keeps_outer_structures():
+    with WorkerPool({ "tree" : "outer" }, n_jobs=1) as outer:
+        with WorkerPool(dict(), n_jobs=1):
+            pass
+        assert outer.starmap(_tree, [()]) == ["outer"]
+        with WorkerPool({ "tree" : "inner" }, n_jobs=1) as inner:
+            assert inner.starmap(_tree, [()]) == ["inner"]
+            assert outer.starmap(_tree, [()]) == ["outer"]
+        assert outer.starmap(_tree, [()]) == ["outer"]
+    with pytest.raises(ValueError):
+        shared("tree")
+
+def test_workers_use_structures_of_their_pool():
+    for name in ["first", "second"]:
+        with WorkerPool({ "tree" : name }, n_jobs=2) as pool:
+            assert pool.starmap(_tree, [()] * 4) == [name] * 4
+
+def test_split_ranges_cover_items_in_order():
+    for size in [0, 1, 7, 100]:
+        for parts in [1, 3, 8]:
+            ranges = split_ranges(size, parts)
+            assert len(ranges) <= max([parts, 1])
+            if size > 0:
+                assert ranges[0][0] == 0 and ranges[-1][1] == size
+                assert all( a[1] == b[0] for a,b in zip(ranges, ranges[1:]) )
+
+def test_plan_chunks_keeps_every_item_and_runs_costly_first():
+    items = list(range(10))
+    costs = [ 50, 1, 1, 1, 30, 2, 2, 2, 2, 9 ]
+    chunks = plan_chunks(items, costs, target=10)
+    assert sorted( item for chunk in chunks for item in chunk ) == items
+    # items costing more than the target are chunks on their own
+    assert [0] in chunks and [4] in chunks
+    totals = [ sum( costs[i] for i in chunk ) for chunk in chunks ]
+    assert totals == sorted(totals, reverse=True)
+
+def test_cheap_work_runs_in_process():
+    pool = WorkerPool(dict(), n_jobs=4, cost=PARALLEL_OVERHEAD - 1)
+    assert pool.workers == 1
+    assert WorkerPool(dict(), n_jobs=4).workers == 4
+    assert effective_jobs(-1) >= 1